@@ -0,0 +1,100 @@
+"""Benchmark of the EventHandler dispatch against the previous task based one.
+
+Usage: python -m benchmarks.event_dispatch
+"""
+import argparse
+import asyncio
+import logging
+import time
+from typing import List
+
+import uvloop
+
+from iot_firmware.event import Event
+from iot_firmware.event import EventHandler
+from iot_firmware.event import EventType
+from iot_firmware.event.handler import logger
+from iot_firmware.event.handler import PoisonPill
+
+
+class BenchEventType(EventType):
+    pass
+
+
+class BenchEvent(Event):
+    __slots__ = ()
+    type = BenchEventType
+
+
+class LegacyEventHandler(EventHandler):
+    """EventHandler with the dispatch that creates a task per subscriber."""
+
+    async def _worker(self, i: int) -> None:
+        event = await self._get_next_event()
+        while event is not PoisonPill:
+            tasks = [
+                asyncio.create_task(fn(event), name=fn.__name__)
+                for fn in self._subscribers[event.type.uuid]
+            ]
+            try:
+                await asyncio.wait_for(
+                    self._run_tasks(tasks, event), timeout=self.worker_timeout_seconds
+                )
+            except asyncio.TimeoutError:
+                logger.error("timeout")
+            event = await self._get_next_event()
+
+
+async def events_per_second(
+    handler_class: type, num_events: int, num_subscribers: int, num_workers: int
+) -> float:
+    handler = handler_class(num_workers=num_workers, buffer_maxsize=num_events)
+    done = asyncio.Event()
+    remaining = num_events * num_subscribers
+
+    def make_subscriber():
+        async def subscriber(event: BenchEvent):
+            nonlocal remaining
+            remaining -= 1
+            if not remaining:
+                done.set()
+
+        return subscriber
+
+    for _ in range(num_subscribers):
+        handler.subscribe(BenchEvent, make_subscriber())
+    for _ in range(num_events):
+        handler.publish(BenchEvent())
+
+    start = time.perf_counter()
+    runner = asyncio.create_task(handler.run())
+    await done.wait()
+    elapsed = time.perf_counter() - start
+    await handler.stop()
+    await runner
+    return num_events / elapsed
+
+
+def main(args: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--number", type=int, default=20000)
+    parser.add_argument("-w", "--workers", type=int, default=10)
+    options = parser.parse_args(args)
+
+    logging.getLogger("iot_firmware").setLevel(logging.ERROR)
+    uvloop.install()
+    for num_subscribers in (1, 3):
+        for handler_class in (LegacyEventHandler, EventHandler):
+            rate = asyncio.run(
+                events_per_second(
+                    handler_class, options.number, num_subscribers, options.workers
+                )
+            )
+            print(
+                f"{handler_class.__name__:>18} ({num_subscribers} subscriber(s)): "
+                f"{rate:>10,.0f} events/s"
+            )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,94 @@
+"""Benchmark of the EventHandler with the persisted events against the in-memory one.
+
+It measures the time of each publish call and the events processed per second,
+with and without the journal.
+
+Usage: python -m benchmarks.event_journal
+"""
+import argparse
+import asyncio
+import logging
+import os
+import tempfile
+import time
+from typing import Dict
+from typing import List
+from typing import Optional
+
+import uvloop
+
+from iot_firmware.event import Event
+from iot_firmware.event import EventHandler
+from iot_firmware.event import EventType
+from iot_firmware.event.bench import percentiles
+
+
+class BenchEventType(EventType):
+    pass
+
+
+class BenchEvent(Event):
+    __slots__ = ()
+    type = BenchEventType
+
+
+async def measure(num_events: int, journal_path: Optional[str]) -> Dict:
+    handler = EventHandler(buffer_maxsize=num_events, journal_path=journal_path)
+    done = asyncio.Event()
+    remaining = num_events
+
+    async def subscriber(event: BenchEvent):
+        nonlocal remaining
+        remaining -= 1
+        if not remaining:
+            done.set()
+
+    handler.subscribe(BenchEvent, subscriber)
+    if journal_path is not None:
+        handler.persist(BenchEvent)
+    runner = asyncio.create_task(handler.run())
+    await asyncio.sleep(0)
+
+    latencies = []
+    start = time.perf_counter()
+    for i in range(num_events):
+        event = BenchEvent(data={"value": i, "unit": "celsius"})
+        t = time.perf_counter()
+        handler.publish(event)
+        latencies.append(time.perf_counter() - t)
+        if i % 100 == 0:
+            await asyncio.sleep(0)
+    await done.wait()
+    elapsed = time.perf_counter() - start
+    await handler.stop()
+    await runner
+    return {
+        "events_per_second": num_events / elapsed,
+        "publish": percentiles(latencies),
+    }
+
+
+def main(args: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--number", type=int, default=20000)
+    options = parser.parse_args(args)
+
+    logging.getLogger("iot_firmware").setLevel(logging.ERROR)
+    uvloop.install()
+    with tempfile.TemporaryDirectory() as directory:
+        for name, path in (
+            ("memory", None),
+            ("journal", os.path.join(directory, "journal")),
+        ):
+            result = asyncio.run(measure(options.number, path))
+            publish = result["publish"]
+            print(
+                f"{name:>8}: {result['events_per_second']:>10,.0f} events/s "
+                f"publish p50={publish['p50'] * 1e6:.1f}us "
+                f"p99={publish['p99'] * 1e6:.1f}us "
+                f"p999={publish['p999'] * 1e6:.1f}us"
+            )
+
+
+if __name__ == "__main__":
+    main()
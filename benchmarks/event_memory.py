@@ -0,0 +1,71 @@
+"""Benchmark of the memory and time used by queued events.
+
+It compares the slotted Event with the previous dict based dataclass.
+
+Usage: python -m benchmarks.event_memory
+"""
+import abc
+import argparse
+import time
+import tracemalloc
+import uuid
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Any
+from typing import List
+
+from iot_firmware.event import Event
+from iot_firmware.event import EventType
+from iot_firmware.event.buffer import EventBuffer
+from iot_firmware.event.enum import EventLevel
+
+
+class BenchEventType(EventType):
+    pass
+
+
+@dataclass
+class LegacyEvent(abc.ABC):
+    """Event as it was defined before using slots."""
+
+    data: Any = field(init=True, repr=True, default=None)
+    level: EventLevel = field(init=True, repr=True, default=EventLevel.INFO)
+    timestamp: float = field(init=False, repr=False, default_factory=time.time)
+    uuid: str = field(init=False, repr=False, default_factory=lambda: str(uuid.uuid4()))
+
+    type = BenchEventType
+
+
+class BenchEvent(Event):
+    __slots__ = ()
+    type = BenchEventType
+
+
+def measure(event_class: type, number: int) -> List[float]:
+    """Returns bytes per queued event and microseconds per event creation."""
+    buffer = EventBuffer()
+    tracemalloc.start()
+    start = time.perf_counter()
+    for i in range(number):
+        buffer.put_nowait((event_class(data=i), time.time()))
+    elapsed = time.perf_counter() - start
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    return [size / number, elapsed / number * 1_000_000]
+
+
+def main(args: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--number", type=int, default=100000)
+    options = parser.parse_args(args)
+
+    for event_class in (LegacyEvent, BenchEvent):
+        size, elapsed = measure(event_class, options.number)
+        print(
+            f"{event_class.__name__:>12}: {size:>6.0f} bytes/queued event, "
+            f"{elapsed:.2f} us/event (traced)"
+        )
+
+
+if __name__ == "__main__":
+    main()
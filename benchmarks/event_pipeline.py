@@ -0,0 +1,57 @@
+"""Benchmark of the EventHandler pipeline over a matrix of configurations.
+
+It uses the same load generator as ``iot-firmware bench``, so a saved result can be
+compared with ``iot-firmware bench --compare``.
+
+Usage: python -m benchmarks.event_pipeline [-o results.json]
+"""
+import argparse
+import itertools
+import json
+import logging
+from typing import List
+
+import uvloop
+
+from iot_firmware.event.bench import LoadProfile
+from iot_firmware.event.bench import run
+
+WORKERS = (1, 10, 50)
+SUBSCRIBERS = (1, 3)
+SUBSCRIBER_SECONDS = (0, 0.001)
+
+
+def main(args: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--number", type=int, default=5000)
+    parser.add_argument("-o", "--output")
+    options = parser.parse_args(args)
+
+    logging.getLogger("iot_firmware").setLevel(logging.ERROR)
+    uvloop.install()
+    results = []
+    for workers, subscribers, seconds in itertools.product(
+        WORKERS, SUBSCRIBERS, SUBSCRIBER_SECONDS
+    ):
+        profile = LoadProfile(
+            num_events=options.number,
+            num_workers=workers,
+            num_subscribers=subscribers,
+            subscriber_seconds=seconds,
+        )
+        result = run(profile)
+        results.append(result)
+        latency = result["latency"]
+        print(
+            f"workers={workers:>2} subscribers={subscribers} wait={seconds}s: "
+            f"{result['events_per_second']:>10,.0f} events/s "
+            f"p50={latency['p50'] * 1000:.2f}ms p99={latency['p99'] * 1000:.2f}ms "
+            f"p999={latency['p999'] * 1000:.2f}ms"
+        )
+    if options.output:
+        with open(options.output, "w") as f:
+            json.dump(results, f, indent=2)
+
+
+if __name__ == "__main__":
+    main()
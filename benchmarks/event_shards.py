@@ -0,0 +1,83 @@
+"""Benchmark of the scaling of the sharded event handlers with the CPU cores.
+
+Events of several partitions, whose subscriber does some CPU bound work, are
+processed with 1 to N shards (by default one per CPU core).
+
+Usage: python -m benchmarks.event_shards
+"""
+import argparse
+import asyncio
+import logging
+import os
+import time
+from typing import List
+
+import uvloop
+
+from iot_firmware.event import Event
+from iot_firmware.event import EventHandler
+from iot_firmware.event import EventType
+from iot_firmware.event.enum import PublishResult
+from iot_firmware.event.sharding import Shards
+
+
+class BenchEventType(EventType):
+    pass
+
+
+class BenchEvent(Event):
+    __slots__ = ()
+    type = BenchEventType
+
+
+async def work(event: BenchEvent) -> None:
+    sum(i * i for i in range(event.data["work"]))
+
+
+def setup(event_handler: EventHandler, shard: int) -> None:
+    event_handler.subscribe(BenchEvent, work)
+
+
+async def measure(num_shards: int, num_events: int, work_size: int) -> float:
+    """Returns the events processed per second."""
+    shards = Shards(
+        setup,
+        num_shards,
+        partition=lambda event: event.data["sensor"],
+        handler_options={"buffer_maxsize": 1000},
+    )
+    shards.register(BenchEvent)
+    await shards.start()
+    start = time.perf_counter()
+    for i in range(num_events):
+        event = BenchEvent(data={"sensor": i, "work": work_size})
+        while shards.publish(event) is PublishResult.REJECTED:
+            await asyncio.sleep(0.001)
+    while shards.stats()["processed"] < num_events:
+        await asyncio.sleep(0.001)
+    elapsed = time.perf_counter() - start
+    await shards.stop()
+    return num_events / elapsed
+
+
+def main(args: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--number", type=int, default=20000)
+    parser.add_argument("-w", "--work", type=int, default=500)
+    parser.add_argument("-s", "--max-shards", type=int, default=os.cpu_count())
+    options = parser.parse_args(args)
+    logging.getLogger("iot_firmware").setLevel(logging.ERROR)
+
+    uvloop.install()
+    base = None
+    for num_shards in range(1, options.max_shards + 1):
+        rate = asyncio.run(measure(num_shards, options.number, options.work))
+        base = base or rate
+        print(
+            f"{num_shards:>3} shards: {rate:>9.0f} events/s, "
+            f"speedup {rate / base:.2f}x"
+        )
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,73 @@
+"""Benchmark of the memory used by the devices of a gateway.
+
+It compares hosting the devices in one gateway with giving each device its own
+event and communications handlers, which is what a process per device holds on
+top of the interpreter and the imported modules.
+
+Usage: python -m benchmarks.gateway_memory
+"""
+import argparse
+import tracemalloc
+from typing import Callable
+from typing import List
+
+from iot_firmware.communications import CommunicationsHandler
+from iot_firmware.device import Gateway
+from iot_firmware.event import Event
+from iot_firmware.event import EventHandler
+from iot_firmware.event import EventType
+
+
+class BenchEventType(EventType):
+    pass
+
+
+class BenchEvent(Event):
+    __slots__ = ()
+    type = BenchEventType
+
+
+async def receive(event: BenchEvent) -> None:
+    pass
+
+
+def handlers(number: int) -> List:
+    """One event and communications handler per device."""
+    devices = []
+    for _ in range(number):
+        event_handler = EventHandler()
+        event_handler.subscribe(BenchEvent, receive)
+        devices.append((event_handler, CommunicationsHandler()))
+    return devices
+
+
+def gateway(number: int) -> Gateway:
+    """Devices hosted by a single gateway."""
+    gateway = Gateway()
+    for device_id in range(number):
+        gateway.add_device(device_id).subscribe(BenchEvent, receive)
+    return gateway
+
+
+def measure(create: Callable, number: int) -> float:
+    """Returns the bytes used by each device."""
+    tracemalloc.start()
+    devices = create(number)
+    size, _ = tracemalloc.get_traced_memory()
+    tracemalloc.stop()
+    del devices
+    return size / number
+
+
+def main(args: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--number", type=int, default=500)
+    options = parser.parse_args(args)
+
+    for create in (handlers, gateway):
+        size = measure(create, options.number)
+        print(f"{create.__name__:>8}: {size:>8.0f} bytes/device")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,83 @@
+"""Benchmark of the startup cost of importing the firmware.
+
+Each module is imported in a fresh interpreter with ``-X importtime`` and the best
+cumulative time of several runs is reported, along with the number of modules
+that were loaded. With ``--check`` it fails when a lightweight module (like the
+CLI entry point) loads any of the heavy dependencies or subsystems.
+
+Usage: python -m benchmarks.import_time
+"""
+import argparse
+import subprocess
+import sys
+from typing import Dict
+from typing import List
+from typing import Set
+from typing import Tuple
+
+TARGETS = [
+    "iot_firmware",
+    "iot_firmware.cli",
+    "iot_firmware.event",
+    "iot_firmware.communications",
+    "iot_firmware.controller",
+]
+
+# modules that must not be loaded by each lightweight target
+LIGHTWEIGHT: Dict[str, List[str]] = {
+    "iot_firmware": ["asyncio", "marshmallow", "uvloop", "iot_firmware.controller"],
+    "iot_firmware.cli": [
+        "asyncio",
+        "marshmallow",
+        "uvloop",
+        "iot_firmware.controller",
+        "iot_firmware.event.handler",
+    ],
+}
+
+
+def import_time(module: str) -> Tuple[float, Set[str]]:
+    """Returns the cumulative import time (in ms) and the loaded modules."""
+    result = subprocess.run(
+        [sys.executable, "-X", "importtime", "-c", f"import {module}"],
+        capture_output=True,
+        text=True,
+        check=True,
+    )
+    # import time: self [us] | cumulative | imported package
+    total, modules = 0, set()
+    for line in result.stderr.splitlines():
+        if not line.startswith("import time:") or "cumulative" in line:
+            continue
+        _, cumulative, name = line.split("|")
+        modules.add(name.strip())
+        if name.strip() == module:
+            total = int(cumulative)
+    return total / 1000, modules
+
+
+def main(args: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    parser.add_argument(
+        "--check", action="store_true", help="fail if heavy modules are loaded"
+    )
+    parser.add_argument("modules", nargs="*", default=TARGETS)
+    options = parser.parse_args(args)
+
+    failed = False
+    for module in options.modules:
+        runs = [import_time(module) for _ in range(options.repeat)]
+        best = min(elapsed for elapsed, _ in runs)
+        modules = runs[0][1]
+        print(f"{module:<30} {best:>8.1f} ms {len(modules):>5} modules")
+        heavy = [name for name in LIGHTWEIGHT.get(module, []) if name in modules]
+        if options.check and heavy:
+            print(f"  {module} loads {', '.join(heavy)}")
+            failed = True
+    if failed:
+        sys.exit(1)
+
+
+if __name__ == "__main__":
+    main()
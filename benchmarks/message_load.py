@@ -0,0 +1,46 @@
+"""Benchmark of the compiled Message loader against plain marshmallow.
+
+Usage: python -m benchmarks.message_load
+"""
+import argparse
+import time
+from typing import Callable
+from typing import Dict
+from typing import List
+
+from iot_firmware.communications.schema import Message
+from iot_firmware.enums import MessageType
+
+
+def messages_per_second(load: Callable, messages: List[Dict], repeat: int) -> float:
+    """Returns the best throughput of loading all messages ``repeat`` times."""
+    best = float("inf")
+    for _ in range(repeat):
+        start = time.perf_counter()
+        for message in messages:
+            load(message)
+        best = min(best, time.perf_counter() - start)
+    return len(messages) / best
+
+
+def main(args: List[str] = None) -> None:
+    parser = argparse.ArgumentParser(description=__doc__)
+    parser.add_argument("-n", "--number", type=int, default=10000)
+    parser.add_argument("-r", "--repeat", type=int, default=5)
+    options = parser.parse_args(args)
+
+    messages = [
+        {"type": MessageType.READING, "data": {"temp": 20 + i % 10}, "msg_id": i}
+        for i in range(options.number)
+    ]
+    paths = {
+        "marshmallow": Message.schema().load,
+        "compiled": Message.loader(),
+    }
+    for name, load in paths.items():
+        rate = messages_per_second(load, messages, options.repeat)
+        print(f"{name:>12}: {rate:>12,.0f} messages/s")
+
+
+if __name__ == "__main__":
+    main()
@@ -1,5 +1,11 @@
-from importlib.metadata import version
+from typing import TYPE_CHECKING
 
-from .controller import Controller
+from .lazy import lazy_attributes
 
-__version__ = version(__name__)
+if TYPE_CHECKING:
+    from .controller import Controller
+    from .version import __version__
+
+__getattr__ = lazy_attributes(
+    __name__, {"Controller": ".controller", "__version__": ".version"}
+)
@@ -1,8 +1,9 @@
 import argparse
+import itertools
+import json
+import logging
 from typing import List
 
-from . import __version__
-
 
 def cli(args: List[str] = None):
     """Basic CLI."""
@@ -13,13 +14,159 @@ def cli(args: List[str] = None):
     parser.add_argument(
         "-v",
         "--version",
-        action="version",
-        version=f"{parser.prog} {__version__}",
+        action=_VersionAction,
         help="show program's version number and exit",
     )
     parser.add_argument(
         "-c",
         "--config",
-        help="path to the configuration",
+        help="path to the JSON configuration, the firmware runs with it",
     )
-    parser.parse_args(args)
+    subparsers = parser.add_subparsers(dest="command")
+    _add_bench_parser(subparsers)
+    namespace = parser.parse_args(args)
+    if namespace.command == "bench":
+        return bench(namespace)
+    if namespace.config is not None:
+        return run(parser, namespace.config)
+
+
+class _VersionAction(argparse.Action):
+    """Prints the version of the program, which is only read when asked for."""
+
+    def __init__(self, option_strings: List[str], dest: str, **kwargs) -> None:
+        super().__init__(option_strings, dest, nargs=0, **kwargs)
+
+    def __call__(self, parser, namespace, values, option_string=None) -> None:
+        from . import __version__
+
+        print(f"{parser.prog} {__version__}")
+        parser.exit()
+
+
+def _add_bench_parser(subparsers) -> None:
+    """Adds the arguments of the bench subcommand."""
+    parser = subparsers.add_parser(
+        "bench",
+        help="benchmark the event handler",
+        description="Benchmark the event handler with synthetic or recorded loads. "
+        "Every combination of the given values is run and the results are "
+        "written as JSON.",
+        formatter_class=argparse.ArgumentDefaultsHelpFormatter,
+    )
+    parser.add_argument("-n", "--events", type=int, default=10000)
+    parser.add_argument(
+        "-r", "--rate", type=float, default=0, help="events/s (0 is unlimited)"
+    )
+    parser.add_argument("-w", "--workers", type=int, nargs="+", default=[10])
+    parser.add_argument("-b", "--buffer-maxsize", type=int, nargs="+", default=[100])
+    parser.add_argument("-s", "--subscribers", type=int, nargs="+", default=[1])
+    parser.add_argument(
+        "-d",
+        "--subscriber-seconds",
+        type=float,
+        nargs="+",
+        default=[0.0],
+        help="time each subscriber waits per event",
+    )
+    parser.add_argument("--seed", type=int, default=0)
+    parser.add_argument(
+        "--trace", help="file with the publish times of a recorded load"
+    )
+    parser.add_argument("-o", "--output", help="file where the results are written")
+    parser.add_argument(
+        "--compare",
+        nargs="+",
+        metavar="RESULTS",
+        help="compare with the results of a baseline file (or compare two files)",
+    )
+    parser.add_argument("--threshold", type=float, default=0.1)
+
+
+def run(parser: argparse.ArgumentParser, path: str) -> int:
+    """Runs the firmware with the configuration of a file.
+
+    :param parser: parser of the arguments, used to report invalid configurations
+    :param path: path of the JSON configuration
+    :return: exit code
+    """
+    from marshmallow import ValidationError
+
+    from .controller import Controller
+
+    try:
+        controller = Controller(path)
+    except (OSError, ValueError, ValidationError) as e:
+        parser.error(f"invalid configuration {path}: {e}")
+    controller.start()
+    return 0
+
+
+def bench(namespace: argparse.Namespace) -> int:
+    """Runs the bench subcommand.
+
+    :param namespace: parsed arguments
+    :return: exit code, 1 when a regression is found
+    """
+    from .event import bench as event_bench
+
+    logging.getLogger("iot_firmware").setLevel(logging.ERROR)
+    compare = namespace.compare or []
+    if len(compare) > 2:
+        raise SystemExit("--compare accepts a baseline file and optionally another one")
+    if len(compare) == 2:
+        results = _read_json(compare[1])
+    else:
+        arrivals = None
+        if namespace.trace:
+            with open(namespace.trace) as f:
+                try:
+                    arrivals = event_bench.read_trace(f)
+                except ValueError as e:
+                    raise SystemExit(f"invalid trace {namespace.trace}: {e}")
+        combinations = itertools.product(
+            namespace.workers,
+            namespace.buffer_maxsize,
+            namespace.subscribers,
+            namespace.subscriber_seconds,
+        )
+        results = [
+            event_bench.run(
+                event_bench.LoadProfile(
+                    num_events=namespace.events,
+                    rate=namespace.rate,
+                    num_workers=workers,
+                    buffer_maxsize=buffer_maxsize,
+                    num_subscribers=subscribers,
+                    subscriber_seconds=seconds,
+                    seed=namespace.seed,
+                ),
+                arrivals,
+            )
+            for workers, buffer_maxsize, subscribers, seconds in combinations
+        ]
+        if namespace.output or not compare:
+            _write_json(results, namespace.output)
+    if not compare:
+        return 0
+
+    comparison = event_bench.compare(
+        _read_json(compare[0]), results, namespace.threshold
+    )
+    _write_json(comparison, None)
+    return 1 if comparison["regressions"] else 0
+
+
+def _read_json(path: str):
+    """Reads a JSON file."""
+    with open(path) as f:
+        return json.load(f)
+
+
+def _write_json(data, path: str = None) -> None:
+    """Writes JSON data to a file or to the standard output."""
+    if path is None:
+        print(json.dumps(data, indent=2))
+    else:
+        with open(path, "w") as f:
+            json.dump(data, f, indent=2)
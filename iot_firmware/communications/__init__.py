@@ -1,2 +1,9 @@
 """Package that handles all messages from external communications."""
-from .handler import CommunicationsHandler
+from typing import TYPE_CHECKING
+
+from ..lazy import lazy_attributes
+
+if TYPE_CHECKING:
+    from .handler import CommunicationsHandler
+
+__getattr__ = lazy_attributes(__name__, {"CommunicationsHandler": ".handler"})
@@ -0,0 +1,341 @@
+"""Module with the tracking of the messages waiting for their ACK.
+
+The data of an ACK message confirms the messages by ``msg_id`` in one of these
+ways:
+
+- an int acknowledges every message up to that ``msg_id`` (cumulative)
+- a list acknowledges the messages of those ``msg_id`` (selective)
+- a dict with ``cumulative`` and/or ``selective`` keys does both
+"""
+import asyncio
+import heapq
+import logging
+import math
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import Hashable
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Union
+
+from .codec import LazyMessage
+from .schema import Message
+
+logger = logging.getLogger(__name__)
+
+DEFAULT_WINDOW_SIZE = 1024
+DEFAULT_TIMEOUT_SECONDS = 5
+DEFAULT_MAX_RETRIES = 3
+DEFAULT_TICK_SECONDS = 0.1
+DEFAULT_NUM_SLOTS = 512
+
+AnyMessage = Union[Message, LazyMessage]
+
+
+class TimerWheel:
+    """Hashed timing wheel of timers identified by a key.
+
+    Time advances one tick at a time and each timer is kept in the slot of the
+    tick when it expires, so scheduling and cancelling a timer costs O(1) and a
+    tick only looks at the timers of its slot.
+
+    :param tick_seconds: duration of a tick
+    :param num_slots: number of slots of the wheel
+
+    Basic usage.
+
+    >>> wheel = TimerWheel(tick_seconds=1, num_slots=4)
+    >>> wheel.schedule("a", 1)
+    >>> wheel.schedule("b", 6)
+    >>> wheel.advance(), wheel.advance()
+    (['a'], [])
+    >>> [wheel.advance() for _ in range(4)]
+    [[], [], [], ['b']]
+    """
+
+    def __init__(
+        self,
+        tick_seconds: float = DEFAULT_TICK_SECONDS,
+        num_slots: int = DEFAULT_NUM_SLOTS,
+    ) -> None:
+        self.tick_seconds = tick_seconds
+        self.ticks = 0
+        self._slots: List[Dict[Hashable, int]] = [{} for _ in range(num_slots)]
+        self._where: Dict[Hashable, int] = {}
+
+    def __len__(self) -> int:
+        return len(self._where)
+
+    def schedule(self, key: Hashable, delay: float) -> None:
+        """Starts (or restarts) the timer of a key.
+
+        :param key: key of the timer
+        :param delay: seconds until the timer expires (at least one tick)
+        """
+        self.cancel(key)
+        expires = self.ticks + max(math.ceil(delay / self.tick_seconds), 1)
+        slot = expires % len(self._slots)
+        self._slots[slot][key] = expires
+        self._where[key] = slot
+
+    def cancel(self, key: Hashable) -> bool:
+        """Stops the timer of a key.
+
+        :param key: key of the timer
+        :return: whether the timer was running
+        """
+        slot = self._where.pop(key, None)
+        if slot is None:
+            return False
+        del self._slots[slot][key]
+        return True
+
+    def advance(self) -> List[Hashable]:
+        """Moves one tick forward and returns the keys of the expired timers."""
+        self.ticks += 1
+        slot = self._slots[self.ticks % len(self._slots)]
+        expired = [key for key, expires in slot.items() if expires <= self.ticks]
+        for key in expired:
+            del slot[key]
+            del self._where[key]
+        return expired
+
+
+class _InFlight:
+    """Message waiting for its ACK."""
+
+    __slots__ = ("message", "attempts")
+
+    def __init__(self, message: AnyMessage) -> None:
+        self.message = message
+        self.attempts = 1
+
+
+class AckTracker:
+    """Window of the sent messages that are waiting for their ACK.
+
+    Messages are found by ``msg_id`` in O(1). Their retransmission timers live in
+    a :class:`TimerWheel` driven by a single timer of the event loop, which only
+    runs while there are messages in flight, so the number of messages in flight
+    does not change the number of tasks. A message is retransmitted after
+    ``timeout_seconds``, doubling the timeout after each attempt, and given up
+    after ``max_retries`` retransmissions. The retransmissions can be paused while
+    the link is down.
+
+    :param send: async function that retransmits a message
+    :param window_size: maximum number of messages in flight
+    :param timeout_seconds: time until the first retransmission of a message
+    :param max_retries: maximum retransmissions of a message
+    :param tick_seconds: resolution of the retransmission timers
+    :param on_expired: function called with the messages that are given up
+    :param on_acked: function called with the ``msg_id`` of the messages confirmed
+        by each ACK
+
+    Basic usage.
+
+    >>> from ..enums import MessageType
+    >>> async def send(message):
+    ...     pass
+    >>> tracker = AckTracker(send)
+    >>> async def main():
+    ...     for temp in range(3):
+    ...         message = {"type": MessageType.READING, "data": temp, "msg_id": temp}
+    ...         tracker.track(Message.load(message))
+    ...     acked = tracker.ack({"cumulative": 1})
+    ...     return acked, 2 in tracker
+    >>> asyncio.run(main())
+    (2, True)
+    """
+
+    def __init__(
+        self,
+        send: Callable[[AnyMessage], Awaitable],
+        window_size: int = DEFAULT_WINDOW_SIZE,
+        timeout_seconds: float = DEFAULT_TIMEOUT_SECONDS,
+        max_retries: int = DEFAULT_MAX_RETRIES,
+        tick_seconds: float = DEFAULT_TICK_SECONDS,
+        on_expired: Optional[Callable[[AnyMessage], Any]] = None,
+        on_acked: Optional[Callable[[List[int]], Any]] = None,
+    ) -> None:
+        if window_size < 1:
+            raise ValueError(f"window_size must be at least 1, got {window_size}")
+        self.send = send
+        self.window_size = window_size
+        self.timeout_seconds = timeout_seconds
+        self.max_retries = max_retries
+        self.on_expired = on_expired
+        self.on_acked = on_acked
+        self.acked = 0
+        self.retransmissions = 0
+        self.expired = 0
+        self.unknown = 0
+        self._pending: Dict[int, _InFlight] = {}
+        self._ids: List[int] = []
+        self._wheel = TimerWheel(tick_seconds)
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._paused = False
+        self._room = asyncio.Event()
+        self._room.set()
+        self._tasks: Set[asyncio.Task] = set()
+
+    def __len__(self) -> int:
+        return len(self._pending)
+
+    def __contains__(self, msg_id: int) -> bool:
+        return msg_id in self._pending
+
+    async def wait_for_room(self) -> None:
+        """Waits until the window has room for another message."""
+        while len(self._pending) >= self.window_size:
+            self._room.clear()
+            await self._room.wait()
+
+    def track(self, message: AnyMessage) -> None:
+        """Starts waiting for the ACK of a sent message.
+
+        :param message: sent message
+        """
+        msg_id = message.msg_id
+        if msg_id not in self._pending:
+            heapq.heappush(self._ids, msg_id)
+        self._pending[msg_id] = _InFlight(message)
+        self._wheel.schedule(msg_id, self.timeout_seconds)
+        if self._timer is None and not self._paused:
+            self._start_timer()
+
+    def ack(self, data: Any) -> int:
+        """Confirms the messages of the data of an ACK message.
+
+        :param data: cumulative ``msg_id``, list of ``msg_id`` or dict with both
+        :return: number of confirmed messages
+        """
+        cumulative, selective = None, ()
+        if isinstance(data, dict):
+            cumulative = data.get("cumulative")
+            selective = data.get("selective") or ()
+        elif isinstance(data, list):
+            selective = data
+        else:
+            cumulative = data
+        if cumulative is not None and not isinstance(cumulative, int):
+            raise ValueError(f"invalid cumulative ACK {cumulative!r}")
+
+        acked: List[int] = []
+        ids = self._ids
+        if cumulative is not None:
+            while ids and ids[0] <= cumulative:
+                msg_id = heapq.heappop(ids)
+                if self._release(msg_id):
+                    acked.append(msg_id)
+        for msg_id in selective:
+            if self._release(msg_id):
+                acked.append(msg_id)
+            else:
+                self.unknown += 1
+        if len(ids) > 2 * len(self._pending) + self.window_size:
+            self._ids = list(self._pending)
+            heapq.heapify(self._ids)
+        self.acked += len(acked)
+        if acked and self.on_acked is not None:
+            self.on_acked(acked)
+        return len(acked)
+
+    def pause(self) -> None:
+        """Stops the retransmissions, and the time of the timers, until resumed."""
+        self._paused = True
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+
+    def resume(self) -> None:
+        """Retransmits the messages again when their timers expire."""
+        self._paused = False
+        if self._timer is None and self._wheel:
+            self._start_timer()
+
+    async def close(self) -> None:
+        """Stops the retransmissions and waits for the ones being sent.
+
+        The messages still waiting for their ACK are given up, and passed to
+        ``on_expired``.
+        """
+        self.pause()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+        pending = [in_flight.message for in_flight in self._pending.values()]
+        for msg_id in list(self._pending):
+            self._release(msg_id)
+        self._ids = []
+        if pending:
+            logger.warning(f"{len(pending)} messages were not acknowledged")
+            if self.on_expired is not None:
+                for message in pending:
+                    self.on_expired(message)
+
+    def stats(self) -> Dict:
+        """Metrics of the window."""
+        return {
+            "in_flight": len(self._pending),
+            "window_size": self.window_size,
+            "acked": self.acked,
+            "retransmissions": self.retransmissions,
+            "expired": self.expired,
+            "unknown": self.unknown,
+        }
+
+    def _release(self, msg_id: int) -> bool:
+        """Forgets a message in flight.
+
+        :param msg_id: id of the message
+        :return: whether the message was in flight
+        """
+        if self._pending.pop(msg_id, None) is None:
+            return False
+        self._wheel.cancel(msg_id)
+        self._room.set()
+        return True
+
+    def _start_timer(self) -> None:
+        """Schedules the next tick of the wheel."""
+        self._timer = asyncio.get_running_loop().call_later(
+            self._wheel.tick_seconds, self._tick
+        )
+
+    def _tick(self) -> None:
+        """Retransmits the messages whose timers expired in a single task."""
+        self._timer = None
+        messages = []
+        for msg_id in self._wheel.advance():
+            in_flight = self._pending[msg_id]
+            if in_flight.attempts > self.max_retries:
+                self._release(msg_id)
+                self.expired += 1
+                logger.warning(f"message {msg_id} was not acknowledged")
+                if self.on_expired is not None:
+                    self.on_expired(in_flight.message)
+                continue
+            delay = self.timeout_seconds * 2**in_flight.attempts
+            in_flight.attempts += 1
+            self._wheel.schedule(msg_id, delay)
+            messages.append(in_flight.message)
+        if messages:
+            self.retransmissions += len(messages)
+            task = asyncio.create_task(self._retransmit(messages))
+            self._tasks.add(task)
+            task.add_done_callback(self._tasks.discard)
+        if self._wheel and not self._paused:
+            self._start_timer()
+
+    async def _retransmit(self, messages: List[AnyMessage]) -> None:
+        """Sends the messages again capturing and logging any error.
+
+        :param messages: messages to retransmit
+        """
+        try:
+            for message in messages:
+                await self.send(message)
+        except Exception as e:
+            logger.error(f"retransmission failed - {e.__class__.__name__}: {e}")
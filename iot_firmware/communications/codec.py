@@ -0,0 +1,326 @@
+"""Module with the compact binary wire format of the communications package.
+
+Every encoded message is a fixed size header followed by the encoded data::
+
+    format (u8) | type (u8) | api_version (3 x u16) | id (u64) | timestamp (f64)
+    | msg_id (u64) | data size (u32) | data
+
+The data is encoded with :mod:`~iot_firmware.communications.encoding`.
+"""
+import struct
+from typing import Any
+from typing import Tuple
+from typing import Union
+
+from ..enums import MessageType
+from .encoding import CodecError
+from .encoding import decode_data
+from .encoding import encode_data
+from .schema import API_VERSION
+from .schema import Message
+from .schema import Version
+
+Buffer = Union[bytes, bytearray, memoryview]
+
+FORMAT_VERSION = 1
+
+HEADER = struct.Struct("<BB3HQdQI")
+VERSION = struct.Struct("<3H")
+
+# plain strings, as the type of the messages loaded from dicts
+MESSAGE_TYPES = tuple(message_type.value for message_type in MessageType)
+_MESSAGE_TYPE_INDEX = {message_type: i for i, message_type in enumerate(MESSAGE_TYPES)}
+
+
+def encode_version(version: Version) -> bytes:
+    """Encodes a Version into bytes.
+
+    :param version: version to encode
+
+    >>> decode_version(encode_version(Version(1, 2, 3)))
+    1.2.3
+    """
+    return VERSION.pack(version.major, version.minor, version.patch)
+
+
+def decode_version(buffer: Buffer, offset: int = 0) -> Version:
+    """Decodes a Version from a buffer.
+
+    :param buffer: buffer that contains the version
+    :param offset: position of the version in the buffer
+    """
+    return Version(*VERSION.unpack_from(buffer, offset))
+
+
+def _decode_body(view: memoryview) -> Any:
+    """Decodes the data of a message, which must fill the whole view.
+
+    :param view: memoryview of the encoded data
+    """
+    try:
+        data, end = decode_data(view)
+    except IndexError:
+        raise CodecError("truncated message data") from None
+    except (struct.error, TypeError, ValueError, RecursionError) as e:
+        raise CodecError(f"corrupt message data - {e!r}") from None
+    if end != len(view):
+        raise CodecError("message data size does not match its header")
+    return data
+
+
+_UNDECODED = object()
+
+
+class LazyMessage:
+    """Message view over a received buffer that decodes its data on demand.
+
+    The header fields are available right away, while the data is decoded and
+    validated only when it is accessed for the first time. Until then, the
+    encoded data is only referenced through a memoryview, so the buffer must not
+    be resized while the message is alive.
+
+    :param raw_data: memoryview of the encoded data
+    :param type: the type of the message
+    :param id: the device id
+    :param timestamp: timestamp of the message
+    :param api_version: api version of the message
+    :param msg_id: id of the message
+
+    Basic usage.
+
+    >>> codec = MessageCodec()
+    >>> message = Message.load({"type": MessageType.READING, "data": {"temp": 24.3}})
+    >>> lazy = codec.decode_lazy(codec.encode(message))
+    >>> lazy.type, lazy.decoded
+    ('reading', False)
+    >>> lazy.data
+    {'temp': 24.3}
+    >>> lazy.to_message() == message
+    True
+    """
+
+    __slots__ = ("type", "id", "timestamp", "api_version", "msg_id", "_raw", "_data")
+
+    def __init__(
+        self,
+        raw_data: memoryview,
+        type: str,
+        id: int,
+        timestamp: float,
+        api_version: Version,
+        msg_id: int,
+    ) -> None:
+        self.type = type
+        self.id = id
+        self.timestamp = timestamp
+        self.api_version = api_version
+        self.msg_id = msg_id
+        self._raw = raw_data
+        self._data = _UNDECODED
+
+    @property
+    def data(self) -> Any:
+        """Data of the message, decoded the first time it is accessed."""
+        if self._data is _UNDECODED:
+            self._data = _decode_body(self._raw)
+        return self._data
+
+    @property
+    def raw_data(self) -> memoryview:
+        """Encoded data of the message."""
+        return self._raw
+
+    @property
+    def decoded(self) -> bool:
+        """Whether the data has been already decoded."""
+        return self._data is not _UNDECODED
+
+    def to_message(self) -> Message:
+        """Creates a Message decoding the data if needed."""
+        return Message(
+            type=self.type,
+            data=self.data,
+            id=self.id,
+            timestamp=self.timestamp,
+            api_version=self.api_version,
+            msg_id=self.msg_id,
+        )
+
+    def __repr__(self) -> str:
+        """Representation of the message without decoding its data."""
+        data = repr(self._data) if self.decoded else f"<{len(self._raw)} bytes>"
+        return (
+            f"LazyMessage(type={self.type!r}, data={data}, id={self.id}, "
+            f"timestamp={self.timestamp}, api_version={self.api_version}, "
+            f"msg_id={self.msg_id})"
+        )
+
+
+class MessageCodec:
+    """Binary codec of Messages for an api version.
+
+    Messages of another major api version are rejected when decoding.
+
+    :param api_version: version of the api that the codec will use
+
+    Basic usage.
+
+    >>> codec = MessageCodec()
+    >>> message = Message.load({"type": MessageType.READING, "data": {"temp": 24.3}})
+    >>> encoded = codec.encode(message)
+    >>> codec.decode(encoded) == message
+    True
+    """
+
+    def __init__(self, api_version: Version = API_VERSION) -> None:
+        self.api_version = api_version
+
+    def encode(self, message: Union[Message, "LazyMessage"]) -> bytes:
+        """Encodes a Message into bytes.
+
+        :param message: message to encode
+        """
+        buffer = bytearray()
+        self.encode_into(message, buffer)
+        return bytes(buffer)
+
+    def encode_into(
+        self, message: Union[Message, "LazyMessage"], buffer: bytearray
+    ) -> int:
+        """Appends an encoded Message to a buffer.
+
+        It returns the amount of bytes written. The data of a LazyMessage that
+        was never accessed is copied as it is, without decoding it.
+
+        :param message: message to encode
+        :param buffer: buffer where the message is appended
+        """
+        start = len(buffer)
+        buffer += bytes(HEADER.size)
+        try:
+            if isinstance(message, LazyMessage) and not message.decoded:
+                buffer += message.raw_data
+            else:
+                encode_data(message.data, buffer)
+            HEADER.pack_into(
+                buffer,
+                start,
+                FORMAT_VERSION,
+                _MESSAGE_TYPE_INDEX[message.type],
+                message.api_version.major,
+                message.api_version.minor,
+                message.api_version.patch,
+                message.id,
+                message.timestamp,
+                message.msg_id,
+                len(buffer) - start - HEADER.size,
+            )
+        except TypeError:
+            del buffer[start:]
+            raise
+        except (KeyError, struct.error) as error:
+            del buffer[start:]
+            raise ValueError(f"message {message} cannot be encoded: {error}") from None
+        return len(buffer) - start
+
+    def decode(self, buffer: Buffer) -> Message:
+        """Decodes a Message from a buffer that only contains that message.
+
+        :param buffer: buffer with the encoded message
+        """
+        message, offset = self.decode_from(buffer)
+        if offset != len(buffer):
+            raise CodecError(f"{len(buffer) - offset} unexpected trailing bytes")
+        return message
+
+    def decode_from(self, buffer: Buffer, offset: int = 0) -> Tuple[Message, int]:
+        """Decodes a Message from a position of a buffer.
+
+        It returns the message and the position right after it, so that many
+        messages can be read from the same buffer without copying it.
+
+        :param buffer: buffer with the encoded message
+        :param offset: position of the message in the buffer
+        """
+        view = memoryview(buffer)
+        header, start, end = self.decode_header(view, offset)
+        return Message(data=_decode_body(view[start:end]), **header), end
+
+    def decode_lazy(self, buffer: Buffer) -> "LazyMessage":
+        """Decodes a LazyMessage from a buffer that only contains that message.
+
+        :param buffer: buffer with the encoded message
+        """
+        message, offset = self.decode_lazy_from(buffer)
+        if offset != len(buffer):
+            raise CodecError(f"{len(buffer) - offset} unexpected trailing bytes")
+        return message
+
+    def decode_lazy_from(
+        self, buffer: Buffer, offset: int = 0
+    ) -> Tuple["LazyMessage", int]:
+        """Decodes only the header of a Message from a position of a buffer.
+
+        The data is decoded the first time it is accessed. It returns the message
+        and the position right after it.
+
+        :param buffer: buffer with the encoded message
+        :param offset: position of the message in the buffer
+        """
+        view = memoryview(buffer)
+        header, start, end = self.decode_header(view, offset)
+        return LazyMessage(view[start:end], **header), end
+
+    def decode_header(self, view: memoryview, offset: int = 0) -> Tuple[dict, int, int]:
+        """Decodes the header of a Message.
+
+        It returns the header fields and where the encoded data starts and ends.
+
+        :param view: memoryview of the buffer with the encoded message
+        :param offset: position of the message in the buffer
+        """
+        try:
+            (
+                format_version,
+                message_type,
+                major,
+                minor,
+                patch,
+                device_id,
+                timestamp,
+                msg_id,
+                size,
+            ) = HEADER.unpack_from(view, offset)
+        except struct.error:
+            raise CodecError("truncated message header") from None
+        if format_version != FORMAT_VERSION:
+            raise CodecError(f"unsupported format version {format_version}")
+        if major != self.api_version.major:
+            raise CodecError(
+                f"api version {major}.{minor}.{patch} is not compatible "
+                f"with {self.api_version}"
+            )
+        if message_type >= len(MESSAGE_TYPES):
+            raise CodecError(f"unknown message type {message_type}")
+        start = offset + HEADER.size
+        if start + size > len(view):
+            raise CodecError("truncated message data")
+        header = {
+            "type": MESSAGE_TYPES[message_type],
+            "id": device_id,
+            "timestamp": timestamp,
+            "api_version": self._version(major, minor, patch),
+            "msg_id": msg_id,
+        }
+        return header, start, start + size
+
+    def _version(self, major: int, minor: int, patch: int) -> Version:
+        """Reuses the version of the codec whenever it is the same one."""
+        api_version = self.api_version
+        if (major, minor, patch) == (
+            api_version.major,
+            api_version.minor,
+            api_version.patch,
+        ):
+            return api_version
+        return Version(major, minor, patch)
@@ -0,0 +1,138 @@
+"""Module with the compact binary encoding of JSON like data.
+
+Data is encoded with one byte tags followed by its content. Small positive
+integers are stored in the tag itself and the rest of the integers and all
+sizes use variable length integers.
+
+It does not depend on the message schemas, so it is cheap to import.
+"""
+import struct
+from typing import Any
+from typing import Tuple
+
+FLOAT = struct.Struct("<d")
+
+_NONE = 0x00
+_FALSE = 0x01
+_TRUE = 0x02
+_INT = 0x03
+_FLOAT = 0x04
+_STR = 0x05
+_BYTES = 0x06
+_LIST = 0x07
+_DICT = 0x08
+_FIXINT = 0x80
+
+
+class CodecError(ValueError):
+    """Raised when a buffer cannot be decoded."""
+
+
+def _write_varint(buffer: bytearray, value: int) -> None:
+    while value > 0x7F:
+        buffer.append(value & 0x7F | 0x80)
+        value >>= 7
+    buffer.append(value)
+
+
+def _read_varint(view: memoryview, offset: int) -> Tuple[int, int]:
+    value = shift = 0
+    while True:
+        byte = view[offset]
+        offset += 1
+        value |= (byte & 0x7F) << shift
+        if byte < 0x80:
+            return value, offset
+        shift += 7
+
+
+def encode_data(data: Any, buffer: bytearray) -> None:
+    """Appends the encoded data to a buffer.
+
+    :param data: JSON like data (None, bool, int, float, str, bytes, list, dict)
+    :param buffer: buffer where the data is appended
+    """
+    kind = type(data)
+    if data is None:
+        buffer.append(_NONE)
+    elif kind is bool:
+        buffer.append(_TRUE if data else _FALSE)
+    elif isinstance(data, int):
+        if 0 <= data < _FIXINT:
+            buffer.append(_FIXINT | data)
+        else:
+            buffer.append(_INT)
+            _write_varint(buffer, data << 1 if data >= 0 else (-data << 1) - 1)
+    elif isinstance(data, float):
+        buffer.append(_FLOAT)
+        buffer += FLOAT.pack(data)
+    elif isinstance(data, str):
+        encoded = data.encode()
+        buffer.append(_STR)
+        _write_varint(buffer, len(encoded))
+        buffer += encoded
+    elif isinstance(data, (bytes, bytearray, memoryview)):
+        buffer.append(_BYTES)
+        _write_varint(buffer, len(data))
+        buffer += data
+    elif isinstance(data, (list, tuple)):
+        buffer.append(_LIST)
+        _write_varint(buffer, len(data))
+        for item in data:
+            encode_data(item, buffer)
+    elif isinstance(data, dict):
+        buffer.append(_DICT)
+        _write_varint(buffer, len(data))
+        for key, value in data.items():
+            encode_data(key, buffer)
+            encode_data(value, buffer)
+    else:
+        raise TypeError(f"object of type {kind.__name__} cannot be encoded")
+
+
+def decode_data(view: memoryview, offset: int = 0) -> Tuple[Any, int]:
+    """Decodes data from a buffer.
+
+    It returns the data and the position right after it.
+
+    :param view: memoryview of the buffer that contains the encoded data
+    :param offset: position of the data in the buffer
+    """
+    tag = view[offset]
+    offset += 1
+    if tag >= _FIXINT:
+        return tag & 0x7F, offset
+    if tag == _NONE:
+        return None, offset
+    if tag == _FALSE:
+        return False, offset
+    if tag == _TRUE:
+        return True, offset
+    if tag == _INT:
+        value, offset = _read_varint(view, offset)
+        return value >> 1 if not value & 1 else -((value + 1) >> 1), offset
+    if tag == _FLOAT:
+        return FLOAT.unpack_from(view, offset)[0], offset + FLOAT.size
+    if tag == _STR:
+        size, offset = _read_varint(view, offset)
+        end = offset + size
+        return str(view[offset:end], "utf-8"), end
+    if tag == _BYTES:
+        size, offset = _read_varint(view, offset)
+        end = offset + size
+        return bytes(view[offset:end]), end
+    if tag == _LIST:
+        size, offset = _read_varint(view, offset)
+        items = []
+        for _ in range(size):
+            item, offset = decode_data(view, offset)
+            items.append(item)
+        return items, offset
+    if tag == _DICT:
+        size, offset = _read_varint(view, offset)
+        items = {}
+        for _ in range(size):
+            key, offset = decode_data(view, offset)
+            items[key], offset = decode_data(view, offset)
+        return items, offset
+    raise CodecError(f"unknown data tag {tag:#04x}")
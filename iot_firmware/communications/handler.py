@@ -1,14 +1,59 @@
 """Module in charge of handling Messages from the external communications."""
 import logging
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Union
 
+from ..enums import DrainOrder
+from ..enums import MessageType
+from .ack import AckTracker
+from .ack import DEFAULT_MAX_RETRIES
+from .ack import DEFAULT_TIMEOUT_SECONDS
+from .codec import LazyMessage
+from .codec import MessageCodec
 from .schema import API_VERSION
+from .schema import Message
+from .schema import persist_msg_ids
 from .schema import Version
+from .store import DEFAULT_MAX_AGE_SECONDS
+from .store import DEFAULT_MAX_BYTES
+from .store import MessageStore
+from .uplink import DEFAULT_MAX_DELAY_SECONDS
+from .uplink import DEFAULT_MAX_FRAME_BYTES
+from .uplink import Transport
+from .uplink import Uplink
 
 
 class CommunicationsHandler:
     """Class that handles external communications.
 
+    Outgoing messages are collected into frames that are sent with the transport
+    (see :class:`~iot_firmware.communications.uplink.Uplink`). While the link is
+    down they are kept in the store, and they are forwarded when it is back (see
+    :class:`~iot_firmware.communications.store.MessageStore`), staying stored
+    until their frame is written (or they are acknowledged). Sent messages can
+    wait for their ACK in a window, being retransmitted until they are
+    acknowledged (see :class:`~iot_firmware.communications.ack.AckTracker`).
+
     :param api_version: version of the api that the handler will use
+    :param transport: async function that sends a frame (None to not send)
+    :param max_frame_bytes: size budget of a frame, including its header
+    :param max_delay_seconds: maximum time that a message waits for its frame
+    :param compression_level: zlib level of the frames (None to not compress)
+    :param store_path: directory where the messages are stored while the link is
+        down (None to not store them)
+    :param store_max_bytes: maximum size of the stored messages
+    :param store_max_age_seconds: maximum age of a stored message
+    :param reading_order: order of the stored readings when they are forwarded
+    :param ack_window: maximum number of messages waiting for their ACK (0 to not
+        wait for ACKs)
+    :param ack_timeout_seconds: time until the first retransmission of a message
+    :param ack_max_retries: maximum retransmissions of a message, after that it is
+        stored (if there is a store) or dropped
+    :param msg_id_path: file where the automatic ``msg_id`` are reserved so they
+        do not repeat after a reboot (None to count them in memory, then the
+        messages stored before a reboot can take the ``msg_id`` of new ones)
 
     Basic usage.
 
@@ -18,6 +63,159 @@ class CommunicationsHandler:
     1.2.3
     """
 
-    def __init__(self, api_version: Version = API_VERSION):
+    def __init__(
+        self,
+        api_version: Version = API_VERSION,
+        transport: Optional[Transport] = None,
+        max_frame_bytes: int = DEFAULT_MAX_FRAME_BYTES,
+        max_delay_seconds: float = DEFAULT_MAX_DELAY_SECONDS,
+        compression_level: Optional[int] = None,
+        store_path: Optional[str] = None,
+        store_max_bytes: int = DEFAULT_MAX_BYTES,
+        store_max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS,
+        reading_order: DrainOrder = DrainOrder.OLDEST_FIRST,
+        ack_window: int = 0,
+        ack_timeout_seconds: float = DEFAULT_TIMEOUT_SECONDS,
+        ack_max_retries: int = DEFAULT_MAX_RETRIES,
+        msg_id_path: Optional[str] = None,
+    ):
         self.api_version = api_version
+        self.codec = MessageCodec(api_version)
+        if msg_id_path is not None:
+            persist_msg_ids(msg_id_path)
+        self.online = True
+        self.uplink: Optional[Uplink] = None
+        if transport is not None:
+            self.uplink = Uplink(
+                transport,
+                self.codec,
+                max_frame_bytes,
+                max_delay_seconds,
+                compression_level,
+                on_frame=self._frame_done,
+            )
+        self.store: Optional[MessageStore] = None
+        if store_path is not None:
+            if msg_id_path is None:
+                logging.warning(
+                    "msg_id are not persistent, they can repeat stored ones"
+                )
+            self.store = MessageStore(
+                store_path,
+                self.codec,
+                store_max_bytes,
+                store_max_age_seconds,
+                reading_order,
+            )
+        self.acks: Optional[AckTracker] = None
+        if ack_window:
+            if self.uplink is None:
+                raise ValueError("ACKs cannot be tracked without a transport")
+            self.acks = AckTracker(
+                self.uplink.send,
+                ack_window,
+                ack_timeout_seconds,
+                ack_max_retries,
+                on_expired=None if self.store is None else self.store.put,
+                on_acked=None if self.store is None else self.store.confirm,
+            )
         logging.info(f"using api version {api_version}")
+
+    async def send(self, message: Union[Message, LazyMessage]) -> None:
+        """Sends a message in the next frame, or stores it while the link is down.
+
+        When ACKs are tracked, it waits for room in the window first.
+
+        :param message: message to send
+        """
+        if not self.online:
+            self.store.put(message)
+            return
+        if self.uplink is None:
+            raise RuntimeError("communications handler does not have a transport")
+        await self._send(message)
+
+    def acknowledge(self, message: Union[Message, LazyMessage]) -> int:
+        """Confirms the sent messages of a received ACK message.
+
+        :param message: received ACK message
+        :return: number of confirmed messages
+        """
+        if message.type != MessageType.ACK:
+            raise ValueError(f"message of type {message.type} is not an ACK")
+        if self.acks is None:
+            return 0
+        return self.acks.ack(message.data)
+
+    def disconnect(self) -> None:
+        """Stores the messages until the link is back."""
+        if self.store is None:
+            raise RuntimeError("communications handler does not have a store")
+        self.online = False
+        if self.acks is not None:
+            self.acks.pause()
+        logging.warning("communications link is down, storing messages")
+
+    async def reconnect(self) -> int:
+        """Sends the messages again and forwards the stored ones.
+
+        :return: number of forwarded messages
+        """
+        self.online = True
+        if self.acks is not None:
+            self.acks.resume()
+        if self.store is None or self.uplink is None:
+            return 0
+        forwarded = await self.store.drain(self._send, keep=True)
+        logging.info(f"communications link is up, forwarded {forwarded} messages")
+        return forwarded
+
+    async def close(self) -> None:
+        """Sends the pending messages and writes the stored ones to the disk.
+
+        The sent messages that were not acknowledged yet are stored (if there is
+        a store), so they are forwarded again after a restart.
+        """
+        if self.acks is not None:
+            await self.acks.close()
+        if self.uplink is not None:
+            await self.uplink.close()
+        if self.store is not None:
+            self.store.close()
+
+    async def _send(self, message: Union[Message, LazyMessage]) -> None:
+        """Sends a message in the next frame, tracking its ACK if needed.
+
+        :param message: message to send
+        """
+        if self.acks is not None and message.type != MessageType.ACK:
+            await self.acks.wait_for_room()
+            self.acks.track(message)
+        await self.uplink.send(message)
+
+    def _frame_done(self, msg_ids: List[int], error: Optional[Exception]) -> None:
+        """Removes the forwarded messages of a written frame from the store.
+
+        With ACKs they are removed once acknowledged instead, and the messages of
+        a frame that failed are retransmitted, otherwise they are forwarded again.
+
+        :param msg_ids: ids of the messages of the frame
+        :param error: error of the frame (None if it was written)
+        """
+        if self.store is None or self.acks is not None:
+            return
+        if error is None:
+            self.store.confirm(msg_ids)
+        else:
+            self.store.release(msg_ids)
+
+    def stats(self) -> Dict:
+        """Metrics of the uplink and the store."""
+        stats = {}
+        if self.uplink is not None:
+            stats["uplink"] = self.uplink.stats()
+        if self.store is not None:
+            stats["store"] = self.store.stats()
+        if self.acks is not None:
+            stats["acks"] = self.acks.stats()
+        return stats
@@ -4,15 +4,40 @@ from dataclasses import dataclass
 from dataclasses import field
 from typing import Any
 from typing import Dict
+from typing import Iterable
+from typing import Iterator
+from typing import List
+from typing import Tuple
+from typing import Union
 
 import marshmallow_dataclass
+from marshmallow import Schema
 from marshmallow import validate
+from marshmallow import ValidationError
 
 from ..enums import MessageType
-from .utils import Counter
+from .utils import BlockCounter
+from .utils import DEFAULT_BLOCK_SIZE
+from .validator import Loader
 from iot_firmware.schema import get_device_id
 
-msg_id_counter = Counter()
+msg_id_counter = BlockCounter()
+
+_schema_cache: Dict[Tuple[type, Tuple[int, int, int]], Schema] = {}
+_loader_cache: Dict[Tuple[type, Tuple[int, int, int]], Loader] = {}
+
+
+def persist_msg_ids(path: str, block_size: int = DEFAULT_BLOCK_SIZE) -> None:
+    """Reserves the automatic ``msg_id`` of the messages in blocks in a file.
+
+    That way they do not repeat after a reboot, continuing after the ones already
+    given in this process.
+
+    :param path: file where the blocks are reserved
+    :param block_size: number of ``msg_id`` of each block
+    """
+    global msg_id_counter
+    msg_id_counter = BlockCounter(path, block_size, start=msg_id_counter())
 
 
 @dataclass
@@ -110,11 +135,102 @@ class Message:
     )
 
     @classmethod
-    def load(cls, message: Dict) -> "Message":
+    def schema(cls, api_version: Version = API_VERSION) -> Schema:
+        """Returns the marshmallow schema of the class for an api version.
+
+        Schemas are built only once per class and api version and then reused.
+
+        :param api_version: version used as default for the ``api_version`` field
+
+        >>> Message.schema() is Message.schema()
+        True
+        """
+        key = (cls, (api_version.major, api_version.minor, api_version.patch))
+        schema = _schema_cache.get(key)
+        if schema is None:
+            schema = marshmallow_dataclass.class_schema(cls)()
+            schema.fields["api_version"].load_default = api_version
+            _schema_cache[key] = schema
+        return schema
+
+    @classmethod
+    def loader(cls, api_version: Version = API_VERSION) -> Loader:
+        """Returns the compiled loader of the class for an api version.
+
+        It validates the common messages without marshmallow and falls back to
+        the schema for anything else, so results and errors are the same.
+
+        :param api_version: version used as default for the ``api_version`` field
+        """
+        key = (cls, (api_version.major, api_version.minor, api_version.patch))
+        loader = _loader_cache.get(key)
+        if loader is None:
+            loader = _loader_cache[key] = Loader(cls, cls.schema(api_version))
+        return loader
+
+    @classmethod
+    def load(cls, message: Dict, api_version: Version = API_VERSION) -> "Message":
         """Loads a dict to a Message class and creates an instance of it.
 
         :param message: dict of the data
+        :param api_version: version used when the message does not specify it
+        """
+        return cls.loader(api_version)(message)
+
+    @classmethod
+    def iter_load(
+        cls, messages: Iterable[Dict], api_version: Version = API_VERSION
+    ) -> Iterator[Union["Message", ValidationError]]:
+        """Lazily loads many dicts, one at a time.
+
+        Invalid messages do not stop the iteration, their error is yielded instead.
+
+        :param messages: iterable of dicts of the data
+        :param api_version: version used when a message does not specify it
+
+        >>> data = [{"type": MessageType.ACK, "data": 1}, {"data": 2}]
+        >>> [type(item).__name__ for item in Message.iter_load(data)]
+        ['Message', 'ValidationError']
         """
+        load = cls.loader(api_version)
+        for message in messages:
+            try:
+                yield load(message)
+            except ValidationError as error:
+                yield error
+
+    @classmethod
+    def load_many(
+        cls, messages: Iterable[Dict], api_version: Version = API_VERSION
+    ) -> "LoadResult":
+        """Loads many dicts collecting the errors instead of aborting.
+
+        :param messages: iterable of dicts of the data
+        :param api_version: version used when a message does not specify it
+
+        >>> data = [{"type": MessageType.ACK, "data": 1}, {"data": 2}]
+        >>> result = Message.load_many(data)
+        >>> len(result.messages)
+        1
+        >>> result.errors
+        {1: {'type': ['Missing data for required field.']}}
+        """
+        result = LoadResult()
+        for i, item in enumerate(cls.iter_load(messages, api_version)):
+            if isinstance(item, ValidationError):
+                result.errors[i] = item.messages
+            else:
+                result.messages.append(item)
+        return result
+
+
+@dataclass
+class LoadResult:
+    """Result of loading many messages at once.
+
+    :param messages: valid messages in the same order they were received
+    :param errors: validation errors indexed by the position of the invalid message
+    """
 
-        schema = marshmallow_dataclass.class_schema(cls)()
-        return schema.load(message)
+    messages: List[Message] = field(default_factory=list)
+    errors: Dict[int, Dict] = field(default_factory=dict)
@@ -0,0 +1,483 @@
+"""Module with the disk-backed store-and-forward queue of outgoing messages.
+
+Messages are appended to segment files in a directory, each one as a checksummed
+record with the encoded message::
+
+    size (u32) | crc32 (u32) | encoded message
+
+Removed messages are appended as the offset (u64) of their record to a deletion
+file next to their segment, and a segment is deleted with its deletion file once
+all its messages are removed. Both files are written in batches.
+"""
+import logging
+import os
+import struct
+import time
+import zlib
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
+from typing import Union
+
+from ..enums import DrainOrder
+from ..enums import MessageType
+from .codec import CodecError
+from .codec import LazyMessage
+from .codec import MessageCodec
+from .schema import Message
+
+logger = logging.getLogger(__name__)
+
+RECORD = struct.Struct("<II")
+OFFSET = struct.Struct("<Q")
+
+DEFAULT_MAX_BYTES = 16 * 1024 * 1024
+DEFAULT_MAX_AGE_SECONDS = 7 * 24 * 60 * 60
+DEFAULT_SEGMENT_BYTES = 256 * 1024
+DEFAULT_WRITE_BATCH_BYTES = 64 * 1024
+
+_SEGMENT_SUFFIX = ".seg"
+_DELETED_SUFFIX = ".del"
+
+
+class _Entry:
+    """Position of a stored message."""
+
+    __slots__ = ("segment", "offset", "size", "timestamp", "reading")
+
+    def __init__(
+        self, segment: int, offset: int, size: int, timestamp: float, reading: bool
+    ) -> None:
+        self.segment = segment
+        self.offset = offset
+        self.size = size
+        self.timestamp = timestamp
+        self.reading = reading
+
+
+class _Segment:
+    """Counters of a segment file."""
+
+    __slots__ = ("live", "size")
+
+    def __init__(self) -> None:
+        self.live = 0
+        self.size = 0
+
+
+class MessageStore:
+    """Disk-backed queue of the messages that could not be sent.
+
+    Messages are indexed by ``msg_id`` (storing a message again replaces the stored
+    copy, while a different message with a stored ``msg_id`` is refused) and kept
+    in arrival order. When the stored messages
+    exceed ``max_bytes`` the oldest ones are dropped, and messages older than
+    ``max_age_seconds`` expire. Writes are kept in memory until
+    ``write_batch_bytes`` are pending or :meth:`flush` is called, so a crash can
+    lose the last batch.
+
+    :param path: directory of the segment files, it is created if it does not exist
+    :param codec: codec of the messages
+    :param max_bytes: maximum size of the stored messages
+    :param max_age_seconds: maximum age of a stored message
+    :param reading_order: order of the readings when the queue is drained
+    :param segment_bytes: size after which a new segment file is started
+    :param write_batch_bytes: pending bytes that trigger a write to the disk
+
+    Basic usage.
+
+    >>> import asyncio, tempfile
+    >>> path = tempfile.mkdtemp()
+    >>> store = MessageStore(path)
+    >>> for temp in (20, 21):
+    ...     store.put(Message.load({"type": MessageType.READING, "data": temp}))
+    >>> store.close()
+    >>> store = MessageStore(path)
+    >>> len(store)
+    2
+    >>> async def send(message):
+    ...     print(message.data)
+    >>> asyncio.run(store.drain(send))
+    20
+    21
+    2
+    """
+
+    def __init__(
+        self,
+        path: str,
+        codec: Optional[MessageCodec] = None,
+        max_bytes: int = DEFAULT_MAX_BYTES,
+        max_age_seconds: float = DEFAULT_MAX_AGE_SECONDS,
+        reading_order: DrainOrder = DrainOrder.OLDEST_FIRST,
+        segment_bytes: int = DEFAULT_SEGMENT_BYTES,
+        write_batch_bytes: int = DEFAULT_WRITE_BATCH_BYTES,
+    ) -> None:
+        self.path = path
+        self.codec = codec or MessageCodec()
+        self.max_bytes = max_bytes
+        self.max_age_seconds = max_age_seconds
+        self.reading_order = DrainOrder(reading_order)
+        self.segment_bytes = segment_bytes
+        self.write_batch_bytes = write_batch_bytes
+        self.bytes = 0
+        self.dropped = 0
+        self.expired = 0
+        self.forwarded = 0
+        self.collisions = 0
+        self.writes = 0
+        self.reads = 0
+        self._index: Dict[int, _Entry] = {}
+        # forwarded messages that are kept until their delivery is confirmed
+        self._in_flight: Set[int] = set()
+        self._segments: Dict[int, _Segment] = {}
+        self._pending = bytearray()
+        self._deleted: Dict[int, bytearray] = {}
+        os.makedirs(path, exist_ok=True)
+        self._load()
+        self._active = max(self._segments, default=0) + 1
+        self._segments[self._active] = _Segment()
+        self._expire(time.time())
+
+    def __len__(self) -> int:
+        return len(self._index)
+
+    def __contains__(self, msg_id: int) -> bool:
+        return msg_id in self._index
+
+    def put(self, message: Union[Message, LazyMessage]) -> None:
+        """Stores a message.
+
+        It raises a ValueError if a different message with the same ``msg_id`` is
+        stored, which happens when the ``msg_id`` are not persistent and they
+        start again after a reboot.
+
+        :param message: message to store
+        """
+        entry = self._index.get(message.msg_id)
+        if entry is not None and entry.timestamp != message.timestamp:
+            self.collisions += 1
+            raise ValueError(f"another message {message.msg_id} is already stored")
+        pending = self._pending
+        start = len(pending)
+        pending += bytes(RECORD.size)
+        try:
+            self.codec.encode_into(message, pending)
+        except (TypeError, ValueError):
+            del pending[start:]
+            raise
+        data_start = start + RECORD.size
+        crc = zlib.crc32(pending[data_start:])
+        RECORD.pack_into(pending, start, len(pending) - data_start, crc)
+
+        if message.msg_id in self._index:
+            self.remove(message.msg_id)
+        segment = self._segments[self._active]
+        entry = _Entry(
+            self._active,
+            segment.size + start,
+            len(pending) - start,
+            message.timestamp,
+            message.type == MessageType.READING,
+        )
+        self._index[message.msg_id] = entry
+        segment.live += 1
+        self.bytes += entry.size
+        while self.bytes > self.max_bytes:
+            msg_id = next(iter(self._index))
+            logger.warning(f"stored message {msg_id} was dropped -> store is full")
+            self.remove(msg_id)
+            self.dropped += 1
+        self._expire(time.time())
+        if len(pending) >= self.write_batch_bytes:
+            self.flush()
+
+    def get(self, msg_id: int) -> Optional[LazyMessage]:
+        """Stored message with a ``msg_id``, if any.
+
+        :param msg_id: id of the message
+        """
+        entry = self._index.get(msg_id)
+        if entry is None:
+            return None
+        self.flush()
+        return self._read(entry, {})
+
+    def remove(self, msg_id: int) -> bool:
+        """Removes a stored message.
+
+        :param msg_id: id of the message
+        :return: whether the message was stored
+        """
+        entry = self._index.pop(msg_id, None)
+        if entry is None:
+            return False
+        self._in_flight.discard(msg_id)
+        self.bytes -= entry.size
+        self._segments[entry.segment].live -= 1
+        deleted = self._deleted.get(entry.segment)
+        if deleted is None:
+            deleted = self._deleted[entry.segment] = bytearray()
+        deleted += OFFSET.pack(entry.offset)
+        return True
+
+    async def drain(
+        self,
+        send: Callable[[LazyMessage], Awaitable],
+        max_messages: Optional[int] = None,
+        keep: bool = False,
+    ) -> int:
+        """Sends the stored messages and removes them once they are sent.
+
+        Messages are sent in arrival order. With newest first readings, the rest
+        of the messages are sent first and then the readings from the newest one.
+        It stops at the first error, keeping the messages that were not sent.
+
+        With ``keep``, sent messages stay stored until their delivery is confirmed
+        with :meth:`confirm` (or they are put back with :meth:`release`), and
+        they are not sent again meanwhile.
+
+        :param send: async function that sends a message
+        :param max_messages: maximum number of messages sent (None for all)
+        :param keep: keep the sent messages until they are confirmed
+        :return: number of sent messages
+        """
+        self._expire(time.time())
+        self.flush()
+        order = self._order()
+        if self._in_flight:
+            order = [msg_id for msg_id in order if msg_id not in self._in_flight]
+        if max_messages is not None:
+            order = order[:max_messages]
+        cache: Dict[int, bytes] = {}
+        sent = 0
+        for msg_id in order:
+            entry = self._index.get(msg_id)
+            if entry is None:
+                continue
+            message = self._read(entry, cache)
+            try:
+                await send(message)
+            except Exception as e:
+                logger.error(
+                    f"stored message {msg_id} could not be sent "
+                    f"- {e.__class__.__name__}: {e}"
+                )
+                break
+            if keep:
+                self._in_flight.add(msg_id)
+            else:
+                self.remove(msg_id)
+            sent += 1
+        self.forwarded += sent
+        self.flush()
+        return sent
+
+    def confirm(self, msg_ids: Iterable[int]) -> int:
+        """Removes the kept messages that were delivered.
+
+        :param msg_ids: ids of the delivered messages, the ones that were not
+            forwarded with ``keep`` are ignored
+        :return: number of removed messages
+        """
+        if not self._in_flight:
+            return 0
+        return sum(
+            self.remove(msg_id) for msg_id in msg_ids if msg_id in self._in_flight
+        )
+
+    def release(self, msg_ids: Iterable[int]) -> None:
+        """Sends again, in the next drain, kept messages that were not delivered.
+
+        :param msg_ids: ids of the messages that were not delivered
+        """
+        self._in_flight.difference_update(msg_ids)
+
+    def flush(self) -> None:
+        """Writes the pending messages and removals to the disk."""
+        if self._pending:
+            path = self._file(self._active, _SEGMENT_SUFFIX)
+            self._append(path, self._pending)
+            self._segments[self._active].size += len(self._pending)
+            self._pending = bytearray()
+            self.writes += 1
+            if self._segments[self._active].size >= self.segment_bytes:
+                self._active += 1
+                self._segments[self._active] = _Segment()
+        for segment_id, deleted in self._deleted.items():
+            segment = self._segments.get(segment_id)
+            if segment is not None and (segment.live or segment_id == self._active):
+                self._append(self._file(segment_id, _DELETED_SUFFIX), deleted)
+        self._deleted.clear()
+        for segment_id, segment in list(self._segments.items()):
+            if not segment.live and segment_id != self._active:
+                self._delete_segment(segment_id)
+
+    def close(self) -> None:
+        """Writes the pending changes to the disk."""
+        self.flush()
+        if not self._segments[self._active].live:
+            self._delete_segment(self._active)
+
+    def stats(self) -> Dict:
+        """Metrics of the store."""
+        return {
+            "messages": len(self._index),
+            "bytes": self.bytes,
+            "segments": sum(1 for segment in self._segments.values() if segment.live),
+            "dropped": self.dropped,
+            "expired": self.expired,
+            "forwarded": self.forwarded,
+            "collisions": self.collisions,
+            "writes": self.writes,
+            "reads": self.reads,
+        }
+
+    def _order(self) -> List[int]:
+        """Ids of the stored messages in the order they are drained."""
+        if self.reading_order is DrainOrder.OLDEST_FIRST:
+            return list(self._index)
+        index = self._index
+        others = [msg_id for msg_id, entry in index.items() if not entry.reading]
+        readings = [msg_id for msg_id in reversed(index) if index[msg_id].reading]
+        return others + readings
+
+    def _expire(self, now: float) -> None:
+        """Removes the oldest messages while they are too old.
+
+        :param now: current time
+        """
+        limit = now - self.max_age_seconds
+        index = self._index
+        while index:
+            msg_id = next(iter(index))
+            if index[msg_id].timestamp >= limit:
+                break
+            self.remove(msg_id)
+            self.expired += 1
+
+    def _read(self, entry: _Entry, cache: Dict[int, bytes]) -> LazyMessage:
+        """Reads a stored message, reading its whole segment only once.
+
+        :param entry: position of the message
+        :param cache: segments already read (only the last one is kept)
+        """
+        data = cache.get(entry.segment)
+        if data is None:
+            cache.clear()
+            with open(self._file(entry.segment, _SEGMENT_SUFFIX), "rb") as f:
+                data = cache[entry.segment] = f.read()
+            self.reads += 1
+        start = entry.offset + RECORD.size
+        end = entry.offset + entry.size
+        return self.codec.decode_lazy(memoryview(data)[start:end])
+
+    def _load(self) -> None:
+        """Rebuilds the index from the segment files."""
+        segment_ids = sorted(
+            int(name[: -len(_SEGMENT_SUFFIX)])
+            for name in os.listdir(self.path)
+            if name.endswith(_SEGMENT_SUFFIX)
+        )
+        for segment_id in segment_ids:
+            self._segments[segment_id] = segment = _Segment()
+            with open(self._file(segment_id, _SEGMENT_SUFFIX), "rb") as f:
+                data = f.read()
+            segment.size = len(data)
+            deleted = self._read_deleted(segment_id)
+            for offset, size, header in self._records(data):
+                if offset in deleted:
+                    continue
+                msg_id = header["msg_id"]
+                if msg_id in self._index:
+                    self.remove(msg_id)
+                self._index[msg_id] = _Entry(
+                    segment_id,
+                    offset,
+                    size,
+                    header["timestamp"],
+                    header["type"] == MessageType.READING,
+                )
+                segment.live += 1
+                self.bytes += size
+        for segment_id, segment in list(self._segments.items()):
+            if not segment.live:
+                self._delete_segment(segment_id)
+        if self._index:
+            logger.info(f"loaded {len(self._index)} stored messages")
+
+    def _records(self, data: bytes) -> List[Tuple[int, int, Dict]]:
+        """Valid records of a segment as ``(offset, size, header)`` tuples.
+
+        :param data: content of the segment file
+        """
+        view = memoryview(data)
+        records = []
+        offset = 0
+        while offset + RECORD.size <= len(data):
+            size, crc = RECORD.unpack_from(data, offset)
+            start = offset + RECORD.size
+            end = start + size
+            if end > len(data) or zlib.crc32(view[start:end]) != crc:
+                break
+            try:
+                header, _, data_end = self.codec.decode_header(view, start)
+            except CodecError:
+                break
+            if data_end != end:
+                break
+            records.append((offset, end - offset, header))
+            offset = end
+        if offset != len(data):
+            logger.warning(f"ignored {len(data) - offset} bytes of a stored segment")
+        return records
+
+    def _read_deleted(self, segment_id: int) -> Set[int]:
+        """Offsets of the removed messages of a segment.
+
+        :param segment_id: id of the segment
+        """
+        try:
+            with open(self._file(segment_id, _DELETED_SUFFIX), "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return set()
+        end = len(data) - len(data) % OFFSET.size
+        return {offset for offset, in OFFSET.iter_unpack(data[:end])}
+
+    def _delete_segment(self, segment_id: int) -> None:
+        """Deletes the files of a segment.
+
+        :param segment_id: id of the segment
+        """
+        del self._segments[segment_id]
+        for suffix in (_SEGMENT_SUFFIX, _DELETED_SUFFIX):
+            try:
+                os.remove(self._file(segment_id, suffix))
+            except FileNotFoundError:
+                pass
+
+    def _file(self, segment_id: int, suffix: str) -> str:
+        """Path of a file of a segment.
+
+        :param segment_id: id of the segment
+        :param suffix: extension of the file
+        """
+        return os.path.join(self.path, f"{segment_id:012d}{suffix}")
+
+    @staticmethod
+    def _append(path: str, data: bytes) -> None:
+        """Appends data to a file and waits until it is on the disk.
+
+        :param path: path of the file
+        :param data: data to append
+        """
+        with open(path, "ab") as f:
+            f.write(data)
+            f.flush()
+            os.fsync(f.fileno())
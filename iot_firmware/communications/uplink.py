@@ -0,0 +1,307 @@
+"""Module with the batching of the outgoing messages into frames.
+
+Every frame is a fixed size header followed by the encoded messages, one after
+the other, optionally compressed with zlib::
+
+    format (u8) | flags (u8) | messages (u16) | payload size (u32) | payload
+"""
+import asyncio
+import logging
+import struct
+import zlib
+from collections import defaultdict
+from typing import Any
+from typing import Awaitable
+from typing import Callable
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Set
+from typing import Union
+
+from ..enums import FlushReason
+from .codec import Buffer
+from .codec import CodecError
+from .codec import LazyMessage
+from .codec import MessageCodec
+from .schema import Message
+
+logger = logging.getLogger(__name__)
+
+FRAME_FORMAT_VERSION = 1
+FRAME_HEADER = struct.Struct("<BBHI")
+FLAG_ZLIB = 0x01
+MAX_FRAME_MESSAGES = 0xFFFF
+_HEADER_SIZE = FRAME_HEADER.size
+
+DEFAULT_MAX_FRAME_BYTES = 1024
+DEFAULT_MAX_DELAY_SECONDS = 0.5
+
+Transport = Callable[[bytes], Awaitable]
+# called with the msg_id of the messages of a frame and the error of its write
+FrameCallback = Callable[[List[int], Optional[Exception]], Any]
+
+
+def read_frame(buffer: Buffer, codec: MessageCodec) -> List[LazyMessage]:
+    """Decodes the messages of a frame.
+
+    :param buffer: buffer that only contains the frame
+    :param codec: codec of the messages
+
+    Basic usage.
+
+    >>> from ..enums import MessageType
+    >>> codec = MessageCodec()
+    >>> message = Message.load({"type": MessageType.READING, "data": {"temp": 24.3}})
+    >>> payload = codec.encode(message)
+    >>> frame = FRAME_HEADER.pack(FRAME_FORMAT_VERSION, 0, 1, len(payload)) + payload
+    >>> [lazy.data for lazy in read_frame(frame, codec)]
+    [{'temp': 24.3}]
+    """
+    try:
+        version, flags, count, size = FRAME_HEADER.unpack_from(buffer)
+    except struct.error:
+        raise CodecError("truncated frame header") from None
+    if version != FRAME_FORMAT_VERSION:
+        raise CodecError(f"unsupported frame format version {version}")
+    if FRAME_HEADER.size + size != len(buffer):
+        raise CodecError("frame payload size does not match its header")
+    payload = memoryview(buffer)[_HEADER_SIZE:]
+    if flags & FLAG_ZLIB:
+        try:
+            payload = memoryview(zlib.decompress(payload))
+        except zlib.error as e:
+            raise CodecError(f"frame payload cannot be decompressed: {e}") from None
+    messages = []
+    offset = 0
+    for _ in range(count):
+        message, offset = codec.decode_lazy_from(payload, offset)
+        messages.append(message)
+    if offset != len(payload):
+        raise CodecError(f"{len(payload) - offset} unexpected trailing bytes")
+    return messages
+
+
+class Uplink:
+    """Collects the outgoing messages into frames for a transport.
+
+    A frame is sent once its encoded messages reach ``max_frame_bytes`` or when its
+    first message has waited ``max_delay_seconds``, whatever happens first. A
+    message that does not fit in the current frame starts the next one, and a
+    message bigger than the budget is sent alone. With compression the budget
+    applies to the frame before compressing it, and the compressed payload is only
+    used when it is smaller.
+
+    :param transport: async function that sends a frame
+    :param codec: codec of the messages
+    :param max_frame_bytes: size budget of a frame, including its header
+    :param max_delay_seconds: maximum time that a message waits for its frame
+    :param compression_level: zlib level of the frames (None to not compress)
+    :param on_frame: function called after each frame is written, or fails to be
+        written, with the ``msg_id`` of its messages and the error (None if it
+        was written)
+
+    Basic usage.
+
+    >>> from ..enums import MessageType
+    >>> codec = MessageCodec()
+    >>> async def transport(frame):
+    ...     print([message.data for message in read_frame(frame, codec)])
+    >>> uplink = Uplink(transport, codec, max_frame_bytes=120)
+    >>> async def main():
+    ...     for temp in range(4):
+    ...         message = {"type": MessageType.READING, "data": temp}
+    ...         await uplink.send(Message.load(message))
+    ...     await uplink.close()
+    >>> asyncio.run(main())
+    [0, 1, 2]
+    [3]
+    >>> uplink.stats()["flushes"]
+    {'size': 1, 'close': 1}
+    """
+
+    def __init__(
+        self,
+        transport: Transport,
+        codec: MessageCodec,
+        max_frame_bytes: int = DEFAULT_MAX_FRAME_BYTES,
+        max_delay_seconds: float = DEFAULT_MAX_DELAY_SECONDS,
+        compression_level: Optional[int] = None,
+        on_frame: Optional[FrameCallback] = None,
+    ) -> None:
+        if max_frame_bytes <= FRAME_HEADER.size:
+            raise ValueError(
+                f"max_frame_bytes must be bigger than the {FRAME_HEADER.size} bytes "
+                f"of the frame header, got {max_frame_bytes}"
+            )
+        self.transport = transport
+        self.codec = codec
+        self.max_frame_bytes = max_frame_bytes
+        self.max_delay_seconds = max_delay_seconds
+        self.compression_level = compression_level
+        self.on_frame = on_frame
+        self._frame = bytearray(FRAME_HEADER.size)
+        self._count = 0
+        self._msg_ids: List[int] = []
+        self._timer: Optional[asyncio.TimerHandle] = None
+        self._tasks: Set[asyncio.Task] = set()
+        self._lock = asyncio.Lock()
+        self._stats = _UplinkStats()
+
+    async def send(self, message: Union[Message, LazyMessage]) -> None:
+        """Adds a message to the current frame and sends the frame if it is full.
+
+        :param message: message to send
+        """
+        frame = self._frame
+        start = len(frame)
+        self.codec.encode_into(message, frame)
+        if self._count and len(frame) > self.max_frame_bytes:
+            pending = frame[start:]
+            del frame[start:]
+            await self.flush(FlushReason.SIZE)
+            frame = self._frame
+            frame += pending
+        self._msg_ids.append(message.msg_id)
+        self._count += 1
+        full = len(frame) >= self.max_frame_bytes
+        if full or self._count == MAX_FRAME_MESSAGES:
+            await self.flush(FlushReason.SIZE)
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.max_delay_seconds, self._flush_later
+            )
+
+    async def flush(self, reason: FlushReason = FlushReason.CLOSE) -> None:
+        """Sends the current frame, if it has any message.
+
+        :param reason: why the frame is sent
+        """
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        if not self._count:
+            return
+        msg_ids, self._msg_ids = self._msg_ids, []
+        frame = self._pack(reason)
+        async with self._lock:
+            try:
+                await self.transport(frame)
+            except Exception as e:
+                if self.on_frame is not None:
+                    self.on_frame(msg_ids, e)
+                raise
+        if self.on_frame is not None:
+            self.on_frame(msg_ids, None)
+
+    async def close(self) -> None:
+        """Sends the pending messages and waits for the frames being sent."""
+        await self._safe_flush(FlushReason.CLOSE)
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def stats(self) -> Dict:
+        """Metrics of the sent frames."""
+        return self._stats.snapshot()
+
+    def _pack(self, reason: FlushReason) -> bytes:
+        """Takes the current frame with its header and starts a new one.
+
+        :param reason: why the frame is sent
+        """
+        frame, count = self._frame, self._count
+        raw_size = len(frame)
+        flags = 0
+        payload = memoryview(frame)[_HEADER_SIZE:]
+        if self.compression_level is not None:
+            compressed = zlib.compress(payload, self.compression_level)
+            if len(compressed) < len(payload):
+                payload.release()
+                del frame[_HEADER_SIZE:]
+                frame += compressed
+                flags |= FLAG_ZLIB
+        payload.release()
+        size = len(frame) - FRAME_HEADER.size
+        FRAME_HEADER.pack_into(frame, 0, FRAME_FORMAT_VERSION, flags, count, size)
+        data = bytes(frame)
+        del frame[_HEADER_SIZE:]
+        self._count = 0
+        self._stats.record(reason, count, raw_size, len(data), self.max_frame_bytes)
+        return data
+
+    def _flush_later(self) -> None:
+        """Sends the current frame in a new task once its delay has expired."""
+        self._timer = None
+        task = asyncio.create_task(self._safe_flush(FlushReason.DEADLINE))
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _safe_flush(self, reason: FlushReason) -> None:
+        """Sends the current frame capturing and logging any error.
+
+        :param reason: why the frame is sent
+        """
+        try:
+            await self.flush(reason)
+        except Exception as e:
+            self._stats.errors += 1
+            logger.error(
+                f"frame could not be sent ({reason}) - {e.__class__.__name__}: {e}"
+            )
+
+
+class _UplinkStats:
+    """Counters of the frames sent by an Uplink."""
+
+    def __init__(self) -> None:
+        self.messages = 0
+        self.frames = 0
+        self.raw_bytes = 0
+        self.bytes = 0
+        self.errors = 0
+        self.fill_ratio_total = 0.0
+        self.fill_ratio_min = 0.0
+        self.fill_ratio_max = 0.0
+        self.flushes: Dict[FlushReason, int] = defaultdict(int)
+
+    def record(
+        self, reason: FlushReason, count: int, raw_size: int, size: int, budget: int
+    ) -> None:
+        """Adds a sent frame.
+
+        :param reason: why the frame was sent
+        :param count: number of messages of the frame
+        :param raw_size: size of the frame before compressing it
+        :param size: size of the sent frame
+        :param budget: size budget of the frame
+        """
+        fill_ratio = raw_size / budget
+        if not self.frames or fill_ratio < self.fill_ratio_min:
+            self.fill_ratio_min = fill_ratio
+        if fill_ratio > self.fill_ratio_max:
+            self.fill_ratio_max = fill_ratio
+        self.frames += 1
+        self.messages += count
+        self.raw_bytes += raw_size
+        self.bytes += size
+        self.fill_ratio_total += fill_ratio
+        self.flushes[reason] += 1
+
+    def snapshot(self) -> Dict:
+        """Summary of the counters."""
+        frames = self.frames
+        return {
+            "messages": self.messages,
+            "frames": frames,
+            "messages_per_frame": self.messages / frames if frames else 0.0,
+            "bytes": self.bytes,
+            "raw_bytes": self.raw_bytes,
+            "compression_ratio": self.bytes / self.raw_bytes if frames else 1.0,
+            "fill_ratio": {
+                "mean": self.fill_ratio_total / frames if frames else 0.0,
+                "min": self.fill_ratio_min,
+                "max": self.fill_ratio_max,
+            },
+            "flushes": {str(reason): count for reason, count in self.flushes.items()},
+            "errors": self.errors,
+        }
@@ -1,4 +1,17 @@
 """Utils for the communications package."""
+import itertools
+import math
+import os
+import struct
+import threading
+import weakref
+from typing import Iterator
+from typing import Optional
+from typing import Tuple
+
+DEFAULT_BLOCK_SIZE = 4096
+
+BLOCK = struct.Struct("<Q")
 
 
 class Counter:
@@ -35,3 +48,119 @@ class Counter:
     def __call__(self) -> int:
         self.__value += self.__increment
         return self.__value
+
+
+class BlockCounter:
+    """Counter that reserves blocks of values in a file so they never repeat.
+
+    Each block is written to the file before its first value is returned, and
+    the values of the block are then counted in memory, so the file is written
+    once every ``block_size`` calls. After a restart, even after a crash, it
+    continues after the last reserved block. The file is locked while a block is
+    reserved, so several threads and processes can share it (a counter with a file
+    needs a POSIX system).
+
+    :param path: file where the blocks are reserved (None to count in memory)
+    :param block_size: number of values of each block
+    :param start: counter value below which values are never returned
+
+    Basic usage.
+
+    >>> import os, tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "msg_id")
+    >>> counter = BlockCounter(path, block_size=100)
+    >>> counter(), counter()
+    (1, 2)
+    >>> BlockCounter(path, block_size=100)()
+    101
+    """
+
+    def __init__(
+        self,
+        path: Optional[str] = None,
+        block_size: int = DEFAULT_BLOCK_SIZE,
+        start: int = 0,
+    ) -> None:
+        if block_size < 1:
+            raise ValueError(f"block_size must be at least 1, got {block_size}")
+        self.path = path
+        self.block_size = block_size
+        self._lock = threading.Lock()
+        # the count and the end of its block are replaced together, so a value
+        # is always checked against the block it was counted from
+        end = math.inf if path is None else start
+        self._block: Tuple[Iterator[int], float] = (itertools.count(start + 1), end)
+        if path is not None:
+            _block_counters.add(self)
+
+    def __call__(self) -> int:
+        count, end = self._block
+        value = next(count)
+        if value <= end:
+            return value
+        with self._lock:
+            if self._block[0] is count:
+                self._reserve(value - 1)
+        return self()
+
+    def _reserve(self, value: int) -> None:
+        """Writes the next block to the file and starts counting it.
+
+        :param value: last value of the counter
+        """
+        # fcntl is imported here, since it only exists in POSIX systems
+        import fcntl
+
+        with open(f"{self.path}.lock", "a") as lock:
+            fcntl.flock(lock, fcntl.LOCK_EX)
+            start = max(self._read(), value)
+            end = start + self.block_size
+            tmp_path = f"{self.path}.tmp"
+            with open(tmp_path, "wb") as f:
+                f.write(BLOCK.pack(end))
+                f.flush()
+                os.fsync(f.fileno())
+            os.replace(tmp_path, self.path)
+            _fsync_dir(os.path.dirname(os.path.abspath(self.path)))
+        self._block = (itertools.count(start + 1), end)
+
+    def _read(self) -> int:
+        """Returns the end of the last reserved block (0 if there is none)."""
+        try:
+            with open(self.path, "rb") as f:
+                data = f.read()
+        except FileNotFoundError:
+            return 0
+        if len(data) != BLOCK.size:
+            raise ValueError(f"counter file {self.path} is damaged")
+        return BLOCK.unpack(data)[0]
+
+    def _forget_block(self) -> None:
+        """Makes a forked process reserve its own block."""
+        self._lock = threading.Lock()
+        self._block = (self._block[0], -1)
+
+
+_block_counters: "weakref.WeakSet[BlockCounter]" = weakref.WeakSet()
+
+
+def _forget_blocks() -> None:
+    """Makes the block counters of a forked process reserve their own blocks."""
+    for counter in _block_counters:
+        counter._forget_block()
+
+
+if hasattr(os, "register_at_fork"):
+    os.register_at_fork(after_in_child=_forget_blocks)
+
+
+def _fsync_dir(path: str) -> None:
+    """Makes the changes of the entries of a directory durable.
+
+    :param path: path of the directory
+    """
+    fd = os.open(path, os.O_RDONLY)
+    try:
+        os.fsync(fd)
+    finally:
+        os.close(fd)
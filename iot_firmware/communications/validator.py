@@ -0,0 +1,232 @@
+"""Fast path to load dataclasses without the generic marshmallow field machinery.
+
+The loader is compiled once from the dataclass fields and the metadata of its
+marshmallow schema. It only accepts values that marshmallow would accept
+unchanged, anything else is delegated to marshmallow so that the resulting
+objects and the error messages are exactly the same.
+"""
+import dataclasses
+import math
+import typing
+from typing import Any
+from typing import Callable
+from typing import Mapping
+from typing import Optional
+
+from marshmallow import fields
+from marshmallow import missing
+from marshmallow import Schema
+from marshmallow import validate
+
+Converter = Callable[[Any], Any]
+
+
+class _Fallback(Exception):
+    """Raised when the fast path cannot handle a value."""
+
+
+def _compile_validator(validator: Callable) -> Optional[Callable[[Any], bool]]:
+    """Compiles a marshmallow validator into a function that checks a value.
+
+    :param validator: marshmallow validator of a field
+    """
+    if type(validator) is validate.OneOf:
+        try:
+            choices = frozenset(validator.choices)
+        except TypeError:
+            return None
+        return choices.__contains__
+    if type(validator) is validate.Range:
+        low, high = validator.min, validator.max
+        low_inclusive, high_inclusive = validator.min_inclusive, validator.max_inclusive
+
+        def check_range(value) -> bool:
+            if low is not None and (value < low if low_inclusive else value <= low):
+                return False
+            if high is not None and (value > high if high_inclusive else value >= high):
+                return False
+            return True
+
+        return check_range
+    return None
+
+
+def _compile_type(field: fields.Field, hint: Any) -> Optional[Converter]:
+    """Compiles the type conversion of a marshmallow field.
+
+    :param field: marshmallow field
+    :param hint: type annotation of the dataclass field
+    """
+    kind = type(field)
+    if kind is fields.Raw:
+        return lambda value: value
+    if kind is fields.String:
+
+        def convert_string(value):
+            if type(value) is str:
+                return value
+            if not isinstance(value, str):
+                raise _Fallback
+            # marshmallow turns subclasses (like the str enums) into plain strings
+            return str(value)
+
+        return convert_string
+    if kind is fields.Integer:
+
+        def convert_integer(value):
+            if type(value) is not int:
+                raise _Fallback
+            return value
+
+        return convert_integer
+    if kind is fields.Float:
+
+        def convert_float(value):
+            if type(value) is float:
+                if not math.isfinite(value):
+                    raise _Fallback
+                return value
+            if type(value) is not int:
+                raise _Fallback
+            try:
+                return float(value)
+            except OverflowError:
+                raise _Fallback from None
+
+        return convert_float
+    if kind is fields.Nested and dataclasses.is_dataclass(hint):
+        return compile_loader(hint, field.schema)
+    return None
+
+
+def _compile_field(field: fields.Field, hint: Any) -> Optional[Converter]:
+    """Compiles the conversion and validation of a single marshmallow field.
+
+    :param field: marshmallow field
+    :param hint: type annotation of the dataclass field
+    """
+    if field.data_key is not None or field.attribute is not None or field.dump_only:
+        return None
+    convert = _compile_type(field, hint)
+    checks = [_compile_validator(validator) for validator in field.validators]
+    if convert is None or None in checks:
+        return None
+    allow_none = field.allow_none
+
+    def convert_field(value):
+        if value is None:
+            if allow_none:
+                return None
+            raise _Fallback
+        value = convert(value)
+        for check in checks:
+            if not check(value):
+                raise _Fallback
+        return value
+
+    return convert_field
+
+
+def compile_loader(clazz: type, schema: Schema) -> Optional[Converter]:
+    """Compiles a fast loader of a dataclass from its marshmallow schema.
+
+    The loader raises an internal exception whenever marshmallow must take over,
+    so it should be used through :class:`Loader`.
+
+    Returns ``None`` when the schema uses features the fast path does not support.
+
+    :param clazz: dataclass that is going to be created
+    :param schema: marshmallow schema of the dataclass
+    """
+    init_fields = [field for field in dataclasses.fields(clazz) if field.init]
+    unsupported = (
+        schema.many,
+        schema.partial,
+        schema.only,
+        schema.exclude,
+        schema.unknown != "raise",
+        any(schema._hooks.values()),
+        {field.name for field in init_fields} != set(schema.fields),
+    )
+    if any(unsupported):
+        return None
+
+    hints = typing.get_type_hints(clazz)
+    converters = []
+    required = set()
+    defaults = []
+    for field in init_fields:
+        schema_field = schema.fields[field.name]
+        convert = _compile_field(schema_field, hints.get(field.name))
+        if convert is None:
+            return None
+        converters.append((field.name, convert))
+        if schema_field.required:
+            required.add(field.name)
+        elif callable(schema_field.load_default):
+            defaults.append((field.name, schema_field.load_default))
+        elif schema_field.load_default is not missing:
+            defaults.append((field.name, lambda value=schema_field.load_default: value))
+
+    def load(data: Mapping) -> Any:
+        if not isinstance(data, dict):
+            raise _Fallback
+        kwargs = {}
+        for name, convert in converters:
+            value = data.get(name, missing)
+            if value is missing:
+                if name in required:
+                    raise _Fallback
+                continue
+            kwargs[name] = convert(value)
+        if len(kwargs) != len(data):
+            raise _Fallback
+        for name, default in defaults:
+            if name not in kwargs:
+                kwargs[name] = default()
+        return clazz(**kwargs)
+
+    return load
+
+
+class Loader:
+    """Loads dicts into dataclasses with a compiled fast path.
+
+    Whenever the fast path cannot handle the data (including any invalid data) it
+    falls back to marshmallow, which returns the same objects and raises the
+    same errors.
+
+    :param clazz: dataclass that is going to be created
+    :param schema: marshmallow schema of the dataclass
+
+    Basic usage.
+
+    >>> import marshmallow_dataclass
+    >>> from iot_firmware.communications.schema import Version
+    >>> loader = Loader(Version, marshmallow_dataclass.class_schema(Version)())
+    >>> loader.compiled
+    True
+    >>> loader({"major": 1, "minor": 2, "patch": 3})
+    1.2.3
+    """
+
+    def __init__(self, clazz: type, schema: Schema) -> None:
+        self.schema = schema
+        self._fast_load = compile_loader(clazz, schema)
+
+    @property
+    def compiled(self) -> bool:
+        """Whether the fast path is available for the dataclass."""
+        return self._fast_load is not None
+
+    def __call__(self, data: Mapping) -> Any:
+        """Loads the data into an instance of the dataclass.
+
+        :param data: dict of the data
+        """
+        if self._fast_load is not None:
+            try:
+                return self._fast_load(data)
+            except _Fallback:
+                pass
+        return self.schema.load(data)
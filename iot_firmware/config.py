@@ -0,0 +1,114 @@
+"""Module with the configuration of the firmware.
+
+The configuration is a JSON object. Its known keys are validated and the rest are
+kept as they are, so that each part of the firmware can have its own settings.
+
+- ``device_id``: id of the device (0 by default)
+- ``devices``: ids of the devices hosted by the gateway
+- ``event_handler``: ``num_workers``, ``buffer_maxsize``,
+  ``worker_timeout_seconds`` and ``block_timeout_seconds`` of the event handler
+"""
+import copy
+import hashlib
+import json
+import logging
+import os
+from typing import Dict
+from typing import Union
+
+from marshmallow import fields
+from marshmallow import INCLUDE
+from marshmallow import RAISE
+from marshmallow import Schema
+from marshmallow import validate
+
+logger = logging.getLogger(__name__)
+
+PathLike = Union[str, "os.PathLike[str]"]
+
+# validated configuration of each file content, by the SHA-256 of the content
+_config_cache: Dict[str, Dict] = {}
+
+
+class EventHandlerConfigSchema(Schema):
+    """Options of the event handler that can be changed while it runs."""
+
+    class Meta:
+        unknown = RAISE
+
+    num_workers = fields.Integer(strict=True, validate=validate.Range(min=1))
+    buffer_maxsize = fields.Integer(strict=True, validate=validate.Range(min=0))
+    worker_timeout_seconds = fields.Float(
+        validate=validate.Range(min=0, min_inclusive=False)
+    )
+    block_timeout_seconds = fields.Float(
+        validate=validate.Range(min=0, min_inclusive=False)
+    )
+
+
+class ConfigSchema(Schema):
+    """Configuration of the firmware."""
+
+    class Meta:
+        unknown = INCLUDE
+
+    device_id = fields.Integer(strict=True, validate=validate.Range(min=0))
+    devices = fields.List(fields.Integer(strict=True, validate=validate.Range(min=0)))
+    event_handler = fields.Nested(EventHandlerConfigSchema)
+
+
+_schema = ConfigSchema()
+
+
+def validate_config(config: Dict) -> Dict:
+    """Validates a configuration, raising a ValidationError if it is not valid.
+
+    :param config: configuration of the firmware
+
+    Basic usage.
+
+    >>> validate_config({"event_handler": {"num_workers": 2}, "other": "kept"})
+    {'event_handler': {'num_workers': 2}, 'other': 'kept'}
+    """
+    return _schema.load(config)
+
+
+def load_config(path: PathLike) -> Dict:
+    """Loads and validates the configuration of a JSON file.
+
+    The validated configuration is cached by the hash of the file content, so
+    the same file is only parsed and validated once, even if it is touched or
+    copied somewhere else, and a modified file is always read again.
+
+    :param path: path of the JSON file
+    """
+    with open(path, "rb") as f:
+        content = f.read()
+    digest = hashlib.sha256(content).hexdigest()
+    config = _config_cache.get(digest)
+    if config is None:
+        config = _config_cache[digest] = validate_config(json.loads(content))
+        logger.debug(f"configuration {os.fspath(path)} was loaded")
+    # callers get their own copy, so the cached one is never modified
+    return copy.deepcopy(config)
+
+
+def merge_config(config: Dict, update: Dict) -> Dict:
+    """Validates an update and applies it to a configuration.
+
+    The options of the event handler are merged with the current ones, any other
+    key replaces its value.
+
+    :param config: current configuration
+    :param update: keys of the configuration that change
+
+    >>> config = {"event_handler": {"num_workers": 2}, "devices": [1]}
+    >>> update = {"event_handler": {"buffer_maxsize": 10}, "devices": [1, 2]}
+    >>> merge_config(config, update)
+    {'event_handler': {'num_workers': 2, 'buffer_maxsize': 10}, 'devices': [1, 2]}
+    """
+    update = validate_config(update)
+    merged = {**config, **update}
+    if "event_handler" in config and "event_handler" in update:
+        merged["event_handler"] = {**config["event_handler"], **update["event_handler"]}
+    return merged
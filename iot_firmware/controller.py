@@ -1,32 +1,134 @@
 import asyncio
 import logging
+from typing import Callable
 from typing import Dict
 from typing import List
-
-import uvloop
+from typing import Optional
+from typing import TYPE_CHECKING
+from typing import Union
 
 from .communications import CommunicationsHandler
+from .communications.schema import Message
+from .config import merge_config
+from .config import PathLike
+from .device import DeviceContext
+from .device import Gateway
+from .enums import CommandType
+from .enums import MessageType
 from .event import EventHandler
 from .schema import read_config
 
+if TYPE_CHECKING:
+    from .event.sharding import Shards
+
 
 class Controller:
     """Firmware main controller.
 
-    :param config: configuration for the controller
+    It can act as a gateway that hosts many devices, which share its event and
+    communications handlers (see :class:`~iot_firmware.device.Gateway`). The ids
+    of the ``devices`` of the configuration are added when it is created.
+
+    It can also process the events in worker processes, one per CPU core (see
+    :meth:`shard`).
+
+    The configuration is validated (see :mod:`~iot_firmware.config`) and it can
+    be changed while the firmware runs with :meth:`update_config` or with a
+    ``config`` command (see :meth:`command`).
+
+    :param config: configuration for the controller, or path of its JSON file
     """
 
-    def __init__(self, config: Dict = None) -> None:
+    def __init__(self, config: Optional[Union[Dict, PathLike]] = None) -> None:
+        import uvloop
+
         uvloop.install()
         self.config = read_config(config)
 
-        self.event_handler = EventHandler()
+        self.event_handler = EventHandler(**self.config.get("event_handler", {}))
         self.communications_handler = CommunicationsHandler()
+        self.gateway = Gateway(self.event_handler, self.communications_handler)
+        for device_id in self.config.get("devices", ()):
+            self.add_device(device_id)
+
+        self.shards: Optional["Shards"] = None
 
         self.firmware_async_task = None
+        self.shards_task = None
 
         self.running = False
 
+    def add_device(self, device_id: int) -> DeviceContext:
+        """Hosts a device in the gateway of the controller.
+
+        :param device_id: id of the device
+        """
+        return self.gateway.add_device(device_id)
+
+    def update_config(self, update: Dict) -> Dict:
+        """Applies a configuration update without restarting the firmware.
+
+        The event handler is reconfigured keeping its buffered events, and the
+        gateway adds and removes devices to match ``devices``.
+
+        :param update: keys of the configuration that change
+        :return: new configuration
+        """
+        config = read_config(merge_config(self.config, update))
+        if "event_handler" in update:
+            self.event_handler.reconfigure(**config["event_handler"])
+        if "devices" in update:
+            current = [device.device_id for device in self.gateway]
+            for device_id in current:
+                if device_id not in config["devices"]:
+                    self.gateway.remove_device(device_id)
+            for device_id in config["devices"]:
+                if device_id not in current:
+                    self.add_device(device_id)
+        self.config = config
+        logging.info("configuration was updated")
+        return config
+
+    def command(self, message: Message) -> None:
+        """Runs a command received by the firmware.
+
+        The data of the message has the ``command`` type and its ``data``, like
+        ``{"command": "config", "data": {"event_handler": {"num_workers": 4}}}``.
+
+        :param message: command message
+        """
+        if message.type != MessageType.COMMAND:
+            raise ValueError(f"message {message.msg_id} is not a command")
+        data = message.data if isinstance(message.data, dict) else {}
+        command = data.get("command")
+        if command not in CommandType:
+            raise ValueError(f"unknown command {command!r}")
+        if CommandType(command) is CommandType.CONFIG:
+            self.update_config(data.get("data") or {})
+        else:
+            logging.warning(f"command {command} is not supported")
+
+    def shard(
+        self,
+        setup: Callable[[EventHandler, int], None],
+        num_shards: Optional[int] = None,
+        **kwargs,
+    ) -> "Shards":
+        """Processes the events in worker processes started with the firmware.
+
+        Each worker has its own EventHandler, prepared by ``setup``, and the
+        workers that crash are restarted (see :class:`~iot_firmware.event.sharding.Shards`).
+
+        :param setup: function called in each worker with its new EventHandler and
+            the index of its shard, to subscribe the functions
+        :param num_shards: number of worker processes (by default one per CPU)
+        :param kwargs: other arguments of the shards
+        """
+        from .event.sharding import Shards
+
+        self.shards = Shards(setup, num_shards, **kwargs)
+        return self.shards
+
     def start(self) -> None:
         """Starts the firmware."""
         if self.running:
@@ -37,12 +139,17 @@ class Controller:
     async def start_async(self) -> None:
         """Async function to start the async tasks."""
         self.firmware_async_task = asyncio.create_task(self.firmware_async())
+        if self.shards is not None:
+            self.shards_task = asyncio.create_task(self.shards.run(), name="shards")
         logging.info("firmware is running")
         await asyncio.gather(*self.async_tasks)
 
     @property
     def async_tasks(self) -> List:
-        return [self.firmware_async_task]
+        tasks = [self.firmware_async_task]
+        if self.shards_task is not None:
+            tasks.append(self.shards_task)
+        return tasks
 
     def stop(self) -> None:
         """Stops the firmware."""
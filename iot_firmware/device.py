@@ -0,0 +1,315 @@
+"""Module with the devices hosted by a gateway.
+
+A gateway runs many devices in a single process. All of them share the event loop,
+the event handler (and its workers) and the communications handler, while each
+device keeps its own id, subscriptions and counters. The automatic ``msg_id`` of
+every device come from the counter of the process, since the ACK window and the
+store of the shared communications handler know the messages by their ``msg_id``.
+"""
+import asyncio
+import logging
+from contextvars import ContextVar
+from contextvars import Token
+from typing import Callable
+from typing import Dict
+from typing import Iterator
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Type
+from typing import Union
+
+from .communications import CommunicationsHandler
+from .communications.codec import LazyMessage
+from .communications.schema import Message
+from .event import Event
+from .event import EventHandler
+from .event.enum import PublishResult
+from .schema import current_device
+
+logger = logging.getLogger(__name__)
+
+# tokens of the ``with device:`` blocks of the current context, innermost last
+_device_tokens: ContextVar[Tuple[Token, ...]] = ContextVar("device_tokens", default=())
+
+
+class DeviceContext:
+    """Device hosted by a gateway.
+
+    Its events are only delivered to the functions subscribed through it. While
+    they run, and inside a ``with device:`` block, messages are created with the
+    id of the device by default.
+
+    :param device_id: id of the device
+    :param gateway: gateway that hosts the device
+
+    Basic usage.
+
+    >>> from .enums import MessageType
+    >>> gateway = Gateway()
+    >>> device = gateway.add_device(7)
+    >>> with device:
+    ...     message = Message.load({"type": MessageType.READING, "data": 1})
+    >>> message.id
+    7
+    """
+
+    def __init__(self, device_id: int, gateway: "Gateway") -> None:
+        self.device_id = device_id
+        self.gateway = gateway
+        self.published = 0
+        self.processed = 0
+        self.discarded = 0
+
+    def __enter__(self) -> "DeviceContext":
+        _device_tokens.set(_device_tokens.get() + (current_device.set(self),))
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> None:
+        tokens = _device_tokens.get()
+        current_device.reset(tokens[-1])
+        _device_tokens.set(tokens[:-1])
+
+    def subscribe(self, event_class: Type[Event], fn: Callable) -> None:
+        """Subscribes an async function to the events of an EventType of the device.
+
+        :param event_class: event class that contains an event type
+        :param fn: async function that is going to be called with the event object
+        """
+        self.gateway._subscribe(self.device_id, event_class, fn)
+
+    def unsubscribe(self, event_class: Type[Event], fn: Callable) -> None:
+        """Unsubscribes a function of the events of an EventType of the device.
+
+        :param event_class: event class that contains an event type
+        :param fn: function that was subscribed
+        """
+        self.gateway._unsubscribe(self.device_id, event_class, fn)
+
+    def publish(self, event: Event) -> PublishResult:
+        """Publishes an event of the device in the shared event handler.
+
+        :param event: standard event inherited from Event class
+        """
+        if self._discard_event(event):
+            return PublishResult.DISCARDED
+        result = self.gateway.event_handler.publish(event)
+        self.published += result is PublishResult.PUBLISHED
+        return result
+
+    async def publish_async(self, event: Event) -> PublishResult:
+        """Same as :meth:`publish`, waiting for room with the block policy.
+
+        :param event: standard event inherited from Event class
+        """
+        if self._discard_event(event):
+            return PublishResult.DISCARDED
+        result = await self.gateway.event_handler.publish_async(event)
+        self.published += result is PublishResult.PUBLISHED
+        return result
+
+    async def send(self, message: Union[Message, LazyMessage]) -> None:
+        """Sends a message of the device with the shared communications handler.
+
+        :param message: message to send
+        """
+        await self.gateway.communications_handler.send(message)
+
+    def stats(self) -> Dict:
+        """Metrics of the device."""
+        return {
+            "device_id": self.device_id,
+            "published": self.published,
+            "processed": self.processed,
+            "discarded": self.discarded,
+            "subscriptions": self.gateway._subscriptions(self.device_id),
+        }
+
+    def _discard_event(self, event: Event) -> bool:
+        """Tags the event with the device, discarding it when the device did not
+        subscribe any function to its EventType.
+
+        :param event: standard event inherited from Event class
+        """
+        if not isinstance(event, Event):
+            return False
+        if not self.gateway._functions(self.device_id, event.type.uuid):
+            self.discarded += 1
+            return True
+        event.device_id = self.device_id
+        return False
+
+
+class Gateway:
+    """Devices that share the event and communications handlers of a process.
+
+    A single function per EventType is subscribed to the event handler, which
+    calls the functions that the device of each event subscribed.
+
+    :param event_handler: shared event handler (a new one by default)
+    :param communications_handler: shared communications handler (a new one by
+        default)
+
+    Basic usage.
+
+    >>> gateway = Gateway()
+    >>> for device_id in range(3):
+    ...     device = gateway.add_device(device_id)
+    >>> len(gateway), gateway[2].device_id
+    (3, 2)
+    """
+
+    def __init__(
+        self,
+        event_handler: Optional[EventHandler] = None,
+        communications_handler: Optional[CommunicationsHandler] = None,
+    ) -> None:
+        self.event_handler = event_handler or EventHandler()
+        self.communications_handler = communications_handler or CommunicationsHandler()
+        self._devices: Dict[int, DeviceContext] = {}
+        # event type uuid -> device id -> subscribed functions
+        self._routes: Dict[str, Dict[int, Tuple[Callable, ...]]] = {}
+        self._routers: Dict[str, Tuple[Type[Event], Callable]] = {}
+
+    def __len__(self) -> int:
+        return len(self._devices)
+
+    def __iter__(self) -> Iterator[DeviceContext]:
+        return iter(self._devices.values())
+
+    def __getitem__(self, device_id: int) -> DeviceContext:
+        return self._devices[device_id]
+
+    def add_device(self, device_id: int) -> DeviceContext:
+        """Adds a device to the gateway.
+
+        :param device_id: id of the device
+        """
+        if device_id in self._devices:
+            raise ValueError(f"device {device_id} is already in the gateway")
+        device = self._devices[device_id] = DeviceContext(device_id, self)
+        logger.debug(f"device {device_id} was added")
+        return device
+
+    def remove_device(self, device_id: int) -> None:
+        """Removes a device and its subscriptions from the gateway.
+
+        :param device_id: id of the device
+        """
+        del self._devices[device_id]
+        for uuid, routes in list(self._routes.items()):
+            if routes.pop(device_id, None) is not None:
+                self._remove_router(uuid)
+        logger.debug(f"device {device_id} was removed")
+
+    def stats(self) -> Dict:
+        """Metrics of every device."""
+        return {device.device_id: device.stats() for device in self}
+
+    def _functions(self, device_id: int, uuid: str) -> Tuple[Callable, ...]:
+        """Functions of a device subscribed to an EventType.
+
+        :param device_id: id of the device
+        :param uuid: unique id of the event type
+        """
+        routes = self._routes.get(uuid)
+        return () if routes is None else routes.get(device_id, ())
+
+    def _subscriptions(self, device_id: int) -> int:
+        """Number of functions subscribed by a device."""
+        return sum(len(routes.get(device_id, ())) for routes in self._routes.values())
+
+    def _subscribe(
+        self, device_id: int, event_class: Type[Event], fn: Callable
+    ) -> None:
+        """Subscribes a function of a device, adding the router of the EventType.
+
+        :param device_id: id of the device
+        :param event_class: event class that contains an event type
+        :param fn: async function that is going to be called with the event object
+        """
+        EventHandler._check_types(event_class, fn)
+        uuid = event_class.type.uuid
+        if uuid not in self._routers:
+            router = self._router(uuid)
+            router.__name__ = (
+                router.__qualname__
+            ) = f"gateway_{event_class.type.__name__}"
+            self._routers[uuid] = (event_class, router)
+            self.event_handler.subscribe(event_class, router)
+        routes = self._routes.setdefault(uuid, {})
+        functions = routes.get(device_id, ())
+        if fn not in functions:
+            routes[device_id] = functions + (fn,)
+
+    def _unsubscribe(
+        self, device_id: int, event_class: Type[Event], fn: Callable
+    ) -> None:
+        """Unsubscribes a function of a device.
+
+        :param device_id: id of the device
+        :param event_class: event class that contains an event type
+        :param fn: function that was subscribed
+        """
+        uuid = event_class.type.uuid
+        functions = self._functions(device_id, uuid)
+        if fn not in functions:
+            logger.error(f"function {fn} was never subscribed by device {device_id}")
+            return
+        functions = tuple(f for f in functions if f is not fn)
+        if functions:
+            self._routes[uuid][device_id] = functions
+        else:
+            del self._routes[uuid][device_id]
+            self._remove_router(uuid)
+
+    def _remove_router(self, uuid: str) -> None:
+        """Unsubscribes the router of an EventType once no device uses it.
+
+        :param uuid: unique id of the event type
+        """
+        if self._routes[uuid]:
+            return
+        del self._routes[uuid]
+        self.event_handler.unsubscribe(*self._routers.pop(uuid))
+
+    def _router(self, uuid: str) -> Callable:
+        """Creates the function that delivers the events of an EventType.
+
+        :param uuid: unique id of the event type
+        """
+        routes = self._routes
+        devices = self._devices
+
+        async def router(event: Event) -> None:
+            functions = routes.get(uuid, {}).get(event.device_id)
+            if not functions:
+                return
+            device = devices[event.device_id]
+            device.processed += 1
+            # the token is kept here, since events of a device can run concurrently
+            token = current_device.set(device)
+            try:
+                if len(functions) == 1:
+                    await functions[0](event)
+                    return
+                results = await asyncio.gather(
+                    *(fn(event) for fn in functions), return_exceptions=True
+                )
+            finally:
+                current_device.reset(token)
+            errors = [
+                (fn, result)
+                for fn, result in zip(functions, results)
+                if isinstance(result, Exception)
+            ]
+            # the first error is logged by the event handler
+            for fn, error in errors[1:]:
+                logger.error(
+                    f"error captured in `{fn.__name__}` after `{event}` "
+                    f"- {error.__class__.__name__}: {error}"
+                )
+            if errors:
+                raise errors[0][1]
+
+        return router
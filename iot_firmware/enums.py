@@ -41,6 +41,17 @@ class MessageKey(StrEnum):
     MSG_ID = "msg_id"
 
 
+class FlushReason(StrEnum):
+    SIZE = "size"
+    DEADLINE = "deadline"
+    CLOSE = "close"
+
+
+class DrainOrder(StrEnum):
+    OLDEST_FIRST = "oldest_first"
+    NEWEST_FIRST = "newest_first"
+
+
 class CommandType(StrEnum):
     CONFIG = "config"
     DEVICE = "device"
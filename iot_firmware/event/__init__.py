@@ -1,6 +1,14 @@
 """Package that handles all events that happen in the firmware."""
-from .handler import EventHandler
+from typing import TYPE_CHECKING
+
+from ..lazy import lazy_attributes
 from .schema import Event
 from .schema import EventType
 
-EventSystem = EventHandler()
+if TYPE_CHECKING:
+    from .handler import EventHandler
+    from .handler import EventSystem
+
+__getattr__ = lazy_attributes(
+    __name__, {"EventHandler": ".handler", "EventSystem": ".handler"}
+)
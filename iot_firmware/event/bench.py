@@ -0,0 +1,230 @@
+"""Module with a reproducible load generator to benchmark the EventHandler.
+
+Loads are either synthetic, with Poisson arrivals generated from a seed, or
+recorded, with the publish times read from a trace file (one time in seconds per
+line, only the differences between times matter). Results are plain dicts that
+can be dumped as JSON and compared with :func:`compare`.
+"""
+import asyncio
+import itertools
+import random
+import time
+from dataclasses import asdict
+from dataclasses import dataclass
+from typing import Dict
+from typing import Iterable
+from typing import List
+from typing import Optional
+
+from .enum import OverflowPolicy
+from .handler import EventHandler
+from .schema import Event
+from .schema import EventType
+
+PERCENTILES = {"p50": 50, "p99": 99, "p999": 99.9}
+DEFAULT_THRESHOLD = 0.1
+
+
+class BenchEventType(EventType):
+    pass
+
+
+class BenchEvent(Event):
+    __slots__ = ()
+    type = BenchEventType
+
+
+@dataclass
+class LoadProfile:
+    """Load and EventHandler configuration of a benchmark run.
+
+    :param num_events: number of events published
+    :param rate: events published per second (0 publishes them as fast as possible)
+    :param num_workers: number of workers of the EventHandler
+    :param buffer_maxsize: maximum number of events waiting in the buffer
+    :param num_subscribers: number of functions subscribed to the events
+    :param subscriber_seconds: time each subscribed function waits per event
+    :param seed: seed of the random arrival times
+    """
+
+    num_events: int = 10000
+    rate: float = 0
+    num_workers: int = 10
+    buffer_maxsize: int = 100
+    num_subscribers: int = 1
+    subscriber_seconds: float = 0
+    seed: int = 0
+
+    def arrivals(self) -> List[float]:
+        """Publish times in seconds since the start of the run.
+
+        >>> LoadProfile(num_events=3).arrivals()
+        [0.0, 0.0, 0.0]
+        """
+        if not self.rate:
+            return [0.0] * self.num_events
+        rng = random.Random(self.seed)
+        gaps = (rng.expovariate(self.rate) for _ in range(self.num_events))
+        return list(itertools.accumulate(gaps))
+
+
+def read_trace(lines: Iterable[str]) -> List[float]:
+    """Reads the publish times of a recorded load.
+
+    :param lines: lines of the trace file
+    :raises ValueError: if a line is not a time or there are no times
+
+    >>> read_trace(["10.5", "", "10.75", "11"])
+    [0.0, 0.25, 0.5]
+    """
+    times = [float(line) for line in lines if line.strip()]
+    if not times:
+        raise ValueError("the trace does not have any publish time")
+    return [t - times[0] for t in times]
+
+
+def percentiles(values: List[float]) -> Dict[str, float]:
+    """Summary of a list of durations with nearest rank percentiles.
+
+    :param values: durations in seconds
+
+    >>> percentiles([0.1, 0.2, 0.3, 0.4])["p50"]
+    0.2
+    """
+    if not values:
+        return {"mean": 0.0, "max": 0.0, **{name: 0.0 for name in PERCENTILES}}
+    values = sorted(values)
+    summary = {"mean": sum(values) / len(values), "max": values[-1]}
+    for name, percent in PERCENTILES.items():
+        rank = max(int(len(values) * percent / 100 + 0.5), 1)
+        summary[name] = values[min(rank, len(values)) - 1]
+    return summary
+
+
+async def run_load(
+    profile: LoadProfile, arrivals: Optional[List[float]] = None
+) -> Dict:
+    """Runs an EventHandler with a load and measures it.
+
+    The run ends once every published event has been processed. Latency is the
+    time from the creation of an event until a subscribed function is called.
+    Loads without a rate wait for room in the buffer, while loads with a rate
+    discard the oldest events when the buffer is full.
+
+    :param profile: load and EventHandler configuration
+    :param arrivals: publish times of a recorded load (instead of the profile ones)
+    """
+    open_loop = bool(profile.rate) or arrivals is not None
+    if arrivals is None:
+        arrivals = profile.arrivals()
+    handler = EventHandler(
+        num_workers=profile.num_workers,
+        buffer_maxsize=profile.buffer_maxsize,
+        overflow_policy=(
+            OverflowPolicy.DROP_OLDEST if open_loop else OverflowPolicy.BLOCK
+        ),
+        block_timeout_seconds=float("inf"),
+    )
+    latencies: List[float] = []
+    seconds = profile.subscriber_seconds
+
+    def make_subscriber():
+        async def subscriber(event: BenchEvent) -> None:
+            latencies.append(time.monotonic() - event.monotonic)
+            if seconds:
+                await asyncio.sleep(seconds)
+
+        return subscriber
+
+    for _ in range(profile.num_subscribers):
+        handler.subscribe(BenchEvent, make_subscriber())
+
+    loop = asyncio.get_running_loop()
+    runner = asyncio.create_task(handler.run())
+    await asyncio.sleep(0)
+    start = loop.time()
+    published = 0
+    for arrival in arrivals:
+        delay = start + arrival - loop.time()
+        if delay > 0:
+            await asyncio.sleep(delay)
+        published += 1
+        await handler.publish_async(BenchEvent(data=published))
+    await handler.stop()
+    await runner
+    elapsed = loop.time() - start
+
+    stats = handler.stats()
+    return {
+        "profile": asdict(profile),
+        "published": published,
+        "processed": stats["processed"],
+        "discarded": sum(stats["discarded"].values()),
+        "elapsed": elapsed,
+        "events_per_second": stats["processed"] / elapsed if elapsed > 0 else 0.0,
+        "latency": percentiles(latencies),
+        "buffer_wait": stats["buffer_wait"],
+    }
+
+
+def run(profile: LoadProfile, arrivals: Optional[List[float]] = None) -> Dict:
+    """Runs a benchmark in a new event loop.
+
+    :param profile: load and EventHandler configuration
+    :param arrivals: publish times of a recorded load (instead of the profile ones)
+
+    Basic usage.
+
+    >>> result = run(LoadProfile(num_events=100))
+    >>> result["processed"]
+    100
+    """
+    return asyncio.run(run_load(profile, arrivals))
+
+
+def _metrics(result: Dict) -> Dict[str, float]:
+    """Metrics of a result that are compared between runs."""
+    metrics = {"events_per_second": result["events_per_second"]}
+    for name in PERCENTILES:
+        metrics[f"latency_{name}"] = result["latency"][name]
+    return metrics
+
+
+def compare(
+    baseline: List[Dict], current: List[Dict], threshold: float = DEFAULT_THRESHOLD
+) -> Dict:
+    """Compares the results of two runs with the same profiles.
+
+    A metric is a regression when it gets worse more than ``threshold`` times the
+    baseline (less events per second or more latency).
+
+    :param baseline: results of the reference run
+    :param current: results of the new run
+    :param threshold: allowed relative change
+
+    Basic usage.
+
+    >>> base = {"profile": {}, "events_per_second": 100, "latency": dict.fromkeys(
+    ...     PERCENTILES, 0.01)}
+    >>> new = dict(base, events_per_second=50)
+    >>> compare([base], [new])["regressions"]
+    ['0.events_per_second']
+    """
+    if len(baseline) != len(current):
+        raise ValueError(f"cannot compare {len(baseline)} and {len(current)} runs")
+    comparisons = []
+    regressions = []
+    for i, (base, new) in enumerate(zip(baseline, current)):
+        if base["profile"] != new["profile"]:
+            raise ValueError(f"run {i} has different profiles")
+        changes = {}
+        new_metrics = _metrics(new)
+        for name, before in _metrics(base).items():
+            after = new_metrics[name]
+            change = (after - before) / before if before else 0.0
+            changes[name] = {"baseline": before, "current": after, "change": change}
+            worse = -change if name == "events_per_second" else change
+            if worse > threshold:
+                regressions.append(f"{i}.{name}")
+        comparisons.append({"profile": base["profile"], "metrics": changes})
+    return {"threshold": threshold, "runs": comparisons, "regressions": regressions}
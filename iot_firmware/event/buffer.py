@@ -0,0 +1,380 @@
+"""Module with the buffers where events wait to be processed."""
+import asyncio
+from asyncio import queues
+from collections import deque
+from typing import Any
+from typing import Deque
+from typing import Dict
+from typing import Hashable
+from typing import List
+from typing import Optional
+from typing import Tuple
+
+from .enum import EventLevel
+
+Entry = Tuple[Any, float]
+
+LEVELS = tuple(EventLevel)
+_PRIORITIES = {level: i for i, level in enumerate(LEVELS, start=1)}
+
+
+class EventBuffer(queues.Queue):
+    """FIFO buffer of ``(event, entered_in_buffer)`` entries.
+
+    Basic usage.
+
+    >>> buffer = EventBuffer(maxsize=1)
+    >>> buffer.put_nowait(("a", 0.0))
+    >>> buffer.full_for("b")
+    True
+    >>> buffer.evict(("b", 1.0))
+    ('a', 0.0)
+    """
+
+    def full_for(self, event: Any) -> bool:
+        """Whether there is no room left for the event.
+
+        :param event: event that is going to be put in the buffer
+        """
+        return self.full()
+
+    def evict(self, entry: Entry) -> Entry:
+        """Removes the entry that has to be discarded to make room for a new one.
+
+        It returns the discarded entry, which is the new entry itself when it is
+        the one that must be discarded (and then nothing is removed).
+
+        :param entry: new entry that is going to be put in the buffer
+        """
+        return self.get_nowait()
+
+    def over_capacity(self) -> bool:
+        """Whether it has more entries than its maximum size, which only happens
+        after it is made smaller with :meth:`resize`."""
+        return 0 < self._maxsize < self.qsize()
+
+    def resize(self, maxsize: int) -> None:
+        """Changes the maximum size of the buffer keeping every entry in it.
+
+        When it shrinks below its current size, no entry is discarded, it is just
+        full (and :meth:`over_capacity`) until enough entries are taken out.
+
+        :param maxsize: maximum number of entries in the buffer (0 is unlimited)
+
+        >>> buffer = EventBuffer(maxsize=2)
+        >>> for entry in [("a", 0.0), ("b", 1.0)]:
+        ...     buffer.put_nowait(entry)
+        >>> buffer.resize(1)
+        >>> buffer.qsize(), buffer.full(), buffer.over_capacity()
+        (2, True, True)
+        """
+        self._maxsize = maxsize
+        room = maxsize - self.qsize() if maxsize > 0 else len(self._putters)
+        for _ in range(min(room, len(self._putters))):
+            self._wakeup_next(self._putters)
+
+    def put_unbounded(self, entry: Entry) -> None:
+        """Puts an entry in the buffer even when it is full.
+
+        :param entry: new entry that is going to be put in the buffer
+        """
+        self._put(entry)
+        self._unfinished_tasks += 1
+        self._finished.clear()
+        self._wakeup_next(self._getters)
+
+    async def put_when_room(self, entry: Entry, timeout: float) -> bool:
+        """Waits until there is room for the entry and then puts it in the buffer.
+
+        :param entry: new entry that is going to be put in the buffer
+        :param timeout: maximum seconds to wait for room
+        :return: whether the entry was put before the timeout expired
+        """
+        loop = asyncio.get_running_loop()
+        deadline = loop.time() + timeout
+        while self.full_for(entry[0]):
+            putter = loop.create_future()
+            self._putters.append(putter)
+            try:
+                await asyncio.wait_for(putter, deadline - loop.time())
+            except asyncio.TimeoutError:
+                if putter in self._putters:
+                    self._putters.remove(putter)
+                if not self.full():
+                    self._wakeup_next(self._putters)
+                return False
+        self.put_nowait(entry)
+        return True
+
+
+class PriorityEventBuffer(EventBuffer):
+    """Buffer that returns the events with the highest EventLevel first.
+
+    Events of the same level are returned in FIFO order. When the buffer is full
+    the oldest event of the lowest level is discarded, and each level can also
+    have its own maximum size.
+
+    Entries without a level (like the poison pills) are returned after all events.
+
+    :param maxsize: maximum number of entries in the buffer (0 is unlimited)
+    :param level_maxsize: maximum number of entries of each level
+
+    Basic usage.
+
+    >>> from types import SimpleNamespace
+    >>> debug = SimpleNamespace(level=EventLevel.DEBUG)
+    >>> critical = SimpleNamespace(level=EventLevel.CRITICAL)
+    >>> buffer = PriorityEventBuffer(maxsize=2)
+    >>> buffer.put_nowait((debug, 0.0))
+    >>> buffer.put_nowait((critical, 1.0))
+    >>> buffer.get_nowait()[0] is critical
+    True
+    """
+
+    def __init__(
+        self, maxsize: int = 0, level_maxsize: Optional[Dict[EventLevel, int]] = None
+    ) -> None:
+        self.level_maxsize = [(level_maxsize or {}).get(level, 0) for level in LEVELS]
+        super().__init__(maxsize=maxsize)
+
+    def _init(self, maxsize: int) -> None:
+        self._queue = _LevelQueues()
+
+    def level_qsize(self, level: EventLevel) -> int:
+        """Number of entries of a level in the buffer.
+
+        :param level: event level
+        """
+        return len(self._queue.queues[_PRIORITIES[level]])
+
+    def full_for(self, event: Any) -> bool:
+        """Whether there is no room left for the event in the buffer or its level.
+
+        :param event: event that is going to be put in the buffer
+        """
+        priority = _priority(event)
+        if priority:
+            level_maxsize = self.level_maxsize[priority - 1]
+            if 0 < level_maxsize <= len(self._queue.queues[priority]):
+                return True
+        return self.full()
+
+    def evict(self, entry: Entry) -> Entry:
+        """Removes the oldest entry of the lowest level to make room for a new one.
+
+        If the level of the new entry is full the oldest entry of that same
+        level is removed. If the new entry has a lower level than every entry in
+        the buffer, the new entry is the one to be discarded.
+
+        :param entry: new entry that is going to be put in the buffer
+        """
+        new_priority = _priority(entry[0])
+        queues = self._queue.queues
+        level_maxsize = self.level_maxsize[new_priority - 1] if new_priority else 0
+        if queues[new_priority] and 0 < level_maxsize <= len(queues[new_priority]):
+            priority = new_priority
+        else:
+            priority = next((i for i in range(1, len(queues)) if queues[i]), None)
+            if priority is None or priority > new_priority:
+                return entry
+        evicted = self._queue.popleft(priority)
+        self._wakeup_next(self._putters)
+        return evicted
+
+
+def _priority(event: Any) -> int:
+    """Priority of an event, 0 for entries without a level."""
+    return _PRIORITIES.get(getattr(event, "level", None), 0)
+
+
+class _LevelQueues:
+    """One FIFO queue per priority that behaves like a single deque."""
+
+    __slots__ = ("queues", "_size")
+
+    def __init__(self) -> None:
+        self.queues: List[Deque[Entry]] = [deque() for _ in range(len(LEVELS) + 1)]
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self):
+        for queue in reversed(self.queues):
+            yield from queue
+
+    def append(self, entry: Entry) -> None:
+        self.queues[_priority(entry[0])].append(entry)
+        self._size += 1
+
+    def popleft(self, priority: Optional[int] = None) -> Entry:
+        if priority is None:
+            priority = next(
+                i for i in reversed(range(len(self.queues))) if self.queues[i]
+            )
+        self._size -= 1
+        return self.queues[priority].popleft()
+
+
+class FairEventBuffer(EventBuffer):
+    """Buffer with one queue per EventType served with deficit round-robin.
+
+    Each turn an event type can take as many events as its weight (a weight of
+    0.5 takes an event every two turns), so a chatty event type cannot delay the
+    rest. Each type has its own maximum size, and when the whole buffer is full
+    the oldest event of the longest queue is discarded.
+
+    Entries without a type (like the poison pills) are returned after all events.
+
+    :param maxsize: maximum number of entries in the buffer (0 is unlimited)
+    :param type_maxsize: default maximum number of entries of each event type
+
+    Basic usage.
+
+    >>> from types import SimpleNamespace
+    >>> chatty = SimpleNamespace(type=SimpleNamespace(uuid="chatty"))
+    >>> rare = SimpleNamespace(type=SimpleNamespace(uuid="rare"))
+    >>> buffer = FairEventBuffer()
+    >>> for event in [chatty, chatty, chatty, rare]:
+    ...     buffer.put_nowait((event, 0.0))
+    >>> [buffer.get_nowait()[0].type.uuid for _ in range(4)]
+    ['chatty', 'rare', 'chatty', 'chatty']
+    """
+
+    def __init__(self, maxsize: int = 0, type_maxsize: int = 0) -> None:
+        self.type_maxsize = type_maxsize
+        self.maxsizes: Dict[Hashable, int] = {}
+        super().__init__(maxsize=maxsize)
+
+    def _init(self, maxsize: int) -> None:
+        self._queue = _TypeQueues()
+
+    def set_share(
+        self, type_uuid: str, weight: float = 1, maxsize: Optional[int] = None
+    ) -> None:
+        """Sets the weight and the maximum size of an event type.
+
+        :param type_uuid: uuid of the event type
+        :param weight: events taken in each turn
+        :param maxsize: maximum number of entries of the type (None for the default)
+        """
+        if weight <= 0:
+            raise ValueError(f"weight must be greater than 0, got {weight}")
+        self._queue.weights[type_uuid] = weight
+        if maxsize is None:
+            self.maxsizes.pop(type_uuid, None)
+        else:
+            self.maxsizes[type_uuid] = maxsize
+
+    def type_qsize(self, type_uuid: str) -> int:
+        """Number of entries of an event type in the buffer.
+
+        :param type_uuid: uuid of the event type
+        """
+        queue = self._queue.queues.get(type_uuid)
+        return len(queue) if queue else 0
+
+    def full_for(self, event: Any) -> bool:
+        """Whether there is no room left for the event in the buffer or its type.
+
+        :param event: event that is going to be put in the buffer
+        """
+        return self._type_full(_type_key(event)) or self.full()
+
+    def evict(self, entry: Entry) -> Entry:
+        """Removes the oldest entry of a type to make room for a new one.
+
+        If the type of the new entry is full its oldest entry is removed,
+        otherwise the oldest entry of the longest queue.
+
+        :param entry: new entry that is going to be put in the buffer
+        """
+        key = _type_key(entry[0])
+        if not self._type_full(key):
+            queues = self._queue.queues
+            key = max(
+                self._queue.active, key=lambda key: len(queues[key]), default=None
+            )
+            if key is None:
+                return entry
+        evicted = self._queue.popleft(key)
+        self._wakeup_next(self._putters)
+        return evicted
+
+    def _type_full(self, key: Optional[Hashable]) -> bool:
+        """Whether an event type has reached its maximum size."""
+        if key is None:
+            return False
+        type_maxsize = self.maxsizes.get(key, self.type_maxsize)
+        return 0 < type_maxsize <= self.type_qsize(key)
+
+
+def _type_key(event: Any) -> Optional[Hashable]:
+    """Key of the queue of an event, None for entries without a type."""
+    event_type = getattr(event, "type", None)
+    return getattr(event_type, "uuid", None)
+
+
+class _TypeQueues:
+    """One FIFO queue per event type that behaves like a single deque."""
+
+    __slots__ = ("queues", "weights", "active", "_deficits", "_turn", "_size")
+
+    def __init__(self) -> None:
+        self.queues: Dict[Hashable, Deque[Entry]] = {None: deque()}
+        self.weights: Dict[Hashable, float] = {}
+        self.active: Deque[Hashable] = deque()
+        self._deficits: Dict[Hashable, float] = {}
+        self._turn = False
+        self._size = 0
+
+    def __len__(self) -> int:
+        return self._size
+
+    def __iter__(self):
+        for queue in self.queues.values():
+            yield from queue
+
+    def append(self, entry: Entry) -> None:
+        key = _type_key(entry[0])
+        queue = self.queues.get(key)
+        if queue is None:
+            queue = self.queues[key] = deque()
+        if not queue and key is not None:
+            self.active.append(key)
+            self._deficits[key] = 0.0
+        queue.append(entry)
+        self._size += 1
+
+    def popleft(self, key: Optional[Hashable] = None) -> Entry:
+        if key is None:
+            key = self._next_key()
+        queue = self.queues[key]
+        entry = queue.popleft()
+        self._size -= 1
+        if key is not None and not queue:
+            if self.active[0] == key:
+                self._turn = False
+            self.active.remove(key)
+        return entry
+
+    def _next_key(self) -> Optional[Hashable]:
+        """Key of the queue whose turn it is, charging it for one entry."""
+        active = self.active
+        if not active:
+            return None
+        deficits = self._deficits
+        while True:
+            key = active[0]
+            if not self._turn:
+                deficits[key] += self.weights.get(key, 1)
+                self._turn = True
+            if deficits[key] >= 1:
+                break
+            active.rotate(-1)
+            self._turn = False
+        deficits[key] -= 1
+        if deficits[key] < 1 and len(self.queues[key]) > 1:
+            active.rotate(-1)
+            self._turn = False
+        return key
@@ -0,0 +1,198 @@
+"""Module with the coalescing, debounce and throttle of events of the same type.
+
+Coalesced events share a key. While an event with a key is still in the buffer, a
+newer event with the same key replaces it in place, so it keeps its position and
+the newest data wins. Debounce and throttle windows hold the events of a key for a
+while, and only the latest one held is released when the window ends.
+"""
+import asyncio
+from dataclasses import dataclass
+from typing import Any
+from typing import Callable
+from typing import Dict
+from typing import Hashable
+from typing import Optional
+from typing import Tuple
+
+from .enum import PublishResult
+
+Key = Tuple[str, Hashable]
+
+
+@dataclass(frozen=True)
+class Coalescing:
+    """How the events of an EventType are coalesced.
+
+    :param key: function that returns the key of an event, events with the same
+        key are coalesced (by default all the events of the type)
+    :param debounce_seconds: events are released only once no newer event with the
+        same key has been published for this time
+    :param throttle_seconds: at most one event with the same key is released in
+        this time (with debounce, it is the maximum time an event is held)
+
+    Basic usage.
+
+    >>> coalescing = Coalescing(key=len, throttle_seconds=1)
+    >>> coalescing.windowed
+    True
+    """
+
+    key: Optional[Callable[[Any], Hashable]] = None
+    debounce_seconds: Optional[float] = None
+    throttle_seconds: Optional[float] = None
+
+    def __post_init__(self):
+        """Checks the windows."""
+        for seconds in (self.debounce_seconds, self.throttle_seconds):
+            if seconds is not None and seconds <= 0:
+                raise ValueError(f"windows must be greater than 0, got {seconds}")
+
+    @property
+    def windowed(self) -> bool:
+        """Whether events are held in debounce or throttle windows."""
+        return self.debounce_seconds is not None or self.throttle_seconds is not None
+
+    def key_of(self, event: Any) -> Key:
+        """Key of an event.
+
+        :param event: standard event inherited from Event class
+        """
+        return event.type.uuid, None if self.key is None else self.key(event)
+
+
+class CoalescedEntry(list):
+    """Buffer entry ``[event, entered_in_buffer]`` whose event can be replaced.
+
+    :param event: standard event inherited from Event class
+    :param entered_in_buffer: time when the entry was put in the buffer
+    :param key: coalescing key of the event
+
+    Basic usage.
+
+    >>> entry = CoalescedEntry("a", 0.0, key=("type", None))
+    >>> entry[0] = "b"
+    >>> event, entered_in_buffer = entry
+    >>> event
+    'b'
+    """
+
+    __slots__ = ("key",)
+
+    def __init__(self, event: Any, entered_in_buffer: float, key: Key) -> None:
+        super().__init__((event, entered_in_buffer))
+        self.key = key
+
+
+class _Window:
+    """Window of a key with the latest event held."""
+
+    __slots__ = ("opened", "event", "timer")
+
+    def __init__(self, opened: float) -> None:
+        self.opened = opened
+        self.event = None
+        self.timer: Optional[asyncio.TimerHandle] = None
+
+    def hold(self, event: Any) -> PublishResult:
+        """Holds the event until the window ends, replacing the previous one."""
+        result = (
+            PublishResult.DEFERRED if self.event is None else PublishResult.COALESCED
+        )
+        self.event = event
+        return result
+
+
+class EventWindows:
+    """Debounce and throttle windows of the coalesced events of each key.
+
+    Windows need a running event loop, without it the events are never held.
+
+    :param release: function called with ``(event, key)`` when a held event is
+        released
+
+    Basic usage.
+
+    >>> released = []
+    >>> windows = EventWindows(lambda event, key: released.append(event))
+    >>> coalescing = Coalescing(throttle_seconds=0.01)
+    >>> async def main():
+    ...     for event in ["a", "b", "c"]:
+    ...         print(windows.offer(event, ("type", None), coalescing))
+    ...     await asyncio.sleep(0.05)
+    >>> asyncio.run(main())
+    None
+    deferred
+    coalesced
+    >>> released
+    ['c']
+    """
+
+    def __init__(self, release: Callable[[Any, Key], Any]) -> None:
+        self._release = release
+        self._windows: Dict[Key, _Window] = {}
+
+    def __len__(self) -> int:
+        return len(self._windows)
+
+    def offer(
+        self, event: Any, key: Key, coalescing: Coalescing
+    ) -> Optional[PublishResult]:
+        """Holds the event if there is an open window for its key.
+
+        :param event: standard event inherited from Event class
+        :param key: coalescing key of the event
+        :param coalescing: windows of the event type
+        :return: None if the event must be published now, otherwise the result
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            return None
+        window = self._windows.get(key)
+        if coalescing.debounce_seconds is None:
+            if window is None:
+                self._open(key, coalescing.throttle_seconds, loop)
+                return None
+            return window.hold(event)
+
+        if window is None:
+            window = self._windows[key] = _Window(loop.time())
+        else:
+            window.timer.cancel()
+        result = window.hold(event)
+        delay = coalescing.debounce_seconds
+        if coalescing.throttle_seconds is not None:
+            max_delay = window.opened + coalescing.throttle_seconds - loop.time()
+            delay = min(delay, max_delay)
+        window.timer = loop.call_later(delay, self._expire, key, None)
+        return result
+
+    def flush(self, event_type_uuid: Optional[str] = None) -> None:
+        """Closes the windows and releases their held events right now.
+
+        :param event_type_uuid: only close the windows of this event type
+        """
+        for key in list(self._windows):
+            if event_type_uuid is None or key[0] == event_type_uuid:
+                window = self._windows.pop(key)
+                window.timer.cancel()
+                if window.event is not None:
+                    self._release(window.event, key)
+
+    def _open(self, key: Key, seconds: float, loop: asyncio.AbstractEventLoop) -> None:
+        """Opens a throttle window for a key."""
+        window = self._windows[key] = _Window(loop.time())
+        window.timer = loop.call_later(seconds, self._expire, key, seconds)
+
+    def _expire(self, key: Key, reopen: Optional[float]) -> None:
+        """Closes the window of a key and releases its held event.
+
+        :param key: coalescing key of the window
+        :param reopen: seconds of a new throttle window opened after releasing
+        """
+        window = self._windows.pop(key)
+        if window.event is None:
+            return
+        if reopen is not None:
+            self._open(key, reopen, asyncio.get_running_loop())
+        self._release(window.event, key)
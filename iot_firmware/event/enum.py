@@ -21,3 +21,51 @@ class EventHandlerState(Enum):
     IDLE = auto()
     RUNNING = auto()
     STOPPING = auto()
+
+
+class DiscardReason(StrEnum):
+    """Reasons why an event is discarded."""
+
+    NOT_EVENT = "not_event"
+    NO_SUBSCRIBERS = "no_subscribers"
+    STOPPING = "stopping"
+    BUFFER_FULL = "buffer_full"
+    DROPPED_NEWEST = "dropped_newest"
+    REJECTED = "rejected"
+    BLOCK_TIMEOUT = "block_timeout"
+    SUBSCRIBER_BUSY = "subscriber_busy"
+
+
+class ExecutorType(StrEnum):
+    """Executors where regular (not async) subscribed functions can run."""
+
+    THREAD = "thread"
+    PROCESS = "process"
+
+
+class OverflowPolicy(StrEnum):
+    """What to do when an event is published and the buffer is full."""
+
+    DROP_OLDEST = "drop_oldest"
+    DROP_NEWEST = "drop_newest"
+    BLOCK = "block"
+    REJECT = "reject"
+
+
+class PublishResult(StrEnum):
+    """Result of publishing an event."""
+
+    PUBLISHED = "published"
+    COALESCED = "coalesced"
+    DEFERRED = "deferred"
+    DISCARDED = "discarded"
+    REJECTED = "rejected"
+
+
+class ScaleReason(StrEnum):
+    """Reasons why the EventHandler adds (queue depth, buffer wait) or retires
+    (idle) workers."""
+
+    QUEUE_DEPTH = "queue_depth"
+    BUFFER_WAIT = "buffer_wait"
+    IDLE = "idle"
@@ -1,27 +1,62 @@
 """Module in charge of handling function event subscriptions."""
 import asyncio
 import inspect
+import itertools
 import logging
 import time
-from asyncio import queues
 from collections import defaultdict
+from concurrent.futures import Executor
 from dataclasses import dataclass
 from dataclasses import field
 from typing import Any
+from typing import Awaitable
 from typing import Callable
 from typing import Dict
+from typing import Iterable
+from typing import Iterator
 from typing import List
+from typing import Optional
+from typing import Set
+from typing import Tuple
 from typing import Type
 
 from ..enums import NameClassMeta
+from .buffer import EventBuffer
+from .buffer import FairEventBuffer
+from .buffer import PriorityEventBuffer
+from .coalescing import CoalescedEntry
+from .coalescing import Coalescing
+from .coalescing import EventWindows
+from .coalescing import Key
+from .enum import DiscardReason
 from .enum import EventHandlerState
+from .enum import EventLevel
+from .enum import ExecutorType
+from .enum import OverflowPolicy
+from .enum import PublishResult
+from .enum import ScaleReason
+from .journal import DEFAULT_CAPACITY
+from .journal import DEFAULT_FSYNC_INTERVAL_SECONDS
+from .journal import EventJournal
+from .scaling import Autoscale
 from .schema import Event
+from .stats import EventHandlerStats
+from .subscriber import BatchSubscriber
+from .subscriber import ExecutorSubscriber
+from .subscriber import IsolatedSubscriber
+from .subscriber import LimitedSubscriber
 
 logger = logging.getLogger(__name__)
 
 DEFAULT_NUM_WORKERS = 10
 DEFAULT_BUFFER_MAXSIZE = 100
 DEFAULT_WORKER_TIMEOUT_SECONDS = 2
+DEFAULT_BLOCK_TIMEOUT_SECONDS = 1
+DEFAULT_BATCH_MAX_SIZE = 100
+DEFAULT_BATCH_MAX_DELAY_SECONDS = 0.1
+
+# only since Python 3.11 a task can tell its own cancellations from the others
+_UNCANCEL = hasattr(asyncio.Task, "uncancel")
 
 
 @dataclass
@@ -30,6 +65,31 @@ class EventHandler:
 
     It is in charge to execute all subscribed functions to an Event.
 
+    :param num_workers: number of workers that process events concurrently
+    :param buffer_maxsize: maximum number of events waiting in the buffer
+    :param worker_timeout_seconds: maximum time to process a single event
+    :param priority_buffer: process events with higher EventLevel first and
+        discard the lowest level events first when the buffer is full
+    :param level_maxsize: maximum number of buffered events of each EventLevel
+        (only used with the priority buffer)
+    :param fair_buffer: keep one queue per EventType and serve them in turns, so
+        that a flood of one type does not delay the rest (see :meth:`set_share`)
+    :param type_maxsize: default maximum number of buffered events of each
+        EventType (only used with the fair buffer)
+    :param thread_pool_workers: maximum threads of the managed thread pool
+    :param process_pool_workers: maximum processes of the managed process pool
+    :param overflow_policy: what to do with a published event when the buffer is
+        full, it can be changed for each event type with
+        :meth:`set_overflow_policy`
+    :param block_timeout_seconds: maximum time :meth:`publish_async` waits for
+        room with the block policy
+    :param autoscale: add and retire workers with the load, starting with
+        ``num_workers`` within its bounds
+    :param journal_path: file where the buffered events of the types selected with
+        :meth:`persist` are kept, so that they are replayed after a restart
+    :param journal_capacity: size in bytes of the journal ring
+    :param journal_fsync_seconds: seconds between writes of the journal to the disk
+
     Basic usage.
 
     >>> event_handler = EventHandler()
@@ -42,45 +102,194 @@ class EventHandler:
     worker_timeout_seconds: float = field(
         repr=False, default=DEFAULT_WORKER_TIMEOUT_SECONDS
     )
+    priority_buffer: bool = field(repr=False, default=False)
+    level_maxsize: Dict[EventLevel, int] = field(repr=False, default_factory=dict)
+    fair_buffer: bool = field(repr=False, default=False)
+    type_maxsize: int = field(repr=False, default=0)
+    thread_pool_workers: Optional[int] = field(repr=False, default=None)
+    process_pool_workers: Optional[int] = field(repr=False, default=None)
+    overflow_policy: OverflowPolicy = field(
+        repr=False, default=OverflowPolicy.DROP_OLDEST
+    )
+    block_timeout_seconds: float = field(
+        repr=False, default=DEFAULT_BLOCK_TIMEOUT_SECONDS
+    )
+    autoscale: Optional[Autoscale] = field(repr=False, default=None)
+    journal_path: Optional[str] = field(repr=False, default=None)
+    journal_capacity: int = field(repr=False, default=DEFAULT_CAPACITY)
+    journal_fsync_seconds: float = field(
+        repr=False, default=DEFAULT_FSYNC_INTERVAL_SECONDS
+    )
 
     state: EventHandlerState = field(repr=False, default=EventHandlerState.IDLE)
 
     _subscribers: Dict[str, set] = field(
         init=False, repr=False, default_factory=lambda: defaultdict(set)
     )
+    _dispatch_table: Dict[str, Tuple[Callable, ...]] = field(
+        init=False, repr=False, default_factory=dict
+    )
+    _wrapped_subscribers: Dict[Tuple[str, Callable], Callable] = field(
+        init=False, repr=False, default_factory=dict
+    )
+    _closing: Set[asyncio.Task] = field(init=False, repr=False, default_factory=set)
+    _overflow_policies: Dict[str, OverflowPolicy] = field(
+        init=False, repr=False, default_factory=dict
+    )
+    _coalescings: Dict[str, Coalescing] = field(
+        init=False, repr=False, default_factory=dict
+    )
+    _coalesced_entries: Dict[Key, CoalescedEntry] = field(
+        init=False, repr=False, default_factory=dict
+    )
+    _windows: EventWindows = field(init=False, repr=False)
+    _executors: Dict[ExecutorType, Executor] = field(
+        init=False, repr=False, default_factory=dict
+    )
     _workers: List = field(init=False, repr=False, default_factory=list)
-    _event_buffer: queues.Queue = field(init=False, repr=False)
+    _worker_ids: Iterator[int] = field(
+        init=False, repr=False, default_factory=itertools.count
+    )
+    _retiring: int = field(init=False, repr=False, default=0)
+    _scaler: Optional[asyncio.Task] = field(init=False, repr=False, default=None)
+    _journal: Optional[EventJournal] = field(init=False, repr=False, default=None)
+    _stats: EventHandlerStats = field(
+        init=False, repr=False, default_factory=EventHandlerStats
+    )
+    _event_buffer: EventBuffer = field(init=False, repr=False)
 
     def __post_init__(self):
         """Initialize missing objects after the __init__."""
-        self._event_buffer = queues.Queue(maxsize=self.buffer_maxsize)
+        if self.priority_buffer and self.fair_buffer:
+            raise ValueError("priority and fair buffers cannot be used together")
+        self.overflow_policy = OverflowPolicy(self.overflow_policy)
+        if self.priority_buffer:
+            self._event_buffer = PriorityEventBuffer(
+                maxsize=self.buffer_maxsize, level_maxsize=self.level_maxsize
+            )
+        elif self.fair_buffer:
+            self._event_buffer = FairEventBuffer(
+                maxsize=self.buffer_maxsize, type_maxsize=self.type_maxsize
+            )
+        else:
+            self._event_buffer = EventBuffer(maxsize=self.buffer_maxsize)
+        self._windows = EventWindows(self._put_coalesced)
+        if self.journal_path is not None:
+            self._journal = EventJournal(
+                self.journal_path, self.journal_capacity, self.journal_fsync_seconds
+            )
         logger.debug(self.state.name)
 
-    def subscribe(self, event_class: Type[Event], fn: Callable) -> None:
+    def subscribe(
+        self,
+        event_class: Type[Event],
+        fn: Callable,
+        executor: Optional[ExecutorType] = None,
+        max_concurrency: Optional[int] = None,
+        timeout: Optional[float] = None,
+        isolated: bool = False,
+    ) -> None:
         """Subscribes a function to an EventType.
 
+        Async functions run in the event loop. Regular functions must be run in an
+        executor managed by the handler, so that heavy functions do not block the
+        event loop. Functions run in the process pool receive a copy of the event,
+        so both the function and the event must be picklable.
+
+        Isolated functions run apart from the workers, with their own buffer (as
+        big as the handler one) and ``max_concurrency`` tasks, so slow functions do
+        not hold up the workers nor the other functions subscribed to the event.
+        When the handler stops, they have ``worker_timeout_seconds`` to finish
+        their buffered events.
+
+        Subscribing a function again replaces its previous subscription.
+
         :param event_class: event class that contains an event type
         :param fn: function that is going to be called with the event object
+        :param executor: executor where a regular (not async) function runs
+        :param max_concurrency: maximum concurrent calls of the function (by default
+            unlimited for async functions and 1 in an executor or isolated)
+        :param timeout: maximum time of a single call of the function
+        :param isolated: run the function apart from the workers
         """
-        self._check_types(event_class, fn)
-        self._subscribers[event_class.type.uuid].add(fn)
+        if executor is None:
+            self._check_types(event_class, fn)
+            subscriber = fn
+        else:
+            self._check_types(event_class, fn, is_async=False)
+            executor_type = ExecutorType(executor)
+            subscriber = ExecutorSubscriber(
+                fn, lambda: self._get_executor(executor_type), max_concurrency or 1
+            )
+            if not isolated:
+                max_concurrency = None
+        if isolated:
+            subscriber = IsolatedSubscriber(
+                subscriber,
+                lambda: self._stats,
+                timeout,
+                max_concurrency,
+                maxsize=self.buffer_maxsize,
+                close_timeout=self.worker_timeout_seconds,
+            )
+        elif timeout is not None or max_concurrency is not None:
+            subscriber = LimitedSubscriber(
+                subscriber, lambda: self._stats, timeout, max_concurrency
+            )
+        self._add_subscriber(event_class, fn, subscriber)
         logger.debug(
-            f"subscribed async function `{fn.__name__}` "
+            f"subscribed function `{fn.__name__}` "
             f"after every `{event_class.type.__name__}` event"
         )
 
+    def subscribe_batch(
+        self,
+        event_class: Type[Event],
+        fn: Callable,
+        max_size: int = DEFAULT_BATCH_MAX_SIZE,
+        max_delay: float = DEFAULT_BATCH_MAX_DELAY_SECONDS,
+    ) -> None:
+        """Subscribes a function that is called with lists of events of an EventType.
+
+        A list is delivered once it has ``max_size`` events or ``max_delay`` seconds
+        after its first event, whatever happens first. Pending events are delivered
+        when the handler stops.
+
+        :param event_class: event class that contains an event type
+        :param fn: function that is going to be called with a list of event objects
+        :param max_size: maximum number of events of each list
+        :param max_delay: maximum seconds that an event waits for its list
+        """
+        self._check_types(event_class, fn)
+        subscriber = BatchSubscriber(
+            fn, max_size, max_delay, timeout=self.worker_timeout_seconds
+        )
+        self._add_subscriber(event_class, fn, subscriber)
+        logger.debug(
+            f"subscribed async function `{fn.__name__}` after every batch of "
+            f"{max_size} `{event_class.type.__name__}` events (max {max_delay}s)"
+        )
+
     def unsubscribe(self, event_class: Type[Event], fn: Callable) -> None:
         """Unsubscribes a function to an EventType.
 
+        A wrapper of the function (like the one of a batch or an isolated
+        subscription) is closed in the background, so its pending events are still
+        delivered, and the handler waits for it when it stops.
+
         :param event_class: event class that contains an event type
         :param fn: function that is going to be called with the event object
         """
-        self._check_types(event_class, fn)
+        self._check_types(event_class, fn, is_async=None)
         if event_class.type.uuid not in self._subscribers:
             logger.error(f"event type {event_class.type.__name__} was never subscribed")
             return
 
+        fn = self._wrapped_subscribers.pop((event_class.type.uuid, fn), fn)
         self._subscribers[event_class.type.uuid].remove(fn)
+        self._update_dispatch_table(event_class.type.uuid)
+        if hasattr(fn, "close"):
+            self._close_subscriber(fn)
         logger.debug(
             f"unsubscribed {fn.__name__} after every `{event_class.type.__name__}` event"
         )
@@ -91,37 +300,276 @@ class EventHandler:
                 f"event {event_class.type.__name__} will not trigger any function"
             )
 
-    def publish(self, event: Event) -> None:
+    def set_overflow_policy(
+        self, event_class: Type[Event], policy: Optional[OverflowPolicy]
+    ) -> None:
+        """Sets the policy applied to an EventType when the buffer is full.
+
+        :param event_class: event class that contains an event type
+        :param policy: overflow policy (None to use the one of the handler)
+        """
+        if policy is None:
+            self._overflow_policies.pop(event_class.type.uuid, None)
+        else:
+            self._overflow_policies[event_class.type.uuid] = OverflowPolicy(policy)
+
+    def set_share(
+        self,
+        event_class: Type[Event],
+        weight: float = 1,
+        maxsize: Optional[int] = None,
+    ) -> None:
+        """Sets the share of the fair buffer of an EventType.
+
+        :param event_class: event class that contains an event type
+        :param weight: events of the type processed in each turn
+        :param maxsize: maximum number of buffered events of the type (None for
+            ``type_maxsize``)
+        """
+        if not isinstance(self._event_buffer, FairEventBuffer):
+            raise RuntimeError("event handler does not have a fair buffer")
+        self._event_buffer.set_share(event_class.type.uuid, weight, maxsize)
+
+    def set_coalescing(
+        self, event_class: Type[Event], coalescing: Optional[Coalescing]
+    ) -> None:
+        """Coalesces the events of an EventType.
+
+        While an event is in the buffer, a newer event with the same key replaces
+        it in place. Events held in debounce or throttle windows are released
+        when the coalescing is removed or the handler stops.
+
+        :param event_class: event class that contains an event type
+        :param coalescing: how events are coalesced (None to stop coalescing)
+        """
+        if coalescing is None:
+            self._coalescings.pop(event_class.type.uuid, None)
+            self._windows.flush(event_class.type.uuid)
+        else:
+            self._coalescings[event_class.type.uuid] = coalescing
+
+    def persist(self, event_class: Type[Event], name: Optional[str] = None) -> None:
+        """Keeps the buffered events of an EventType in the journal.
+
+        Events that were not processed when the handler stopped (or the device lost
+        power) are replayed when the handler runs again, before the new ones. Their
+        data must be JSON like (None, bool, int, float, str, bytes, list or dict).
+
+        :param event_class: event class that contains an event type
+        :param name: stable name of the events in the journal (by default the
+            module and name of the class)
+        """
+        if self._journal is None:
+            raise RuntimeError("event handler does not have a journal")
+        self._journal.register(event_class, name)
+
+    def publish(self, event: Event) -> PublishResult:
         """Adds the event into a queue buffer to be processed.
 
+        When the buffer is full the overflow policy of the event type is applied.
+        The block policy cannot wait here, so the event is rejected instead (use
+        :meth:`publish_async` to wait for room).
+
         :param event: standard event inherited from Event class
         """
         if self._discard_event(event):
-            return
+            return PublishResult.DISCARDED
 
         if self.state is EventHandlerState.IDLE:
             logger.warning(
                 f"handler is in {self.state.name} state, but it will be stored in the buffer"
             )
 
-        logger.debug(f"event `{event}` was published")
-        if self._event_buffer.full():
-            logger.warning(f"buffer is full (events:{self._event_buffer.qsize()})")
-            self._discard_oldest_event()
+        debug = logger.isEnabledFor(logging.DEBUG)
+        if debug:
+            logger.debug(f"event `{event}` was published")
+        coalescing = (
+            self._coalescings.get(event.type.uuid) if self._coalescings else None
+        )
+        if coalescing is None:
+            result = self._put((event, time.time()))
+        else:
+            result = self._coalesce(event, coalescing)
+        if debug and result is PublishResult.PUBLISHED:
+            logger.debug(f"event `{event}` is the buffer, pending to be executed")
+        return result
+
+    async def publish_async(self, event: Event) -> PublishResult:
+        """Adds the event into a queue buffer to be processed.
+
+        Same as :meth:`publish`, but with the block policy it waits up to
+        ``block_timeout_seconds`` for room in the buffer before rejecting the event.
+        Coalesced events never wait.
+
+        :param event: standard event inherited from Event class
+        """
+        full = isinstance(event, Event) and self._event_buffer.full_for(event)
+        if not full or self._overflow_policy(event) is not OverflowPolicy.BLOCK:
+            return self.publish(event)
+        if event.type.uuid in self._coalescings:
+            return self.publish(event)
+        if self._discard_event(event):
+            return PublishResult.DISCARDED
+
+        logger.warning(f"buffer is full, waiting up to {self.block_timeout_seconds}s")
+        entry = (event, time.time())
+        if not await self._event_buffer.put_when_room(
+            entry, self.block_timeout_seconds
+        ):
+            logger.error(f"event `{event}` was rejected -> no room in the buffer")
+            self._stats.discarded[DiscardReason.BLOCK_TIMEOUT] += 1
+            return PublishResult.REJECTED
+        if self._journal is not None:
+            self._journal.record(event)
+        self._stats.published += 1
+        return PublishResult.PUBLISHED
+
+    def publish_many(self, events: Iterable[Event]) -> int:
+        """Adds many events into the queue buffer in a single pass.
+
+        Every event is checked as in :meth:`publish`, but the state is checked and
+        logged only once for the whole batch.
+
+        :param events: standard events inherited from Event class
+        :return: number of events added into the buffer
+        """
+        stats = self._stats
+        if self.state is EventHandlerState.STOPPING:
+            logger.warning(f"discarded events -> state is {self.state.name}")
+            stats.discarded[DiscardReason.STOPPING] += sum(1 for _ in events)
+            return 0
+        if self.state is EventHandlerState.IDLE:
+            logger.warning(
+                f"handler is in {self.state.name} state, but they will be stored in the buffer"
+            )
+
+        subscribers = self._subscribers
+        event_buffer = self._event_buffer
+        coalescings = self._coalescings
+        journal = self._journal
+        t = time.time()
+        published = coalesced = 0
+        for event in events:
+            if not isinstance(event, Event):
+                logger.error(f"discarded event `{event}` -> not subclassed from Event")
+                stats.discarded[DiscardReason.NOT_EVENT] += 1
+                continue
+            if event.type.uuid not in subscribers:
+                stats.discarded[DiscardReason.NO_SUBSCRIBERS] += 1
+                continue
+            if coalescings and event.type.uuid in coalescings:
+                result = self._coalesce(event, coalescings[event.type.uuid])
+                coalesced += result is PublishResult.PUBLISHED
+                continue
+            entry = (event, t)
+            if event_buffer.full_for(event) and self._overflow(entry) is not None:
+                continue
+            event_buffer.put_nowait(entry)
+            if journal is not None:
+                journal.record(event)
+            published += 1
+        stats.published += published
+        published += coalesced
+        logger.debug(f"{published} events are in the buffer, pending to be executed")
+        return published
+
+    def reconfigure(
+        self,
+        num_workers: Optional[int] = None,
+        buffer_maxsize: Optional[int] = None,
+        worker_timeout_seconds: Optional[float] = None,
+        block_timeout_seconds: Optional[float] = None,
+    ) -> None:
+        """Changes the workers, the buffer and the timeouts while the handler runs.
+
+        No buffered event is lost: while a buffer made smaller than its current
+        size has more events than its new size, none of them is evicted (new
+        events are discarded instead of the oldest ones). The workers that are
+        left over stop once the events published before the change are taken
+        out of the buffer.
+
+        :param num_workers: number of workers (within the autoscale bounds)
+        :param buffer_maxsize: maximum number of events waiting in the buffer
+        :param worker_timeout_seconds: maximum time to process a single event
+        :param block_timeout_seconds: maximum time :meth:`publish_async` waits for
+            room with the block policy
+
+        >>> event_handler = EventHandler()
+        >>> event_handler.reconfigure(num_workers=2, buffer_maxsize=10)
+        >>> event_handler.num_workers, event_handler.buffer_maxsize
+        (2, 10)
+        """
+        if num_workers is not None and num_workers < 1:
+            raise ValueError(f"num_workers must be at least 1, got {num_workers}")
+        if worker_timeout_seconds is not None:
+            self.worker_timeout_seconds = worker_timeout_seconds
+        if block_timeout_seconds is not None:
+            self.block_timeout_seconds = block_timeout_seconds
+        if buffer_maxsize is not None:
+            self.buffer_maxsize = buffer_maxsize
+            self._event_buffer.resize(buffer_maxsize)
+        if num_workers is not None:
+            self.num_workers = num_workers
+            if self.state is EventHandlerState.RUNNING:
+                self._resize_workers(num_workers)
+        logger.info(
+            f"reconfigured (workers:{self.num_workers}, buffer:{self.buffer_maxsize})"
+        )
+
+    def stats(self, reset: bool = False) -> Dict:
+        """Snapshot of the metrics of the handler.
+
+        Metrics are only aggregated when this method is called.
 
-        self._event_buffer.put_nowait((event, time.time()))
-        logger.debug(f"event `{event}` is the buffer, pending to be executed")
+        :param reset: start counting again from zero after the snapshot
+
+        >>> event_handler = EventHandler()
+        >>> event_handler.stats()["buffer_size"]
+        0
+        """
+        snapshot = self._stats.snapshot()
+        snapshot["buffer_size"] = self._event_buffer.qsize()
+        snapshot["workers"] = len(self._workers)
+        snapshot["state"] = self.state.name
+        if self._journal is not None:
+            snapshot["journal"] = self._journal.stats()
+        if reset:
+            self._stats = EventHandlerStats()
+        return snapshot
 
     async def run(self):
         """Main function that starts workers to handle event requests."""
-        self._workers = [
-            asyncio.create_task(self._worker(i), name=f"worker_{i}")
-            for i in range(self.num_workers)
-        ]
+        num_workers = self.num_workers
+        if self.autoscale is not None:
+            num_workers = self.autoscale.workers(num_workers)
+        self._workers = [self._start_worker() for _ in range(num_workers)]
         self.state = EventHandlerState.RUNNING
         logger.info(self.state.name)
-        await asyncio.gather(*self._workers, return_exceptions=True)
+        if self.autoscale is not None:
+            self._scaler = asyncio.create_task(self._scale_workers(), name="scaler")
+        flusher = None
+        if self._journal is not None:
+            flusher = asyncio.create_task(
+                self._journal.flush_periodically(), name="journal"
+            )
+        try:
+            if self._journal is not None:
+                await self._replay()
+            while not all(worker.done() for worker in self._workers):
+                await asyncio.gather(*self._workers, return_exceptions=True)
+        finally:
+            self._stop_scaler()
+            if flusher is not None:
+                flusher.cancel()
+                self._journal.close()
         self._workers = []
+        for subscriber in self._wrapped_subscribers.values():
+            await subscriber.close()
+        if self._closing:
+            await asyncio.gather(*self._closing, return_exceptions=True)
+        for executor in self._executors.values():
+            executor.shutdown(wait=False)
+        self._executors.clear()
         self.state = EventHandlerState.IDLE
         logger.debug(self.state.name)
 
@@ -129,9 +577,12 @@ class EventHandler:
         """Send poison pills to all workers."""
         if self.state is not EventHandlerState.RUNNING:
             raise RuntimeError("event handler is not running")
+        self._windows.flush()
+        self._stop_scaler()
         self.state = EventHandlerState.STOPPING
         logger.debug(self.state.name)
-        for _ in self._workers:
+        # the workers that are retiring stop with their own pill
+        for _ in range(len(self._workers) - self._retiring):
             await self._event_buffer.put((PoisonPill, time.time()))
 
     def cancel(self) -> None:
@@ -139,6 +590,7 @@ class EventHandler:
         if self.state is not EventHandlerState.RUNNING:
             raise RuntimeError("event handler is not running")
         logger.debug("cancelling all workers")
+        self._stop_scaler()
         for worker in self._workers:
             worker.cancel()
         logger.debug("cancelled all workers")
@@ -148,27 +600,90 @@ class EventHandler:
 
         :param i: unique id number of the worker
         """
-        event = await self._get_next_event()
+        idle_timeout = None
+        if self.autoscale is not None:
+            idle_timeout = self.autoscale.cooldown_seconds
+        event = await self._get_next_event(idle_timeout)
         while event is not PoisonPill:
-            tasks = [
-                asyncio.create_task(fn(event), name=fn.__name__)
-                for fn in self._subscribers[event.type.uuid]
-            ]
-            try:
-                await asyncio.wait_for(
-                    self._run_tasks(tasks, event), timeout=self.worker_timeout_seconds
+            subscribers = self._dispatch_table.get(event.type.uuid, ())
+            start = time.perf_counter()
+            if _UNCANCEL:
+                with _Deadline(self.worker_timeout_seconds) as deadline:
+                    await self._dispatch(subscribers, event)
+                expired = deadline.expired
+            else:
+                expired, _ = await _wait_for(
+                    self._dispatch(subscribers, event), self.worker_timeout_seconds
                 )
-            except asyncio.TimeoutError:
+            if self._journal is not None:
+                self._journal.done(event)
+            stats = self._stats
+            stats.processed += 1
+            stats.processing_time.record(time.perf_counter() - start)
+            if expired:
+                stats.timeouts += 1
                 logger.error(
                     f"exceeded max computation time of {self.worker_timeout_seconds}s for `{event}`"
                 )
-            t = time.time()
-            logger.debug(f"worker {i} processing latency: {t - event.timestamp:.3f}s")
-            event = await self._get_next_event()
+            if logger.isEnabledFor(logging.DEBUG):
+                t = time.time()
+                logger.debug(
+                    f"worker {i} processing latency: {t - event.timestamp:.3f}s"
+                )
+            event = await self._get_next_event(idle_timeout)
         logger.info(f"worker {i} stopped")
 
-    @staticmethod
-    async def _run_tasks(tasks: List, event: Event) -> None:
+    async def _dispatch(self, subscribers: Tuple[Callable, ...], event: Event) -> None:
+        """Calls the subscribed functions with the event.
+
+        :param subscribers: functions subscribed to the event type of the event
+        :param event: standard event inherited from Event class
+        """
+        if len(subscribers) == 1:
+            await self._run_function(subscribers[0], event)
+        elif subscribers:
+            tasks = [
+                asyncio.create_task(self._call_function(fn, event), name=fn.__name__)
+                for fn in subscribers
+            ]
+            await self._run_tasks(tasks, event)
+
+    async def _run_function(self, fn: Callable, event: Event) -> None:
+        """Function that awaits a single subscribed function with the event.
+
+        It is awaited inline by the worker, so no task is created for it.
+        It also captures and logs any error that might appear during its execution.
+
+        :param fn: async function that is going to be executed
+        :param event: standard event inherited from Event class
+        """
+        start = time.perf_counter()
+        try:
+            await fn(event)
+        except Exception as e:
+            self._stats.exceptions += 1
+            logger.error(
+                f"error captured in `{fn.__name__}` after `{event}` "
+                f"- {e.__class__.__name__}: {e}"
+            )
+        finally:
+            name = getattr(fn, "__qualname__", fn.__name__)
+            self._stats.subscribers[name].record(time.perf_counter() - start)
+
+    async def _call_function(self, fn: Callable, event: Event) -> None:
+        """Awaits a subscribed function with the event measuring its execution time.
+
+        :param fn: async function that is going to be executed
+        :param event: standard event inherited from Event class
+        """
+        start = time.perf_counter()
+        try:
+            await fn(event)
+        finally:
+            name = getattr(fn, "__qualname__", fn.__name__)
+            self._stats.subscribers[name].record(time.perf_counter() - start)
+
+    async def _run_tasks(self, tasks: List, event: Event) -> None:
         """Function that runs various tasks with the event.
 
         It is in charge of scheduling them in the async event loop.
@@ -177,62 +692,353 @@ class EventHandler:
         :param tasks: list of async tasks that are going to be executed
         :param event: standard event inherited from Event class
         """
-        logger.debug(
-            f"awaiting for {[task.get_name() for task in tasks]} triggered by `{event}`"
-        )
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"awaiting for {[task.get_name() for task in tasks]} triggered by `{event}`"
+            )
         try:
             await asyncio.gather(*tasks, return_exceptions=True)
         except asyncio.CancelledError:
             cancelled_tasks = [task for task in tasks if task.cancelled()]
             logger.warning(f"gather cancelled {len(cancelled_tasks)} task(s)")
+            raise
+        finally:
+            for task in tasks:
+                if task.cancelled():
+                    logger.warning(f"task `{task.get_name()}` was cancelled")
+                elif task.done() and task.exception():
+                    self._stats.exceptions += 1
+                    logger.error(
+                        f"error captured in `{task.get_name()}` after `{event}` "
+                        f"- {task.exception().__class__.__name__}: {task.exception()}"
+                    )
 
-        for task in tasks:
-            if task.cancelled():
-                logger.warning(f"task `{task.get_name()}` was cancelled")
-            if not task.cancelled() and task.exception():
-                logger.error(
-                    f"error captured in `{task.get_coro().__name__}` after `{event}` "
-                    f"- {task.exception().__class__.__name__}: {task.exception()}"
-                )
+    def _put(self, entry: Tuple[Event, float]) -> PublishResult:
+        """Puts a new entry in the event buffer applying the overflow policy.
+
+        :param entry: new entry that is going to be put in the event buffer
+        """
+        if self._event_buffer.full_for(entry[0]):
+            logger.warning(f"buffer is full (events:{self._event_buffer.qsize()})")
+            result = self._overflow(entry)
+            if result is not None:
+                return result
+        self._event_buffer.put_nowait(entry)
+        if self._journal is not None:
+            self._journal.record(entry[0])
+        self._stats.published += 1
+        return PublishResult.PUBLISHED
+
+    def _coalesce(self, event: Event, coalescing: Coalescing) -> PublishResult:
+        """Publishes an event of a coalesced EventType.
+
+        :param event: standard event inherited from Event class
+        :param coalescing: how the events of its type are coalesced
+        """
+        key = coalescing.key_of(event)
+        if coalescing.windowed:
+            result = self._windows.offer(event, key, coalescing)
+            if result is not None:
+                if result is PublishResult.COALESCED:
+                    self._stats.coalesced += 1
+                return result
+        return self._put_coalesced(event, key)
+
+    def _put_coalesced(self, event: Event, key: Key) -> PublishResult:
+        """Replaces the event with the same key in the buffer, or puts a new one.
 
-    def _discard_oldest_event(self) -> None:
-        """Discards the oldest event in the event buffer."""
-        event, entered_in_buffer = self._event_buffer.get_nowait()
+        Events released by a window once the handler is stopping are discarded,
+        since they would land after the poison pills.
+
+        :param event: standard event inherited from Event class
+        :param key: coalescing key of the event
+        """
+        if self.state is EventHandlerState.STOPPING:
+            logger.warning(f"discarded event `{event}` -> state is {self.state.name}")
+            self._stats.discarded[DiscardReason.STOPPING] += 1
+            return PublishResult.DISCARDED
+        entry = self._coalesced_entries.get(key)
+        if entry is not None:
+            if self._journal is not None:
+                self._journal.done(entry[0])
+                self._journal.record(event)
+            entry[0] = event
+            self._stats.coalesced += 1
+            return PublishResult.COALESCED
+        entry = CoalescedEntry(event, time.time(), key)
+        result = self._put(entry)
+        if result is PublishResult.PUBLISHED:
+            self._coalesced_entries[key] = entry
+        return result
+
+    def _overflow_policy(self, event: Event) -> OverflowPolicy:
+        """Overflow policy of the event type of an event.
+
+        :param event: standard event inherited from Event class
+        """
+        return self._overflow_policies.get(event.type.uuid, self.overflow_policy)
+
+    def _overflow(self, entry: Tuple[Event, float]) -> Optional[PublishResult]:
+        """Applies the overflow policy to a new entry when the buffer is full.
+
+        :param entry: new entry that is going to be put in the event buffer
+        :return: None if the entry can be put in the buffer, otherwise the result
+        """
+        event = entry[0]
+        policy = self._overflow_policy(event)
+        if policy is OverflowPolicy.DROP_OLDEST:
+            if not self._event_buffer.over_capacity():
+                if self._discard_oldest_event(entry):
+                    return PublishResult.DISCARDED
+                return None
+            # the events kept when the buffer was made smaller are not evicted
+            policy = OverflowPolicy.DROP_NEWEST
+        if policy is OverflowPolicy.DROP_NEWEST:
+            logger.error(f"event `{event}` was discarded -> buffer is full")
+            self._stats.discarded[DiscardReason.DROPPED_NEWEST] += 1
+            return PublishResult.DISCARDED
+        logger.error(f"event `{event}` was rejected -> buffer is full")
+        self._stats.discarded[DiscardReason.REJECTED] += 1
+        return PublishResult.REJECTED
+
+    def _discard_oldest_event(self, entry: Tuple[Event, float]) -> bool:
+        """Discards the oldest event in the event buffer to make room for a new one.
+
+        With the priority buffer the oldest event of the lowest level is discarded,
+        which can be the new event itself.
+
+        :param entry: new entry that is going to be put in the event buffer
+        :return: whether the new entry was the discarded one
+        """
+        discarded = self._event_buffer.evict(entry)
+        event, entered_in_buffer = discarded
+        if type(discarded) is CoalescedEntry:
+            self._coalesced_entries.pop(discarded.key, None)
+        if self._journal is not None:
+            self._journal.done(event)
+        self._stats.discarded[DiscardReason.BUFFER_FULL] += 1
         t = time.time()
         logger.error(
             f"event `{event}` was discarded "
             f"(in buffer time {t - entered_in_buffer:.3f}s)"
         )
+        return discarded is entry
 
-    async def _get_next_event(self) -> Event:
+    async def _get_next_event(self, idle_timeout: Optional[float] = None) -> Event:
         """Gets next event from the event buffer.
 
         It also logs the amount of time the event has been waiting in
         the buffer.
+
+        :param idle_timeout: time without events after which the worker retires,
+            if there are more workers than the minimum (a PoisonPill is returned)
         """
-        event, entered_in_buffer = await self._event_buffer.get()
+        while True:
+            if idle_timeout is None or not self._event_buffer.empty():
+                entry = await self._event_buffer.get()
+                break
+            # unlike asyncio.wait_for, they cannot lose an event that was taken from
+            # the buffer just as the timeout expired
+            entry = None
+            if _UNCANCEL:
+                with _Deadline(idle_timeout):
+                    entry = await self._event_buffer.get()
+            else:
+                _, entry = await _wait_for(self._event_buffer.get(), idle_timeout)
+            if entry is not None:
+                break
+            if self._retire_worker():
+                return PoisonPill
+        if type(entry) is CoalescedEntry:
+            del self._coalesced_entries[entry.key]
+        event, entered_in_buffer = entry
+        if event is RetirePill:
+            self._retiring -= 1
+            self._workers.remove(asyncio.current_task())
+            return PoisonPill
         t = time.time()
-        logger.debug(
-            f"event `{event}` has been in buffer for {t - entered_in_buffer:.3f}s"
-        )
+        if event is not PoisonPill:
+            self._stats.buffer_wait.record(t - entered_in_buffer)
+        if logger.isEnabledFor(logging.DEBUG):
+            logger.debug(
+                f"event `{event}` has been in buffer for {t - entered_in_buffer:.3f}s"
+            )
         return event
 
+    async def _replay(self) -> None:
+        """Puts the events of the journal in the buffer before the buffered ones."""
+        events = self._journal.replay()
+        if not events:
+            return
+        buffered = []
+        while not self._event_buffer.empty():
+            buffered.append(self._event_buffer.get_nowait())
+        t = time.time()
+        for event in events:
+            await self._event_buffer.put((event, t))
+        for entry in buffered:
+            await self._event_buffer.put(entry)
+        logger.info(f"replayed {len(events)} events of the journal")
+
+    def _start_worker(self) -> asyncio.Task:
+        """Creates a new worker task."""
+        i = next(self._worker_ids)
+        return asyncio.create_task(self._worker(i), name=f"worker_{i}")
+
+    def _retire_worker(self) -> bool:
+        """Retires the current worker if there are more workers than the minimum.
+
+        :return: whether the worker must stop
+        """
+        running = self.state is EventHandlerState.RUNNING
+        num_workers = len(self._workers) - self._retiring
+        if not running or num_workers <= self.autoscale.min_workers:
+            return False
+        self._workers.remove(asyncio.current_task())
+        self._stats.scaling[ScaleReason.IDLE] += 1
+        logger.info(f"retiring idle worker (workers:{len(self._workers)})")
+        return True
+
+    def _resize_workers(self, num_workers: int) -> None:
+        """Starts new workers, or asks the left over ones to stop.
+
+        :param num_workers: number of workers (within the autoscale bounds)
+        """
+        if self.autoscale is not None:
+            num_workers = self.autoscale.workers(num_workers)
+        current = len(self._workers) - self._retiring
+        if num_workers > current:
+            self._workers.extend(
+                self._start_worker() for _ in range(num_workers - current)
+            )
+        for _ in range(current - num_workers):
+            self._retiring += 1
+            self._event_buffer.put_unbounded((RetirePill, time.time()))
+
+    async def _scale_workers(self) -> None:
+        """Adds workers periodically while the load is over the autoscale thresholds."""
+        autoscale = self.autoscale
+        histogram = None
+        while True:
+            await asyncio.sleep(autoscale.interval_seconds)
+            buffer_wait = self._stats.buffer_wait
+            if buffer_wait is not histogram:
+                histogram, count, total = buffer_wait, 0, 0.0
+            waited = buffer_wait.count - count
+            mean_wait = (buffer_wait.total - total) / waited if waited else 0.0
+            count, total = buffer_wait.count, buffer_wait.total
+
+            available = autoscale.max_workers - len(self._workers)
+            reason = autoscale.scale_up_reason(self._event_buffer.qsize(), mean_wait)
+            if reason is None or available <= 0:
+                continue
+            added = min(autoscale.step, available)
+            self._workers.extend(self._start_worker() for _ in range(added))
+            self._stats.scaling[reason] += added
+            logger.info(
+                f"added {added} worker(s) because of {reason} "
+                f"(workers:{len(self._workers)})"
+            )
+
+    def _stop_scaler(self) -> None:
+        """Stops adding workers."""
+        if self._scaler is not None:
+            self._scaler.cancel()
+            self._scaler = None
+
     @staticmethod
-    def _check_types(event_class: Type[Event], fn: Callable) -> None:
+    def _check_types(
+        event_class: Type[Event], fn: Callable, is_async: Optional[bool] = True
+    ) -> None:
         """Checks types and raises a TypeError if not correct.
 
         :param event_class: standard event class inherited from Event class
+        :param fn: subscribed function
+        :param is_async: whether the function must be async or not (None for both)
         """
         errors = []
         if not issubclass(event_class, Event):
             errors.append(f"event class {event_class} is not subclassed from Event")
         if not isinstance(fn, Callable):
             errors.append(f"function {fn} is not Callable")
-        if not inspect.iscoroutinefunction(fn):
+        elif is_async and not inspect.iscoroutinefunction(fn):
             errors.append(f"function {fn} is not async")
+        elif is_async is False and inspect.iscoroutinefunction(fn):
+            errors.append(f"function {fn} is async, it cannot run in an executor")
         if errors:
             raise TypeError(*errors)
 
+    def _add_subscriber(
+        self, event_class: Type[Event], fn: Callable, subscriber: Callable
+    ) -> None:
+        """Adds a subscriber (the function itself or a wrapper of it) to an EventType.
+
+        If the function was already subscribed, the new subscriber replaces the old
+        one, which is closed, so the options of the last subscription are used.
+
+        :param event_class: event class that contains an event type
+        :param fn: function that was subscribed
+        :param subscriber: async callable that is called with the event object
+        """
+        key = (event_class.type.uuid, fn)
+        subscribers = self._subscribers[event_class.type.uuid]
+        old = self._wrapped_subscribers.pop(key, fn)
+        if old in subscribers:
+            subscribers.remove(old)
+            if hasattr(old, "close"):
+                self._close_subscriber(old)
+            logger.debug(f"function `{fn.__name__}` was subscribed again")
+        if subscriber is not fn:
+            self._wrapped_subscribers[key] = subscriber
+        subscribers.add(subscriber)
+        self._update_dispatch_table(event_class.type.uuid)
+
+    def _close_subscriber(self, subscriber: Callable) -> None:
+        """Closes an unsubscribed wrapper in a new task.
+
+        :param subscriber: wrapper of a subscribed function
+        """
+        try:
+            loop = asyncio.get_running_loop()
+        except RuntimeError:
+            # without an event loop it has no pending events nor tasks
+            return
+        task = loop.create_task(subscriber.close(), name=f"close_{subscriber.__name__}")
+        self._closing.add(task)
+        task.add_done_callback(self._closing.discard)
+
+    def _get_executor(self, executor_type: ExecutorType) -> Executor:
+        """Gets the managed executor of a type, creating it the first time.
+
+        :param executor_type: type of the executor
+        """
+        executor = self._executors.get(executor_type)
+        if executor is None:
+            # the pools are imported here, since few handlers use them
+            from concurrent.futures import ProcessPoolExecutor
+            from concurrent.futures import ThreadPoolExecutor
+
+            if executor_type is ExecutorType.THREAD:
+                executor = ThreadPoolExecutor(
+                    max_workers=self.thread_pool_workers,
+                    thread_name_prefix="event_handler",
+                )
+            else:
+                executor = ProcessPoolExecutor(max_workers=self.process_pool_workers)
+            self._executors[executor_type] = executor
+        return executor
+
+    def _update_dispatch_table(self, event_type_uuid: str) -> None:
+        """Precomputes the subscribed functions of an event type.
+
+        :param event_type_uuid: unique id of the event type
+        """
+        subscribers = tuple(self._subscribers.get(event_type_uuid, ()))
+        if subscribers:
+            self._dispatch_table[event_type_uuid] = subscribers
+        else:
+            self._dispatch_table.pop(event_type_uuid, None)
+
     def _discard_event(self, event: Any) -> bool:
         """Checks whether the event must be discarded or not.
 
@@ -240,16 +1046,84 @@ class EventHandler:
         """
         if not isinstance(event, Event):
             logger.error(f"discarded event `{event}` -> not subclassed from Event")
+            self._stats.discarded[DiscardReason.NOT_EVENT] += 1
             return True
         if event.type.uuid not in self._subscribers:
-            logger.debug(f"discarded event `{event}` -> there were no subscribers")
+            if logger.isEnabledFor(logging.DEBUG):
+                logger.debug(f"discarded event `{event}` -> there were no subscribers")
+            self._stats.discarded[DiscardReason.NO_SUBSCRIBERS] += 1
             return True
         if self.state is EventHandlerState.STOPPING:
             logger.warning(f"discarded event `{event}` -> state is {self.state.name}")
+            self._stats.discarded[DiscardReason.STOPPING] += 1
             return True
 
         return False
 
 
+class _Deadline:
+    """Context manager that cancels the current task when the timeout expires.
+
+    It is a cheaper alternative to ``asyncio.wait_for`` since it does not wrap the
+    awaited code in a new task. Only the cancellation it caused is suppressed, so it
+    needs Python 3.11+ (see :func:`_wait_for`).
+
+    :param timeout: seconds until the current task is cancelled
+    """
+
+    __slots__ = ("_task", "_handle", "expired")
+
+    def __init__(self, timeout: float) -> None:
+        self._task = asyncio.current_task()
+        self._handle = asyncio.get_running_loop().call_later(timeout, self._expire)
+        self.expired = False
+
+    def __enter__(self) -> "_Deadline":
+        return self
+
+    def __exit__(self, exc_type, exc, tb) -> bool:
+        self._handle.cancel()
+        if not self.expired:
+            return False
+        # the task may have been cancelled by someone else too
+        return exc_type is asyncio.CancelledError and not self._task.uncancel()
+
+    def _expire(self) -> None:
+        self.expired = True
+        self._task.cancel()
+
+
+async def _wait_for(aw: Awaitable, timeout: float) -> Tuple[bool, Any]:
+    """Awaits with a timeout, like ``asyncio.wait_for``, below Python 3.11.
+
+    There a :class:`_Deadline` cannot tell its cancellation from the others, so the
+    awaitable runs in a new task and a cancellation of the current task is never
+    taken as a timeout. A result that arrives just as the timeout expires is kept.
+
+    :param aw: awaitable to await
+    :param timeout: seconds until the awaitable is cancelled
+    :return: whether the timeout expired, and the result (None if it expired)
+    """
+    task = asyncio.ensure_future(aw)
+    try:
+        await asyncio.wait((task,), timeout=timeout)
+        if not task.done():
+            task.cancel()
+            await asyncio.wait((task,))
+    finally:
+        task.cancel()
+    if task.cancelled():
+        return True, None
+    return False, task.result()
+
+
 class PoisonPill(metaclass=NameClassMeta):
     """Poison pill used to stop the workers gracefully."""
+
+
+class RetirePill(metaclass=NameClassMeta):
+    """Pill that stops a single worker when the handler needs fewer of them."""
+
+
+# event handler shared by the whole firmware
+EventSystem = EventHandler()
@@ -0,0 +1,383 @@
+"""Module with the crash-safe journal of the buffered events.
+
+Events of the selected types are appended to a ring of checksummed records in a
+memory-mapped file when they enter the buffer, and released once they have been
+processed (or discarded). Records that were not released when the process
+stopped are replayed on the next start.
+
+Records are encoded with the compact binary codec of the messages, so the data
+of a persisted event must be JSON like (None, bool, int, float, str, bytes, list
+or dict).
+"""
+import asyncio
+import logging
+import mmap
+import os
+import struct
+import zlib
+from collections import deque
+from typing import Deque
+from typing import Dict
+from typing import List
+from typing import Optional
+from typing import Tuple
+from typing import Type
+
+from ..communications.encoding import CodecError
+from ..communications.encoding import decode_data
+from ..communications.encoding import encode_data
+from .enum import EventLevel
+from .schema import Event
+
+logger = logging.getLogger(__name__)
+
+MAGIC = b"IOTRING1"
+HEADER = struct.Struct("<8sQQQ")
+HEADER_SIZE = 64
+RECORD = struct.Struct("<IIQ")
+WRAP = 0xFFFFFFFF
+
+DEFAULT_CAPACITY = 1024 * 1024
+DEFAULT_FSYNC_INTERVAL_SECONDS = 0.05
+
+
+class RingFile:
+    """Append-only ring of checksummed records in a memory-mapped file.
+
+    Positions are logical byte offsets that only grow, the physical offset in the
+    ring is the position modulo the capacity. Sequence numbers start at 1, so the
+    zeros of a new file are never taken for a record. Records never wrap around
+    the end of the ring. When there is no room for a new record, the oldest
+    records are overwritten. Changes reach the disk on :meth:`flush`.
+
+    :param path: path of the ring file, it is created if it does not exist
+    :param capacity: size in bytes of the ring (a different one recreates the file)
+
+    Basic usage.
+
+    >>> import tempfile
+    >>> path = os.path.join(tempfile.mkdtemp(), "ring")
+    >>> ring = RingFile(path, capacity=1024)
+    >>> ring.append(b"first"), ring.append(b"second")
+    (1, 2)
+    >>> ring.release(1)
+    >>> ring.close()
+    >>> RingFile(path, capacity=1024).recover()
+    [(2, b'second')]
+    """
+
+    def __init__(self, path: str, capacity: int = DEFAULT_CAPACITY) -> None:
+        self.path = path
+        self.capacity = capacity
+        self.overwritten = 0
+        self.flushes = 0
+        self._dirty = False
+        size = HEADER_SIZE + capacity
+        fd = os.open(path, os.O_RDWR | os.O_CREAT, 0o644)
+        try:
+            new = os.fstat(fd).st_size != size
+            if new:
+                os.ftruncate(fd, 0)
+                os.ftruncate(fd, size)
+            self._map = mmap.mmap(fd, size)
+        finally:
+            os.close(fd)
+        magic, ring_capacity, self.head, self.head_seq = HEADER.unpack_from(self._map)
+        if new or magic != MAGIC or ring_capacity != capacity:
+            if not new:
+                # stale records could be scanned back in if their seqs line up
+                self._map[HEADER_SIZE:] = bytes(capacity)
+            self.head, self.head_seq = 0, 1
+            self._write_header()
+        self._live: Deque[List] = deque()
+        self._pending = self._scan()
+
+    def recover(self) -> List[Tuple[int, bytes]]:
+        """Records that were not released before the ring was opened.
+
+        It returns them only once, as ``(seq, payload)`` tuples.
+        """
+        pending, self._pending = self._pending, []
+        return pending
+
+    def append(self, payload: bytes) -> int:
+        """Appends a record to the ring.
+
+        :param payload: content of the record
+        :return: sequence number of the record
+        """
+        size = RECORD.size + len(payload)
+        if size > self.capacity:
+            raise ValueError(f"record of {size} bytes does not fit in the ring")
+        start = self.tail
+        left = self.capacity - start % self.capacity
+        if left < size:
+            start += left
+        end = start + size
+        while end - self.head > self.capacity:
+            if not self._live:
+                self.head, self.head_seq = start, self.next_seq
+                self._write_header()
+                break
+            self._overwrite_oldest()
+        if self.tail < start and self.head < start and left >= RECORD.size:
+            offset = HEADER_SIZE + self.tail % self.capacity
+            RECORD.pack_into(self._map, offset, WRAP, 0, self.next_seq)
+
+        seq = self.next_seq
+        offset = HEADER_SIZE + start % self.capacity
+        crc = zlib.crc32(payload, seq & 0xFFFFFFFF)
+        RECORD.pack_into(self._map, offset, len(payload), crc, seq)
+        data_start = offset + RECORD.size
+        data_end = data_start + len(payload)
+        self._map[data_start:data_end] = payload
+        self._live.append([seq, end, False])
+        self.tail = end
+        self.next_seq = seq + 1
+        self._dirty = True
+        return seq
+
+    def release(self, seq: int) -> None:
+        """Marks a record as processed, so that it is not recovered anymore.
+
+        :param seq: sequence number of the record
+        """
+        live = self._live
+        if not live:
+            return
+        index = seq - live[0][0]
+        if index < 0 or index >= len(live):
+            return
+        live[index][2] = True
+        if index == 0:
+            while live and live[0][2]:
+                seq, end, _ = live.popleft()
+                self.head, self.head_seq = end, seq + 1
+            if not live:
+                self.head, self.head_seq = self.tail, self.next_seq
+            self._write_header()
+
+    def __len__(self) -> int:
+        return len(self._live)
+
+    @property
+    def used(self) -> int:
+        """Bytes of the ring used by live records."""
+        return self.tail - self.head
+
+    def flush(self) -> None:
+        """Writes the changes to the disk, if any."""
+        if self._dirty:
+            self._map.flush()
+            self._dirty = False
+            self.flushes += 1
+
+    def close(self) -> None:
+        """Writes the changes to the disk and closes the file."""
+        self.flush()
+        self._map.close()
+
+    def _write_header(self) -> None:
+        """Writes the oldest live record position in the header."""
+        HEADER.pack_into(self._map, 0, MAGIC, self.capacity, self.head, self.head_seq)
+        self._dirty = True
+
+    def _overwrite_oldest(self) -> None:
+        """Forgets the oldest live record to make room."""
+        seq, end, released = self._live.popleft()
+        if not released:
+            self.overwritten += 1
+            logger.warning(f"journal record {seq} was overwritten -> ring is full")
+        self.head, self.head_seq = end, seq + 1
+        self._write_header()
+
+    def _scan(self) -> List[Tuple[int, bytes]]:
+        """Reads the valid records from the oldest live one."""
+        pending = []
+        position, seq = self.head, self.head_seq
+        capacity = self.capacity
+        while position - self.head < capacity:
+            offset = position % capacity
+            if capacity - offset < RECORD.size:
+                position += capacity - offset
+                continue
+            length, crc, record_seq = RECORD.unpack_from(
+                self._map, HEADER_SIZE + offset
+            )
+            if record_seq != seq:
+                break
+            if length == WRAP:
+                position += capacity - offset
+                continue
+            end = position + RECORD.size + length
+            if offset + RECORD.size + length > capacity:
+                break
+            data_start = HEADER_SIZE + offset + RECORD.size
+            data_end = data_start + length
+            payload = self._map[data_start:data_end]
+            if zlib.crc32(payload, seq & 0xFFFFFFFF) != crc:
+                break
+            pending.append((seq, payload))
+            self._live.append([seq, end, False])
+            position, seq = end, seq + 1
+        self.tail, self.next_seq = position, seq
+        if not pending:
+            self.head, self.head_seq = self.tail, self.next_seq
+        return pending
+
+
+class EventJournal:
+    """Journal of the buffered events of the registered event types.
+
+    :param path: path of the ring file
+    :param capacity: size in bytes of the ring
+    :param fsync_interval: seconds between writes to the disk
+
+    Basic usage.
+
+    >>> import tempfile
+    >>> from mocks.mocks import MockEvent
+    >>> path = os.path.join(tempfile.mkdtemp(), "journal")
+    >>> journal = EventJournal(path)
+    >>> journal.register(MockEvent, "mock")
+    >>> journal.record(MockEvent(data={"value": 1}))
+    >>> journal.close()
+    >>> journal = EventJournal(path)
+    >>> journal.register(MockEvent, "mock")
+    >>> journal.replay()
+    [MockEvent(data={'value': 1}, level='INFO')]
+    """
+
+    def __init__(
+        self,
+        path: str,
+        capacity: int = DEFAULT_CAPACITY,
+        fsync_interval: float = DEFAULT_FSYNC_INTERVAL_SECONDS,
+    ) -> None:
+        self.fsync_interval = fsync_interval
+        self.replayed = 0
+        self.errors = 0
+        self.closed = False
+        self._ring = RingFile(path, capacity)
+        self._names: Dict[str, str] = {}
+        self._classes: Dict[str, Type[Event]] = {}
+        self._seqs: Dict[int, int] = {}
+        self._buffer = bytearray()
+
+    def register(self, event_class: Type[Event], name: Optional[str] = None) -> None:
+        """Persists the events of an EventType.
+
+        :param event_class: event class that contains an event type
+        :param name: stable name of the events in the journal (by default the
+            module and name of the class)
+        """
+        if name is None:
+            name = f"{event_class.__module__}.{event_class.__qualname__}"
+        self._names[event_class.type.uuid] = name
+        self._classes[name] = event_class
+
+    def record(self, event: Event) -> None:
+        """Appends the event to the journal if its type is persisted.
+
+        :param event: standard event inherited from Event class
+        """
+        name = self._names.get(event.type.uuid)
+        if name is None:
+            return
+        if self.closed:
+            self.open()
+        buffer = self._buffer
+        del buffer[:]
+        try:
+            encode_data((name, str(event.level), event.timestamp, event.data), buffer)
+            self._seqs[event.id] = self._ring.append(buffer)
+        except (TypeError, ValueError) as e:
+            self.errors += 1
+            logger.error(f"event `{event}` was not persisted - {e}")
+
+    def done(self, event: Event) -> None:
+        """Releases the record of a processed or discarded event.
+
+        :param event: standard event inherited from Event class
+        """
+        seq = self._seqs.pop(event.id, None)
+        if seq is not None:
+            if self.closed:
+                self.open()
+            self._ring.release(seq)
+
+    def replay(self) -> List[Event]:
+        """Events that were not processed before the journal was opened.
+
+        Records of event types that are not registered are released.
+        """
+        events = []
+        for seq, payload in self._ring.recover():
+            try:
+                (name, level, timestamp, data), _ = decode_data(memoryview(payload))
+            except (CodecError, IndexError, TypeError, ValueError) as e:
+                self.errors += 1
+                logger.error(f"journal record {seq} cannot be decoded - {e}")
+                self._ring.release(seq)
+                continue
+            event_class = self._classes.get(name)
+            if event_class is None:
+                logger.warning(f"journal record {seq} of unknown event `{name}`")
+                self._ring.release(seq)
+                continue
+            try:
+                event = event_class(data=data, level=EventLevel(level))
+            except Exception as e:
+                self.errors += 1
+                logger.error(f"journal record {seq} cannot be replayed - {e!r}")
+                self._ring.release(seq)
+                continue
+            event.timestamp = timestamp
+            self._seqs[event.id] = seq
+            events.append(event)
+        self.replayed += len(events)
+        return events
+
+    async def flush_periodically(self) -> None:
+        """Writes the changes to the disk every ``fsync_interval`` seconds."""
+        while True:
+            await asyncio.sleep(self.fsync_interval)
+            self._ring.flush()
+
+    def flush(self) -> None:
+        """Writes the changes to the disk, if any."""
+        self._ring.flush()
+
+    def open(self) -> None:
+        """Opens the ring file again after the journal was closed.
+
+        The records left in the ring are the events that are still buffered, so
+        they are not replayed again.
+        """
+        ring = self._ring
+        self._ring = RingFile(ring.path, ring.capacity)
+        self._ring.overwritten, self._ring.flushes = ring.overwritten, ring.flushes
+        self._ring.recover()
+        self.closed = False
+
+    def close(self) -> None:
+        """Writes the changes to the disk and closes the journal.
+
+        It is opened again when another event is recorded or released.
+        """
+        if not self.closed:
+            self._ring.close()
+            self.closed = True
+
+    def stats(self) -> Dict:
+        """Metrics of the journal."""
+        ring = self._ring
+        return {
+            "records": len(self._seqs),
+            "used": ring.used,
+            "capacity": ring.capacity,
+            "overwritten": ring.overwritten,
+            "flushes": ring.flushes,
+            "replayed": self.replayed,
+            "errors": self.errors,
+        }
@@ -0,0 +1,78 @@
+"""Module with the autoscaling policy of the EventHandler workers."""
+from dataclasses import dataclass
+from typing import Optional
+
+from .enum import ScaleReason
+
+DEFAULT_MIN_WORKERS = 1
+DEFAULT_MAX_WORKERS = 50
+DEFAULT_QUEUE_DEPTH = 10
+DEFAULT_BUFFER_WAIT_SECONDS = 0.1
+DEFAULT_COOLDOWN_SECONDS = 5
+DEFAULT_INTERVAL_SECONDS = 0.1
+
+
+@dataclass(frozen=True)
+class Autoscale:
+    """When the EventHandler adds and retires workers.
+
+    Every ``interval_seconds`` up to ``step`` workers are added if there are more
+    than ``queue_depth`` events in the buffer or if the events processed since the
+    last check waited ``buffer_wait_seconds`` in the buffer on average. A worker
+    that has waited ``cooldown_seconds`` without any event retires.
+
+    :param min_workers: minimum number of workers
+    :param max_workers: maximum number of workers
+    :param queue_depth: events in the buffer that trigger a scale up
+    :param buffer_wait_seconds: mean buffer wait that triggers a scale up
+    :param cooldown_seconds: idle time after which a worker retires
+    :param interval_seconds: time between scale up checks
+    :param step: maximum number of workers added in each check
+
+    Basic usage.
+
+    >>> autoscale = Autoscale(min_workers=2, max_workers=4)
+    >>> autoscale.workers(10)
+    4
+    >>> print(autoscale.scale_up_reason(queue_depth=20, buffer_wait=0.0))
+    queue_depth
+    """
+
+    min_workers: int = DEFAULT_MIN_WORKERS
+    max_workers: int = DEFAULT_MAX_WORKERS
+    queue_depth: int = DEFAULT_QUEUE_DEPTH
+    buffer_wait_seconds: float = DEFAULT_BUFFER_WAIT_SECONDS
+    cooldown_seconds: float = DEFAULT_COOLDOWN_SECONDS
+    interval_seconds: float = DEFAULT_INTERVAL_SECONDS
+    step: int = 1
+
+    def __post_init__(self):
+        """Checks the bounds."""
+        if not 1 <= self.min_workers <= self.max_workers:
+            raise ValueError(
+                f"workers bounds must be 1 <= min <= max, "
+                f"got {self.min_workers} and {self.max_workers}"
+            )
+        if self.step < 1:
+            raise ValueError(f"step must be at least 1, got {self.step}")
+
+    def workers(self, num_workers: int) -> int:
+        """Number of workers within the bounds.
+
+        :param num_workers: requested number of workers
+        """
+        return min(max(num_workers, self.min_workers), self.max_workers)
+
+    def scale_up_reason(
+        self, queue_depth: int, buffer_wait: float
+    ) -> Optional[ScaleReason]:
+        """Reason to add workers, if any.
+
+        :param queue_depth: number of events in the buffer
+        :param buffer_wait: mean buffer wait of the last processed events
+        """
+        if queue_depth > self.queue_depth:
+            return ScaleReason.QUEUE_DEPTH
+        if buffer_wait > self.buffer_wait_seconds:
+            return ScaleReason.BUFFER_WAIT
+        return None
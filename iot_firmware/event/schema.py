@@ -1,10 +1,12 @@
 """Module with the schemas related with the event package."""
 import abc
+import itertools
 import time
 import uuid
 from dataclasses import dataclass
 from dataclasses import field
 from typing import Any
+from typing import Optional
 
 from .enum import EventLevel
 
@@ -27,20 +29,83 @@ class EventType(metaclass=EventTypeMeta):
     """Abstract class for any Event type class."""
 
 
+_event_ids = itertools.count(1)
+
+
 @dataclass
+class _EventFields:
+    """Attributes of Event as dataclass fields, so that the dataclass subclasses of
+    Event take ``data`` and ``level`` and set the rest of attributes."""
+
+    data: Any = None
+    level: EventLevel = EventLevel.INFO
+    id: int = field(init=False, repr=False, default_factory=lambda: next(_event_ids))
+    timestamp: float = field(init=False, repr=False, default_factory=time.time)
+    monotonic: float = field(
+        init=False, repr=False, compare=False, default_factory=time.monotonic
+    )
+    # factories, since dataclasses only set the plain defaults as class attributes
+    device_id: Optional[int] = field(
+        init=False, repr=False, compare=False, default_factory=lambda: None
+    )
+    _uuid: Optional[str] = field(
+        init=False, repr=False, compare=False, default_factory=lambda: None
+    )
+
+
 class Event(abc.ABC):
     """Abstract class for any Event class.
 
     Contains a custom name and any data as well as a level of an event.
 
+    Events are cheap to create: the ``id`` is a per-process monotonic counter and
+    the ``uuid`` string is only generated the first time it is read. Besides the
+    wall clock ``timestamp`` it also stores a ``monotonic`` clock timestamp, which
+    is the one to use to measure durations.
+
+    Events published by a device of a gateway also carry its ``device_id``.
+
+    Subclasses can declare ``__slots__ = ()`` so that their events do not carry a
+    ``__dict__`` either. Dataclass subclasses take ``data`` and ``level`` before
+    their own fields. Events are equal when they are copies of the same event.
+
     :param data: Any data in any format
     :param level: level of the event (default INFO)
     """
 
-    data: Any = field(init=True, repr=True, default=None)
-    level: EventLevel = field(init=True, repr=True, default=EventLevel.INFO)
-    timestamp: float = field(init=False, repr=False, default_factory=time.time)
-    uuid: str = field(init=False, repr=False, default_factory=lambda: str(uuid.uuid4()))
+    __slots__ = ("data", "level", "id", "timestamp", "monotonic", "device_id", "_uuid")
+    __dataclass_fields__ = _EventFields.__dataclass_fields__
+    __dataclass_params__ = _EventFields.__dataclass_params__
+
+    def __init__(self, data: Any = None, level: EventLevel = EventLevel.INFO) -> None:
+        self.data = data
+        self.level = level
+        self.id = next(_event_ids)
+        self.timestamp = time.time()
+        self.monotonic = time.monotonic()
+        self.device_id = None
+        self._uuid = None
+
+    @property
+    def uuid(self) -> str:
+        """Unique id of the event, generated the first time it is read."""
+        if self._uuid is None:
+            self._uuid = str(uuid.uuid4())
+        return self._uuid
+
+    def __eq__(self, other: Any) -> bool:
+        if other.__class__ is not self.__class__:
+            return NotImplemented
+        return (self.data, self.level, self.id, self.timestamp) == (
+            other.data,
+            other.level,
+            other.id,
+            other.timestamp,
+        )
+
+    def __repr__(self) -> str:
+        """Representation of the event."""
+        return f"{self.__class__.__name__}(data={self.data!r}, level={self.level!r})"
 
     @property
     @abc.abstractmethod
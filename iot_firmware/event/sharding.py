@@ -0,0 +1,483 @@
+"""Module with the event handlers sharded across worker processes.
+
+Each shard is a worker process with its own
+:class:`~iot_firmware.event.handler.EventHandler`. Published events are routed to
+a shard by their event type, or by a partition key, and they reach it through a
+ring buffer in shared memory, encoded with the compact binary codec of the
+messages (so their data must be JSON like, as the data of the journal).
+
+Events waiting in a ring survive a crash of its worker, which is restarted and
+continues with them. The events that the worker had already taken into its
+buffer are lost.
+
+The workers are forked, so shards are only available where the ``fork`` start
+method of multiprocessing is (not on Windows).
+"""
+import asyncio
+import logging
+import mmap
+import multiprocessing
+import os
+import struct
+import threading
+import time
+from typing import Callable
+from typing import Dict
+from typing import Hashable
+from typing import Iterable
+from typing import List
+from typing import Optional
+from typing import Type
+
+from ..communications.encoding import CodecError
+from ..communications.encoding import decode_data
+from ..communications.encoding import encode_data
+from .enum import EventLevel
+from .enum import PublishResult
+from .handler import EventHandler
+from .schema import Event
+
+logger = logging.getLogger(__name__)
+
+U64 = struct.Struct("<Q")
+RECORD = struct.Struct("<I")
+HEADER_SIZE = 64
+HEAD, TAIL, RECEIVED, PROCESSED, READY = range(0, 40, U64.size)
+WRAP = 0xFFFFFFFF
+STOP = 0xFFFFFFFE
+
+DEFAULT_RING_BYTES = 1024 * 1024
+DEFAULT_BATCH_SIZE = 256
+DEFAULT_POLL_SECONDS = 0.001
+DEFAULT_MAX_POLL_SECONDS = 0.05
+DEFAULT_CHECK_SECONDS = 0.1
+DEFAULT_MAX_RESTARTS = 5
+DEFAULT_TIMEOUT_SECONDS = 10
+
+# a lock round trip is a full memory barrier, so a record is written before the
+# tail that publishes it, and read after it, also on weakly ordered CPUs
+_fence = threading.Lock()
+
+
+class SharedRing:
+    """Single producer and single consumer ring of records in shared memory.
+
+    The memory is shared with the processes forked after the ring is created.
+    Positions are logical byte offsets that only grow, the producer only writes
+    the tail and the consumer only writes the head. Records never wrap around
+    the end of the ring.
+
+    :param capacity: size in bytes of the ring
+
+    Basic usage.
+
+    >>> ring = SharedRing(capacity=64)
+    >>> ring.put(b"first"), ring.put(b"second"), ring.put_stop()
+    (True, True, True)
+    >>> ring.get(10)
+    [b'first', b'second', None]
+    """
+
+    def __init__(self, capacity: int = DEFAULT_RING_BYTES) -> None:
+        self.capacity = capacity
+        self._map = mmap.mmap(-1, HEADER_SIZE + capacity)
+
+    def __len__(self) -> int:
+        return self.tail - self.head
+
+    @property
+    def head(self) -> int:
+        """Position of the next record to take."""
+        return self._get(HEAD)
+
+    @property
+    def tail(self) -> int:
+        """Position of the next record to append."""
+        return self._get(TAIL)
+
+    @property
+    def received(self) -> int:
+        """Number of records taken by the consumers."""
+        return self._get(RECEIVED)
+
+    @received.setter
+    def received(self, value: int) -> None:
+        self._set(RECEIVED, value)
+
+    @property
+    def processed(self) -> int:
+        """Number of events processed by the consumers."""
+        return self._get(PROCESSED)
+
+    @processed.setter
+    def processed(self, value: int) -> None:
+        self._set(PROCESSED, value)
+
+    @property
+    def ready(self) -> bool:
+        """Whether the consumer is taking records."""
+        return bool(self._get(READY))
+
+    @ready.setter
+    def ready(self, value: bool) -> None:
+        self._set(READY, value)
+
+    def put(self, payload: bytes) -> bool:
+        """Appends a record, if there is room for it.
+
+        :param payload: content of the record
+        :return: whether the record was appended
+        """
+        return self._put(len(payload), payload)
+
+    def put_stop(self) -> bool:
+        """Appends the record that tells the consumer to stop."""
+        return self._put(STOP, b"")
+
+    def get(self, max_records: int) -> List[Optional[bytes]]:
+        """Takes the oldest records (None for a stop record).
+
+        :param max_records: maximum number of records to take
+        """
+        capacity = self.capacity
+        head, tail = self.head, self.tail
+        with _fence:
+            pass
+        records: List[Optional[bytes]] = []
+        while head < tail and len(records) < max_records:
+            left = capacity - head % capacity
+            if left < RECORD.size:
+                head += left
+                continue
+            offset = HEADER_SIZE + head % capacity
+            (size,) = RECORD.unpack_from(self._map, offset)
+            if size == WRAP:
+                head += left
+                continue
+            head += RECORD.size
+            if size == STOP:
+                records.append(None)
+                continue
+            data_start = offset + RECORD.size
+            data_end = data_start + size
+            records.append(self._map[data_start:data_end])
+            head += size
+        self._set(HEAD, head)
+        return records
+
+    def close(self) -> None:
+        """Releases the memory of the ring in this process."""
+        self._map.close()
+
+    def _put(self, size: int, payload: bytes) -> bool:
+        """Appends a record of a size (or marker) and payload."""
+        capacity = self.capacity
+        record_size = RECORD.size + len(payload)
+        if record_size > capacity:
+            raise ValueError(f"record of {record_size} bytes does not fit in the ring")
+        tail = start = self.tail
+        left = capacity - tail % capacity
+        if left < record_size:
+            start += left
+        if start + record_size - self.head > capacity:
+            return False
+        if start != tail and left >= RECORD.size:
+            RECORD.pack_into(self._map, HEADER_SIZE + tail % capacity, WRAP)
+        offset = HEADER_SIZE + start % capacity
+        RECORD.pack_into(self._map, offset, size)
+        data_start = offset + RECORD.size
+        data_end = data_start + len(payload)
+        self._map[data_start:data_end] = payload
+        with _fence:
+            pass
+        self._set(TAIL, start + record_size)
+        return True
+
+    def _get(self, field: int) -> int:
+        return U64.unpack_from(self._map, field)[0]
+
+    def _set(self, field: int, value: int) -> None:
+        U64.pack_into(self._map, field, value)
+
+
+class Shards:
+    """Event handlers in worker processes fed through shared memory rings.
+
+    Events are routed to a shard by the hash of their partition key, which by
+    default is their event type, so that each EventType is processed in order by
+    a single shard. Only the event types registered with :meth:`register` can be
+    published.
+
+    :param setup: function called in each worker with its new EventHandler and
+        the index of its shard, to subscribe the functions
+    :param num_shards: number of worker processes (by default one per CPU)
+    :param partition: function that returns the partition key of an event
+    :param handler_options: keyword arguments of the EventHandler of each worker
+    :param ring_bytes: size in bytes of the ring of each shard
+    :param max_restarts: maximum restarts of the worker of a shard after a crash
+    :param poll_seconds: time a worker waits for new events when its ring is empty
+    :param max_poll_seconds: maximum wait of a worker, which doubles its wait while
+        its ring stays empty
+
+    Basic usage.
+
+    >>> from mocks.mocks import MockEvent
+    >>> def setup(event_handler, shard):
+    ...     pass
+    >>> shards = Shards(setup, num_shards=2)
+    >>> shards.register(MockEvent)
+    >>> shards.publish(MockEvent(data=1)).name
+    'PUBLISHED'
+    >>> shards.stats()["published"]
+    1
+    """
+
+    def __init__(
+        self,
+        setup: Callable[[EventHandler, int], None],
+        num_shards: Optional[int] = None,
+        partition: Optional[Callable[[Event], Hashable]] = None,
+        handler_options: Optional[Dict] = None,
+        ring_bytes: int = DEFAULT_RING_BYTES,
+        max_restarts: int = DEFAULT_MAX_RESTARTS,
+        poll_seconds: float = DEFAULT_POLL_SECONDS,
+        max_poll_seconds: float = DEFAULT_MAX_POLL_SECONDS,
+    ) -> None:
+        if "fork" not in multiprocessing.get_all_start_methods():
+            raise RuntimeError("shards need the fork start method of multiprocessing")
+        self.setup = setup
+        self.num_shards = num_shards or os.cpu_count() or 1
+        self.partition = partition
+        self.handler_options = handler_options or {}
+        self.max_restarts = max_restarts
+        self.poll_seconds = poll_seconds
+        self.max_poll_seconds = max_poll_seconds
+        self.stopping = False
+        self._rings = [SharedRing(ring_bytes) for _ in range(self.num_shards)]
+        self._processes: List[Optional[multiprocessing.Process]] = [
+            None
+        ] * self.num_shards
+        self._restarts = [0] * self.num_shards
+        self._published = [0] * self.num_shards
+        self._rejected = [0] * self.num_shards
+        self._names: Dict[str, str] = {}
+        self._classes: Dict[str, Type[Event]] = {}
+        self._context = multiprocessing.get_context("fork")
+        self._buffer = bytearray()
+
+    def register(self, event_class: Type[Event], name: Optional[str] = None) -> None:
+        """Allows the events of an EventType to be published.
+
+        :param event_class: event class that contains an event type
+        :param name: name of the events in the rings (by default the module and
+            name of the class)
+        """
+        if name is None:
+            name = f"{event_class.__module__}.{event_class.__qualname__}"
+        self._names[event_class.type.uuid] = name
+        self._classes[name] = event_class
+
+    def publish(self, event: Event) -> PublishResult:
+        """Puts the event in the ring of its shard.
+
+        :param event: standard event inherited from Event class
+        :return: rejected when the ring is full
+        """
+        name = self._names.get(event.type.uuid) if isinstance(event, Event) else None
+        if name is None:
+            logger.error(f"discarded event `{event}` -> event type is not registered")
+            return PublishResult.DISCARDED
+        key = event.type.uuid if self.partition is None else self.partition(event)
+        shard = hash(key) % self.num_shards
+        buffer = self._buffer
+        del buffer[:]
+        try:
+            data = (name, str(event.level), event.timestamp, event.device_id)
+            encode_data(data + (event.data,), buffer)
+        except (TypeError, ValueError) as e:
+            logger.error(f"discarded event `{event}` -> it cannot be encoded - {e}")
+            return PublishResult.DISCARDED
+        if not self._rings[shard].put(buffer):
+            self._rejected[shard] += 1
+            return PublishResult.REJECTED
+        self._published[shard] += 1
+        return PublishResult.PUBLISHED
+
+    def publish_many(self, events: Iterable[Event]) -> int:
+        """Puts many events in the rings of their shards.
+
+        :param events: standard events inherited from Event class
+        :return: number of published events
+        """
+        published = PublishResult.PUBLISHED
+        return sum(self.publish(event) is published for event in events)
+
+    async def start(self, timeout: float = DEFAULT_TIMEOUT_SECONDS) -> None:
+        """Starts the workers and waits until all of them are ready.
+
+        :param timeout: maximum time to wait for the workers
+        """
+        self.stopping = False
+        for index in range(self.num_shards):
+            self._start_worker(index)
+        deadline = time.monotonic() + timeout
+        while not all(ring.ready for ring in self._rings):
+            if time.monotonic() > deadline:
+                raise TimeoutError(f"shards were not ready after {timeout}s")
+            await asyncio.sleep(self.poll_seconds)
+        logger.info(f"{self.num_shards} shards are running")
+
+    async def supervise(self, check_seconds: float = DEFAULT_CHECK_SECONDS) -> None:
+        """Restarts the workers that stopped unexpectedly, until they are stopped.
+
+        :param check_seconds: time between checks of the workers
+        """
+        while not self.stopping:
+            for index, process in enumerate(self._processes):
+                if process is None or process.exitcode is None:
+                    continue
+                self._processes[index] = None
+                logger.error(f"shard {index} exited with code {process.exitcode}")
+                if self._restarts[index] >= self.max_restarts:
+                    logger.error(f"shard {index} reached its max restarts")
+                    continue
+                self._restarts[index] += 1
+                self._start_worker(index)
+            await asyncio.sleep(check_seconds)
+
+    async def stop(self, timeout: float = DEFAULT_TIMEOUT_SECONDS) -> None:
+        """Stops the workers once they processed the published events.
+
+        Workers that do not stop in time are terminated.
+
+        :param timeout: maximum time to wait for the workers
+        """
+        self.stopping = True
+        deadline = time.monotonic() + timeout
+        pending = [index for index, process in enumerate(self._processes) if process]
+        while pending and time.monotonic() < deadline:
+            pending = [i for i in pending if not self._rings[i].put_stop()]
+            await asyncio.sleep(self.poll_seconds)
+        for index, process in enumerate(self._processes):
+            if process is None:
+                continue
+            while process.exitcode is None and time.monotonic() < deadline:
+                await asyncio.sleep(self.poll_seconds)
+            if process.exitcode is None:
+                logger.error(f"shard {index} did not stop in time, terminating it")
+                process.terminate()
+            process.join()
+            self._processes[index] = None
+        logger.info("shards have stopped")
+
+    async def run(self) -> None:
+        """Starts the workers and supervises them until it is cancelled."""
+        await self.start()
+        try:
+            await self.supervise()
+        finally:
+            await self.stop()
+
+    def stats(self) -> Dict:
+        """Metrics of the shards."""
+        shards = []
+        for index, ring in enumerate(self._rings):
+            process = self._processes[index]
+            shards.append(
+                {
+                    "pid": process and process.pid,
+                    "restarts": self._restarts[index],
+                    "published": self._published[index],
+                    "rejected": self._rejected[index],
+                    "received": ring.received,
+                    "processed": ring.processed,
+                    "ring_used": len(ring),
+                }
+            )
+        return {
+            "published": sum(self._published),
+            "rejected": sum(self._rejected),
+            "processed": sum(shard["processed"] for shard in shards),
+            "shards": shards,
+        }
+
+    def _start_worker(self, index: int) -> None:
+        """Forks the worker process of a shard.
+
+        :param index: index of the shard
+        """
+        self._rings[index].ready = False
+        process = self._context.Process(
+            target=_run_worker, args=(self, index), name=f"shard-{index}", daemon=True
+        )
+        process.start()
+        self._processes[index] = process
+
+    async def _serve(self, index: int) -> None:
+        """Feeds the events of the ring of a shard to a new EventHandler.
+
+        :param index: index of the shard
+        """
+        ring = self._rings[index]
+        # the counter continues after the ones of the crashed workers
+        processed = ring.processed
+        event_handler = EventHandler(**self.handler_options)
+        self.setup(event_handler, index)
+        runner = asyncio.create_task(event_handler.run())
+        await asyncio.sleep(0)
+        ring.ready = True
+        event_buffer = event_handler._event_buffer
+        stopped = False
+        poll_seconds = self.poll_seconds
+        while not stopped:
+            room = DEFAULT_BATCH_SIZE
+            if event_buffer.maxsize > 0:
+                room = min(room, event_buffer.maxsize - event_buffer.qsize())
+            records = ring.get(room) if room > 0 else []
+            events = []
+            for payload in records:
+                if payload is None:
+                    stopped = True
+                    break
+                event = self._decode(payload)
+                if event is not None:
+                    events.append(event)
+            event_handler.publish_many(events)
+            ring.received += len(records)
+            ring.processed = processed + event_handler._stats.processed
+            if records:
+                poll_seconds = self.poll_seconds
+                await asyncio.sleep(0)
+            else:
+                # back off while the ring is idle, so an idle worker barely wakes up
+                await asyncio.sleep(poll_seconds)
+                poll_seconds = min(poll_seconds * 2, self.max_poll_seconds)
+        await event_handler.stop()
+        await runner
+        ring.processed = processed + event_handler._stats.processed
+
+    def _decode(self, payload: bytes) -> Optional[Event]:
+        """Decodes an event of a ring.
+
+        :param payload: content of the record
+        """
+        try:
+            (name, level, timestamp, device_id, data), _ = decode_data(
+                memoryview(payload)
+            )
+            event = self._classes[name](data=data, level=EventLevel(level))
+        except (CodecError, IndexError, KeyError, TypeError, ValueError) as e:
+            logger.error(f"shard event cannot be decoded - {e!r}")
+            return None
+        event.timestamp = timestamp
+        event.device_id = device_id
+        return event
+
+
+def _run_worker(shards: Shards, index: int) -> None:
+    """Main function of the worker process of a shard.
+
+    :param shards: shards of the worker
+    :param index: index of the shard
+    """
+    asyncio.run(shards._serve(index))
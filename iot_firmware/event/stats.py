@@ -0,0 +1,156 @@
+"""Module with the metrics of the event package.
+
+Metrics are plain counters and log2 histograms updated in place, so recording
+them is cheap and all the aggregation is done only when a snapshot is taken.
+"""
+import time
+from collections import defaultdict
+from dataclasses import dataclass
+from dataclasses import field
+from typing import Dict
+from typing import List
+
+from .enum import DiscardReason
+from .enum import ScaleReason
+
+NUM_BUCKETS = 40
+
+
+class Histogram:
+    """Histogram of durations with log2 buckets of microseconds.
+
+    Basic usage.
+
+    >>> histogram = Histogram()
+    >>> for seconds in [0.001, 0.002, 0.004]:
+    ...     histogram.record(seconds)
+    >>> snapshot = histogram.snapshot()
+    >>> snapshot["count"], snapshot["max"]
+    (3, 0.004)
+    >>> snapshot["p50"]
+    0.002048
+    """
+
+    __slots__ = ("count", "total", "max", "buckets")
+
+    def __init__(self) -> None:
+        self.count = 0
+        self.total = 0.0
+        self.max = 0.0
+        self.buckets: List[int] = [0] * NUM_BUCKETS
+
+    def record(self, seconds: float) -> None:
+        """Adds a duration to the histogram.
+
+        :param seconds: duration in seconds
+        """
+        self.count += 1
+        self.total += seconds
+        if seconds > self.max:
+            self.max = seconds
+        bucket = int(seconds * 1_000_000).bit_length() if seconds > 0 else 0
+        self.buckets[min(bucket, NUM_BUCKETS - 1)] += 1
+
+    def percentile(self, percent: float) -> float:
+        """Upper bound in seconds of the bucket that contains a percentile.
+
+        :param percent: percentile between 0 and 100
+        """
+        if not self.count:
+            return 0.0
+        threshold = self.count * percent / 100
+        accumulated = 0
+        for bucket, count in enumerate(self.buckets):
+            accumulated += count
+            if accumulated >= threshold:
+                break
+        return min(2**bucket / 1_000_000, self.max)
+
+    def snapshot(self) -> Dict[str, float]:
+        """Summary of the histogram."""
+        return {
+            "count": self.count,
+            "mean": self.total / self.count if self.count else 0.0,
+            "max": self.max,
+            "p50": self.percentile(50),
+            "p90": self.percentile(90),
+            "p99": self.percentile(99),
+        }
+
+
+@dataclass
+class EventHandlerStats:
+    """Metrics of an EventHandler.
+
+    Basic usage.
+
+    >>> stats = EventHandlerStats()
+    >>> stats.discarded[DiscardReason.BUFFER_FULL] += 1
+    >>> stats.snapshot()["discarded"]
+    {'buffer_full': 1}
+    """
+
+    published: int = 0
+    processed: int = 0
+    coalesced: int = 0
+    timeouts: int = 0
+    exceptions: int = 0
+    discarded: Dict[DiscardReason, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+    scaling: Dict[ScaleReason, int] = field(default_factory=lambda: defaultdict(int))
+    buffer_wait: Histogram = field(default_factory=Histogram)
+    processing_time: Histogram = field(default_factory=Histogram)
+    subscribers: Dict[str, Histogram] = field(
+        default_factory=lambda: defaultdict(Histogram)
+    )
+    isolated: Dict[str, Histogram] = field(
+        default_factory=lambda: defaultdict(Histogram)
+    )
+    subscriber_timeouts: Dict[str, int] = field(
+        default_factory=lambda: defaultdict(int)
+    )
+    started: float = field(default_factory=time.monotonic)
+
+    def snapshot(self) -> Dict:
+        """Summary of all the metrics."""
+        elapsed = time.monotonic() - self.started
+        return {
+            "elapsed": elapsed,
+            "published": self.published,
+            "publish_rate": self.published / elapsed if elapsed > 0 else 0.0,
+            "processed": self.processed,
+            "coalesced": self.coalesced,
+            "timeouts": self.timeouts,
+            "exceptions": self.exceptions,
+            "discarded": {str(reason): n for reason, n in self.discarded.items()},
+            "scaling": {str(reason): n for reason, n in self.scaling.items()},
+            "buffer_wait": self.buffer_wait.snapshot(),
+            "processing_time": self.processing_time.snapshot(),
+            "subscribers": {
+                name: histogram.snapshot()
+                for name, histogram in self.subscribers.items()
+            },
+            "isolated": {
+                name: histogram.snapshot() for name, histogram in self.isolated.items()
+            },
+            "subscriber_timeouts": dict(self.subscriber_timeouts),
+            "worker_usage": self.worker_usage(),
+        }
+
+    def worker_usage(self) -> Dict[str, float]:
+        """Share of the time in the workers used by each subscriber, highest first.
+
+        >>> stats = EventHandlerStats()
+        >>> stats.subscribers["fast"].record(1.0)
+        >>> stats.subscribers["slow"].record(3.0)
+        >>> stats.worker_usage()
+        {'slow': 0.75, 'fast': 0.25}
+        """
+        busy = sum(histogram.total for histogram in self.subscribers.values())
+        if not busy:
+            return {}
+        usage = {
+            name: histogram.total / busy for name, histogram in self.subscribers.items()
+        }
+        return dict(sorted(usage.items(), key=lambda item: item[1], reverse=True))
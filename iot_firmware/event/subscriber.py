@@ -0,0 +1,351 @@
+"""Module with the wrappers that change how subscribed functions are called."""
+import asyncio
+import logging
+import time
+from concurrent.futures import Executor
+from concurrent.futures import Future
+from typing import Callable
+from typing import List
+from typing import Optional
+from typing import Set
+
+from .enum import DiscardReason
+from .schema import Event
+from .stats import EventHandlerStats
+
+logger = logging.getLogger(__name__)
+
+
+class BatchSubscriber:
+    """Subscriber that calls a function with lists of events instead of single events.
+
+    A batch is delivered as soon as it has ``max_size`` events or when its oldest
+    event has waited ``max_delay`` seconds, whatever happens first.
+
+    :param fn: async function that is going to be called with a list of events
+    :param max_size: maximum number of events of a batch
+    :param max_delay: maximum seconds that an event waits for its batch
+    :param timeout: maximum seconds of a batch delivered after ``max_delay``
+
+    Basic usage.
+
+    >>> async def print_batch(events):
+    ...     print(events)
+    >>> subscriber = BatchSubscriber(print_batch, max_size=2, max_delay=1, timeout=1)
+    >>> async def main():
+    ...     await subscriber("a")
+    ...     await subscriber("b")
+    >>> asyncio.run(main())
+    ['a', 'b']
+    """
+
+    def __init__(
+        self, fn: Callable, max_size: int, max_delay: float, timeout: float
+    ) -> None:
+        if max_size < 1:
+            raise ValueError(f"max_size must be at least 1, got {max_size}")
+        self.fn = fn
+        self.max_size = max_size
+        self.max_delay = max_delay
+        self.timeout = timeout
+        self.__name__ = fn.__name__
+        self._batch: List[Event] = []
+        self._timer = None
+        self._tasks: Set[asyncio.Task] = set()
+
+    async def __call__(self, event: Event) -> None:
+        """Adds the event to the current batch and delivers it if it is full.
+
+        :param event: standard event inherited from Event class
+        """
+        self._batch.append(event)
+        if len(self._batch) >= self.max_size:
+            await self.flush()
+        elif self._timer is None:
+            self._timer = asyncio.get_running_loop().call_later(
+                self.max_delay, self._flush_later
+            )
+
+    async def flush(self) -> None:
+        """Delivers the current batch, if any."""
+        if self._timer is not None:
+            self._timer.cancel()
+            self._timer = None
+        batch, self._batch = self._batch, []
+        if batch:
+            await self.fn(batch)
+
+    async def close(self) -> None:
+        """Delivers the pending events and waits for the batches being delivered."""
+        await self._safe_flush()
+        if self._tasks:
+            await asyncio.gather(*self._tasks, return_exceptions=True)
+
+    def _flush_later(self) -> None:
+        """Delivers the current batch in a new task once its delay has expired."""
+        self._timer = None
+        task = asyncio.create_task(self._safe_flush(), name=self.__name__)
+        self._tasks.add(task)
+        task.add_done_callback(self._tasks.discard)
+
+    async def _safe_flush(self) -> None:
+        """Delivers the current batch capturing and logging any error."""
+        try:
+            await asyncio.wait_for(self.flush(), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            logger.error(
+                f"exceeded max computation time of {self.timeout}s "
+                f"for a batch of `{self.__name__}`"
+            )
+        except Exception as e:
+            logger.error(
+                f"error captured in `{self.__name__}` after a batch "
+                f"- {e.__class__.__name__}: {e}"
+            )
+
+
+class ExecutorSubscriber:
+    """Subscriber that runs a regular function in an executor.
+
+    The event loop keeps running while the function runs in another thread or
+    process, and at most ``max_concurrency`` calls of the function run at the same
+    time. A call that times out keeps its slot until it really finishes.
+
+    :param fn: regular function that is going to be called with the event
+    :param get_executor: callable that returns the executor where ``fn`` runs
+    :param max_concurrency: maximum number of concurrent calls of the function
+
+    Basic usage.
+
+    >>> from concurrent.futures import ThreadPoolExecutor
+    >>> executor = ThreadPoolExecutor()
+    >>> subscriber = ExecutorSubscriber(print, lambda: executor)
+    >>> asyncio.run(subscriber("event"))
+    event
+    >>> executor.shutdown()
+    """
+
+    def __init__(
+        self,
+        fn: Callable,
+        get_executor: Callable[[], Executor],
+        max_concurrency: int = 1,
+    ) -> None:
+        if max_concurrency < 1:
+            raise ValueError(
+                f"max_concurrency must be at least 1, got {max_concurrency}"
+            )
+        self.fn = fn
+        self.max_concurrency = max_concurrency
+        self.__name__ = fn.__name__
+        self.__qualname__ = getattr(fn, "__qualname__", fn.__name__)
+        self._get_executor = get_executor
+        self._semaphore = None
+
+    async def __call__(self, event: Event) -> None:
+        """Runs the function with the event in the executor.
+
+        :param event: standard event inherited from Event class
+        """
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        semaphore = self._semaphore
+        await semaphore.acquire()
+        try:
+            future = self._get_executor().submit(self.fn, event)
+        except BaseException:
+            semaphore.release()
+            raise
+        loop = asyncio.get_running_loop()
+
+        def release(_: Future) -> None:
+            if not loop.is_closed():
+                loop.call_soon_threadsafe(semaphore.release)
+
+        future.add_done_callback(release)
+        await asyncio.wrap_future(future)
+
+    async def close(self) -> None:
+        """Forgets the concurrency limit bound to the current event loop."""
+        self._semaphore = None
+
+
+class LimitedSubscriber:
+    """Subscriber with its own timeout and limit of concurrent calls.
+
+    A call that exceeds the timeout is cancelled and counted in the stats, without
+    holding up the other subscribers of the event.
+
+    :param fn: async function that is going to be called with the event
+    :param get_stats: callable that returns the stats where timeouts are counted
+    :param timeout: maximum seconds of a call (None is unlimited)
+    :param max_concurrency: maximum number of concurrent calls (None is unlimited)
+
+    Basic usage.
+
+    >>> async def wait(event):
+    ...     await asyncio.sleep(event)
+    >>> stats = EventHandlerStats()
+    >>> subscriber = LimitedSubscriber(wait, lambda: stats, timeout=0.01)
+    >>> asyncio.run(subscriber(1))
+    >>> stats.subscriber_timeouts["wait"]
+    1
+    """
+
+    def __init__(
+        self,
+        fn: Callable,
+        get_stats: Callable[[], EventHandlerStats],
+        timeout: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+    ) -> None:
+        if max_concurrency is not None and max_concurrency < 1:
+            raise ValueError(
+                f"max_concurrency must be at least 1, got {max_concurrency}"
+            )
+        self.fn = fn
+        self.timeout = timeout
+        self.max_concurrency = max_concurrency
+        self.__name__ = fn.__name__
+        self.__qualname__ = getattr(fn, "__qualname__", fn.__name__)
+        self._get_stats = get_stats
+        self._semaphore = None
+
+    async def __call__(self, event: Event) -> None:
+        """Calls the function with the event within the limits.
+
+        :param event: standard event inherited from Event class
+        """
+        if self.max_concurrency is None:
+            await self._call(event)
+            return
+        if self._semaphore is None:
+            self._semaphore = asyncio.Semaphore(self.max_concurrency)
+        async with self._semaphore:
+            await self._call(event)
+
+    async def close(self) -> None:
+        """Forgets the concurrency limit bound to the current event loop."""
+        self._semaphore = None
+
+    async def _call(self, event: Event) -> None:
+        """Calls the function with the event and its timeout."""
+        try:
+            await asyncio.wait_for(self.fn(event), timeout=self.timeout)
+        except asyncio.TimeoutError:
+            self._get_stats().subscriber_timeouts[self.__qualname__] += 1
+            logger.error(
+                f"exceeded max computation time of {self.timeout}s "
+                f"in `{self.__name__}` for `{event}`"
+            )
+
+
+class IsolatedSubscriber(LimitedSubscriber):
+    """Subscriber that runs apart from the workers of the handler.
+
+    Events are queued in the subscriber's own buffer and processed by its own
+    ``max_concurrency`` tasks, so a slow function never holds a shared worker. When
+    its buffer is full the oldest event is discarded. Errors are captured, logged
+    and counted in the stats as well as the time of each call.
+
+    :param fn: async function that is going to be called with the event
+    :param get_stats: callable that returns the stats of the handler
+    :param timeout: maximum seconds of a call (None is unlimited)
+    :param max_concurrency: number of tasks that call the function
+    :param maxsize: maximum number of events waiting in its buffer
+    :param close_timeout: maximum seconds that :meth:`close` waits for the queued
+        events (None is unlimited)
+
+    Basic usage.
+
+    >>> stats = EventHandlerStats()
+    >>> async def show(event):
+    ...     print(event)
+    >>> subscriber = IsolatedSubscriber(show, lambda: stats, maxsize=10)
+    >>> async def main():
+    ...     await subscriber("a")
+    ...     await subscriber("b")
+    ...     await subscriber.close()
+    >>> asyncio.run(main())
+    a
+    b
+    >>> stats.isolated["show"].count
+    2
+    """
+
+    def __init__(
+        self,
+        fn: Callable,
+        get_stats: Callable[[], EventHandlerStats],
+        timeout: Optional[float] = None,
+        max_concurrency: Optional[int] = None,
+        maxsize: int = 0,
+        close_timeout: Optional[float] = None,
+    ) -> None:
+        super().__init__(fn, get_stats, timeout, max_concurrency)
+        self.maxsize = maxsize
+        self.close_timeout = close_timeout
+        self._queue: Optional[asyncio.Queue] = None
+        self._lanes: List[asyncio.Task] = []
+
+    async def __call__(self, event: Event) -> None:
+        """Queues the event to be processed apart from the workers.
+
+        :param event: standard event inherited from Event class
+        """
+        if self._queue is None:
+            self._queue = asyncio.Queue(self.maxsize)
+            self._lanes = [
+                asyncio.create_task(self._lane(), name=self.__name__)
+                for _ in range(self.max_concurrency or 1)
+            ]
+        if self._queue.full():
+            discarded = self._queue.get_nowait()
+            self._queue.task_done()
+            self._get_stats().discarded[DiscardReason.SUBSCRIBER_BUSY] += 1
+            logger.error(
+                f"event `{discarded}` was discarded -> `{self.__name__}` is busy"
+            )
+        self._queue.put_nowait(event)
+
+    async def close(self) -> None:
+        """Waits for the queued events and stops the tasks of the subscriber.
+
+        The events still queued after ``close_timeout`` are discarded.
+        """
+        if self._queue is None:
+            return
+        try:
+            await asyncio.wait_for(self._queue.join(), self.close_timeout)
+        except asyncio.TimeoutError:
+            # the events being processed are cancelled with the tasks
+            left = self._queue._unfinished_tasks
+            self._get_stats().discarded[DiscardReason.STOPPING] += left
+            logger.error(
+                f"{left} events were discarded -> `{self.__name__}` did not finish "
+                f"them in {self.close_timeout}s"
+            )
+        for lane in self._lanes:
+            lane.cancel()
+        await asyncio.gather(*self._lanes, return_exceptions=True)
+        self._queue = None
+        self._lanes = []
+
+    async def _lane(self) -> None:
+        """Calls the function with the queued events."""
+        queue = self._queue
+        while True:
+            event = await queue.get()
+            start = time.perf_counter()
+            try:
+                await self._call(event)
+            except Exception as e:
+                self._get_stats().exceptions += 1
+                logger.error(
+                    f"error captured in `{self.__name__}` after `{event}` "
+                    f"- {e.__class__.__name__}: {e}"
+                )
+            finally:
+                elapsed = time.perf_counter() - start
+                self._get_stats().isolated[self.__qualname__].record(elapsed)
+                queue.task_done()
@@ -0,0 +1,39 @@
+"""Module with the lazy attributes of the packages.
+
+Importing a package should be cheap, so the attributes that pull heavy
+dependencies or whole subsystems are only imported the first time they are used.
+"""
+import importlib
+import sys
+from typing import Any
+from typing import Callable
+from typing import Dict
+
+
+def lazy_attributes(package: str, attributes: Dict[str, str]) -> Callable[[str], Any]:
+    """Returns the module ``__getattr__`` of a package with lazy attributes.
+
+    An attribute is imported from its module the first time it is used, and then
+    it is kept in the package as if it had been imported there.
+
+    :param package: name of the package
+    :param attributes: module of each attribute, relative to the package
+
+    Basic usage.
+
+    >>> __getattr__ = lazy_attributes("iot_firmware", {"Controller": ".controller"})
+    >>> __getattr__("Controller").__name__
+    'Controller'
+    """
+    namespace = sys.modules[package].__dict__
+
+    def __getattr__(name: str) -> Any:
+        module = attributes.get(name)
+        if module is None:
+            raise AttributeError(f"module {package!r} has no attribute {name!r}")
+        value = namespace[name] = getattr(
+            importlib.import_module(module, package), name
+        )
+        return value
+
+    return __getattr__
@@ -1,14 +1,38 @@
+from contextvars import ContextVar
+from typing import Any
 from typing import Dict
+from typing import Optional
+from typing import Union
+
+from .config import load_config
+from .config import PathLike
+from .config import validate_config
 
 device_id = 0
 
+# device of a gateway whose code is running (see iot_firmware.device)
+current_device: ContextVar[Any] = ContextVar("current_device", default=None)
+
+
+def read_config(config: Optional[Union[Dict, PathLike]]) -> Dict:
+    """Reads and validates the configuration of the firmware.
 
-def read_config(config: Dict):
+    :param config: configuration, or path of its JSON file
+    """
     global device_id
-    device_id = 0
+    if config is None:
+        config = {}
+    elif isinstance(config, dict):
+        config = validate_config(config)
+    else:
+        config = load_config(config)
+    device_id = config.get("device_id", 0)
     return config
 
 
 def get_device_id():
     global device_id
+    device = current_device.get()
+    if device is not None:
+        return device.device_id
     return device_id
@@ -0,0 +1,4 @@
+"""Module with the version of the installed package."""
+from importlib.metadata import version
+
+__version__ = version("iot_firmware")
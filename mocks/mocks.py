@@ -1,4 +1,5 @@
 import asyncio
+import time
 from typing import Any
 
 from iot_firmware.event import Event
@@ -23,3 +24,8 @@ class MockObject:
     async def mock_function(self, event: MockEvent) -> Any:
         await asyncio.sleep(0.1)
         event.data += 1
+
+
+def mock_sync_function(event: MockEvent) -> int:
+    time.sleep(0.1)
+    return sum(range(event.data))
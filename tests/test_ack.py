@@ -0,0 +1,226 @@
+import asyncio
+import logging
+
+import pytest
+
+from iot_firmware.communications import CommunicationsHandler
+from iot_firmware.communications.ack import AckTracker
+from iot_firmware.communications.ack import TimerWheel
+from iot_firmware.communications.codec import MessageCodec
+from iot_firmware.communications.schema import Message
+from iot_firmware.communications.uplink import read_frame
+from iot_firmware.enums import MessageType
+
+CODEC = MessageCodec()
+
+
+def _message(msg_id, type=MessageType.READING, data=0):
+    return Message.load({"type": type, "data": data, "msg_id": msg_id})
+
+
+def test_timer_wheel():
+    wheel = TimerWheel(tick_seconds=0.5, num_slots=2)
+    wheel.schedule("a", 0)
+    wheel.schedule("b", 1.2)
+    wheel.schedule("c", 2)
+    assert len(wheel) == 3
+    assert wheel.cancel("c")
+    assert not wheel.cancel("c")
+    wheel.schedule("a", 1)
+    assert [wheel.advance() for _ in range(3)] == [[], ["a"], ["b"]]
+    assert len(wheel) == 0
+
+
+@pytest.mark.asyncio
+async def test_ack_tracker_retransmissions(caplog):
+    caplog.set_level(logging.WARNING, logger="iot_firmware")
+    sent = []
+    expired = []
+
+    async def send(message):
+        sent.append((message.msg_id, asyncio.get_running_loop().time()))
+
+    tracker = AckTracker(
+        send,
+        timeout_seconds=0.01,
+        max_retries=2,
+        tick_seconds=0.005,
+        on_expired=expired.append,
+    )
+    message = _message(1)
+    start = asyncio.get_running_loop().time()
+    tracker.track(message)
+    tracker.track(_message(2))
+    tracker.ack([2])
+    await asyncio.sleep(0.15)
+    assert [msg_id for msg_id, _ in sent] == [1, 1]
+    assert sent[1][1] - sent[0][1] >= 0.02 > sent[0][1] - start
+    assert expired == [message]
+    assert "message 1 was not acknowledged" in caplog.text
+    assert tracker.stats() == {
+        "in_flight": 0,
+        "window_size": 1024,
+        "acked": 1,
+        "retransmissions": 2,
+        "expired": 1,
+        "unknown": 0,
+    }
+    assert tracker._timer is None
+
+    tracker = AckTracker(send, timeout_seconds=0.01, max_retries=0, tick_seconds=0.01)
+    tracker.track(message)
+    await asyncio.sleep(0.05)
+    assert tracker.stats()["expired"] == 1
+
+
+@pytest.mark.asyncio
+async def test_ack_tracker_acks():
+    async def send(message):
+        pass
+
+    tracker = AckTracker(send, window_size=1)
+    for msg_id in (5, 3, 9, 7):
+        tracker.track(_message(msg_id))
+    tracker.track(_message(3))
+    assert len(tracker) == 4
+    assert tracker.ack(6) == 2
+    assert tracker.ack({"cumulative": 6}) == 0
+    assert tracker.ack({"selective": [9, 10]}) == 1
+    assert tracker.stats()["unknown"] == 1
+    assert tracker._ids == [7, 9]
+    assert tracker.ack([7]) == 1
+    assert tracker._ids == []
+    assert tracker.ack({"cumulative": 7, "selective": []}) == 0
+    assert len(tracker) == 0
+    with pytest.raises(ValueError):
+        tracker.ack("7")
+    with pytest.raises(ValueError):
+        AckTracker(send, window_size=0)
+    await tracker.close()
+
+
+@pytest.mark.asyncio
+async def test_ack_tracker_window():
+    async def send(message):
+        pass
+
+    tracker = AckTracker(send, window_size=2)
+    tracker.track(_message(1))
+    await tracker.wait_for_room()
+    tracker.track(_message(2))
+    waiter = asyncio.create_task(tracker.wait_for_room())
+    await asyncio.sleep(0.01)
+    assert not waiter.done()
+    tracker.ack(1)
+    await asyncio.wait_for(waiter, 1)
+
+    tasks = len(asyncio.all_tasks())
+    tracker = AckTracker(send, window_size=5000)
+    for msg_id in range(5000):
+        tracker.track(_message(msg_id))
+    assert len(asyncio.all_tasks()) == tasks
+    assert tracker.ack(4999) == 5000
+    await tracker.close()
+
+
+@pytest.mark.asyncio
+async def test_ack_tracker_retransmission_error(caplog):
+    caplog.set_level(logging.ERROR, logger="iot_firmware")
+
+    async def send(message):
+        await asyncio.sleep(0.05)
+        raise ConnectionError("link down")
+
+    tracker = AckTracker(send, timeout_seconds=0.01, tick_seconds=0.01)
+    tracker.track(_message(1))
+    await asyncio.sleep(0.015)
+    await tracker.close()
+    assert "retransmission failed - ConnectionError: link down" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_ack_tracker_pause_and_close(caplog):
+    caplog.set_level(logging.WARNING, logger="iot_firmware")
+    sent = []
+    expired = []
+
+    async def send(message):
+        sent.append(message.msg_id)
+
+    tracker = AckTracker(
+        send, timeout_seconds=0.01, tick_seconds=0.005, on_expired=expired.append
+    )
+    tracker.pause()
+    first, second = _message(1), _message(2)
+    tracker.track(first)
+    tracker.track(second)
+    await asyncio.sleep(0.05)
+    assert sent == []
+    tracker.resume()
+    tracker.resume()
+    await asyncio.sleep(0.03)
+    assert sent[:2] == [1, 2]
+    tracker.ack(1)
+    await tracker.close()
+    assert expired == [second]
+    assert len(tracker) == 0
+    assert tracker.stats()["expired"] == 0
+    assert "1 messages were not acknowledged" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_communications_handler_acks_offline(tmp_path):
+    frames = []
+
+    async def transport(frame):
+        frames.append([message.msg_id for message in read_frame(frame, CODEC)])
+
+    handler = CommunicationsHandler(
+        transport=transport,
+        max_delay_seconds=0.005,
+        store_path=str(tmp_path),
+        ack_window=2,
+        ack_timeout_seconds=0.01,
+    )
+    await handler.send(_message(1))
+    await asyncio.sleep(0.005)
+    handler.disconnect()
+    await asyncio.sleep(0.05)
+    assert frames == [[1]]
+    assert 1 not in handler.store
+    await handler.close()
+    assert 1 in handler.store
+
+
+@pytest.mark.asyncio
+async def test_communications_handler_acks(tmp_path):
+    frames = []
+
+    async def transport(frame):
+        frames.append([message.msg_id for message in read_frame(frame, CODEC)])
+
+    with pytest.raises(ValueError):
+        CommunicationsHandler(ack_window=10)
+    handler = CommunicationsHandler(transport=transport)
+    assert handler.acknowledge(_message(1, MessageType.ACK)) == 0
+
+    handler = CommunicationsHandler(
+        transport=transport,
+        max_delay_seconds=0.005,
+        store_path=str(tmp_path),
+        ack_window=2,
+        ack_timeout_seconds=0.02,
+        ack_max_retries=1,
+    )
+    await handler.send(_message(1))
+    await handler.send(_message(2))
+    await handler.send(_message(3, MessageType.ACK))
+    with pytest.raises(ValueError):
+        handler.acknowledge(_message(4))
+    assert handler.acknowledge(_message(5, MessageType.ACK, data=1)) == 1
+    await asyncio.sleep(0.35)
+    assert frames[0] == [1, 2, 3]
+    assert [2] in frames[1:]
+    assert handler.stats()["acks"]["expired"] == 1
+    assert 2 in handler.store
+    await handler.close()
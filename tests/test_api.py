@@ -1,8 +1,16 @@
+from dataclasses import dataclass
+from dataclasses import field
+from typing import List
+
+import marshmallow_dataclass
 import pytest
+from marshmallow import validate
 from marshmallow import ValidationError
 
 from iot_firmware.communications.schema import API_VERSION
 from iot_firmware.communications.schema import Message
+from iot_firmware.communications.schema import Version
+from iot_firmware.communications.validator import Loader
 from iot_firmware.enums import MessageKey
 from iot_firmware.enums import MessageType
 
@@ -20,3 +28,142 @@ def test_missing_type():
 def test_missing_data():
     with pytest.raises(ValidationError, match=MessageKey.DATA):
         Message.load({MessageKey.TYPE: MessageType.READING})
+
+
+def test_schema_is_cached():
+    assert Message.schema() is Message.schema()
+    assert Message.schema(Version(1, 0, 0)) is not Message.schema()
+
+
+def test_load_message_with_api_version():
+    api_version = Version(1, 2, 3)
+    data = {MessageKey.TYPE: MessageType.READING, MessageKey.DATA: {}}
+    assert Message.load(data, api_version).api_version == api_version
+    assert Message.load(data).api_version == API_VERSION
+
+
+def test_load_many_collects_errors():
+    messages = [
+        {MessageKey.TYPE: MessageType.READING, MessageKey.DATA: i} for i in range(5)
+    ]
+    messages.insert(2, {MessageKey.DATA: {}})
+    messages.append({MessageKey.TYPE: "unknown", MessageKey.DATA: {}})
+
+    result = Message.load_many(messages)
+
+    assert [message.data for message in result.messages] == list(range(5))
+    assert list(result.errors) == [2, 6]
+    assert MessageKey.TYPE in result.errors[2]
+    assert MessageKey.TYPE in result.errors[6]
+
+
+def test_iter_load_is_lazy():
+    def messages():
+        yield {MessageKey.TYPE: MessageType.READING, MessageKey.DATA: 1}
+        raise AssertionError("should not be consumed")
+
+    iterator = Message.iter_load(messages())
+    assert next(iterator).data == 1
+
+
+VALID_MESSAGES = [
+    {MessageKey.TYPE: MessageType.READING, MessageKey.DATA: {"temp": 24.3}},
+    {
+        "type": "event",
+        "data": None,
+        "id": 3,
+        "timestamp": 10,
+        "api_version": {"major": 1, "minor": 2, "patch": 3},
+        "msg_id": 7,
+    },
+]
+
+INVALID_MESSAGES = [
+    [],
+    {"data": {}},
+    {"type": "unknown", "data": {}},
+    {"type": 1, "data": {}},
+    {"type": "ack", "data": {}, "id": -1},
+    {"type": "ack", "data": {}, "id": True},
+    {"type": "ack", "data": {}, "id": None},
+    {"type": "ack", "data": {}, "timestamp": float("nan")},
+    {"type": "ack", "data": {}, "timestamp": 10**400},
+    {"type": "ack", "data": {}, "api_version": {"major": "1", "minor": 0, "patch": 0}},
+    {"type": "ack", "data": {}, "extra": 1},
+]
+
+
+@pytest.mark.parametrize("data", VALID_MESSAGES)
+def test_loader_same_message(data):
+    data = {"id": 1, "timestamp": 1.5, "msg_id": 1, **data}
+    assert Message.loader().compiled
+    message, expected = Message.load(data), Message.schema().load(data)
+    assert message == expected
+    for name in ("type", "data", "id", "timestamp", "api_version", "msg_id"):
+        assert type(getattr(message, name)) is type(getattr(expected, name))
+
+
+@pytest.mark.parametrize("data", INVALID_MESSAGES)
+def test_loader_same_errors(data):
+    with pytest.raises(ValidationError) as expected:
+        Message.schema().load(data)
+    with pytest.raises(ValidationError) as loaded:
+        Message.load(data)
+    assert loaded.value.messages == expected.value.messages
+
+
+@dataclass
+class _ListField:
+    values: List[int] = field()
+
+
+@dataclass
+class _UnhashableChoices:
+    choice: str = field(metadata={"validate": validate.OneOf([[]])})
+
+
+@dataclass
+class _UnknownValidator:
+    value: int = field(metadata={"validate": validate.Length(min=1)})
+
+
+@dataclass
+class _DataKey:
+    value: int = field(metadata={"data_key": "v"})
+
+
+@pytest.mark.parametrize(
+    "clazz", [_ListField, _UnhashableChoices, _UnknownValidator, _DataKey]
+)
+def test_loader_unsupported_schema(clazz):
+    loader = Loader(clazz, marshmallow_dataclass.class_schema(clazz)())
+    assert not loader.compiled
+
+
+def test_loader_unsupported_schema_options():
+    loader = Loader(Message, type(Message.schema())(partial=True))
+    assert not loader.compiled
+
+
+@pytest.mark.parametrize("extra", [{"timestamp": "12.5"}, {"id": 5.0}])
+def test_loader_fallback_values(extra):
+    data = {"type": "ack", "data": {}, "id": 1, "timestamp": 1.5, "msg_id": 1, **extra}
+    assert Message.load(data) == Message.schema().load(data)
+
+
+def test_loader_range_bounds():
+    @dataclass
+    class Bounded:
+        value: float = field(
+            metadata={"validate": validate.Range(0, 1, min_inclusive=False)}
+        )
+        count: int = field(
+            default=0, metadata={"validate": validate.Range(max=1, max_inclusive=False)}
+        )
+
+    loader = Loader(Bounded, marshmallow_dataclass.class_schema(Bounded)())
+    assert loader.compiled
+    assert loader({"value": 0.5}) == Bounded(0.5)
+    for data in [{"value": 0}, {"value": 2}, {"value": 0.5, "count": 1}]:
+        with pytest.raises(ValidationError):
+            loader(data)
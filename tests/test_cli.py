@@ -1,7 +1,14 @@
+import json
+import subprocess
+import sys
+
 import pytest
 
+import iot_firmware
 from iot_firmware import __version__
 from iot_firmware.cli import cli
+from iot_firmware.event.bench import compare
+from iot_firmware.event.bench import percentiles
 
 
 def test_version(capsys):
@@ -9,3 +16,113 @@ def test_version(capsys):
         cli(["-v"])
     out, _ = capsys.readouterr()
     assert out == f"iot-firmware {__version__}\n"
+
+
+def test_lightweight_import():
+    # a fresh interpreter, since the test session already loaded everything
+    code = (
+        "import sys, iot_firmware.cli; "
+        "print(sorted({'asyncio', 'marshmallow', 'uvloop'} & set(sys.modules)))"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout == "[]\n"
+
+
+def test_lazy_attributes():
+    from iot_firmware.controller import Controller
+    from iot_firmware.event import EventSystem
+    from iot_firmware.event.handler import EventHandler
+
+    assert iot_firmware.Controller is Controller
+    assert isinstance(EventSystem, EventHandler)
+    with pytest.raises(AttributeError, match="has no attribute 'Missing'"):
+        iot_firmware.Missing
+
+
+def test_run_with_config(tmp_path, monkeypatch):
+    from iot_firmware.controller import Controller
+
+    started = []
+    monkeypatch.setattr(Controller, "start", lambda self: started.append(self))
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"devices": [1]}))
+    assert cli(["-c", str(path)]) == 0
+    assert len(started[0].gateway) == 1
+
+    path.write_text(json.dumps({"devices": 1}))
+    with pytest.raises(SystemExit):
+        cli(["-c", str(path)])
+    with pytest.raises(SystemExit):
+        cli(["-c", str(tmp_path / "missing.json")])
+    assert cli([]) is None
+
+
+def test_bench(capsys, tmp_path):
+    baseline = tmp_path / "baseline.json"
+    assert cli(["bench", "-n", "50", "-w", "1", "2", "-o", str(baseline)]) == 0
+    results = json.loads(baseline.read_text())
+    assert [result["profile"]["num_workers"] for result in results] == [1, 2]
+    assert all(result["processed"] == 50 for result in results)
+
+    assert cli(["bench", "-n", "50", "-r", "20000", "--seed", "1"]) == 0
+    out, _ = capsys.readouterr()
+    assert json.loads(out)[0]["profile"]["rate"] == 20000
+
+    trace = tmp_path / "trace.txt"
+    trace.write_text("1.0\n1.001\n1.002\n")
+    assert cli(["bench", "--trace", str(trace), "-d", "0.001"]) == 0
+    out, _ = capsys.readouterr()
+    (result,) = json.loads(out)
+    assert result["published"] == 3
+    assert set(result["latency"]) >= {"p50", "p99", "p999"}
+
+    trace.write_text("\n")
+    with pytest.raises(SystemExit, match="does not have any publish time"):
+        cli(["bench", "--trace", str(trace)])
+    trace.write_text("1.0\nnow\n")
+    with pytest.raises(SystemExit, match="invalid trace"):
+        cli(["bench", "--trace", str(trace)])
+
+
+def test_bench_compare(capsys, tmp_path):
+    result = {
+        "profile": {"num_workers": 1},
+        "events_per_second": 1000,
+        "latency": {"p50": 0.001, "p99": 0.002, "p999": 0.004},
+    }
+    baseline = tmp_path / "baseline.json"
+    baseline.write_text(json.dumps([result]))
+    current = tmp_path / "current.json"
+    current.write_text(json.dumps([dict(result, events_per_second=950)]))
+    assert cli(["bench", "--compare", str(baseline), str(current)]) == 0
+    current.write_text(json.dumps([dict(result, events_per_second=500)]))
+    assert cli(["bench", "--compare", str(baseline), str(current)]) == 1
+    out, _ = capsys.readouterr()
+    assert '"0.events_per_second"' in out
+
+    with pytest.raises(SystemExit):
+        cli(["bench", "--compare", "a", "b", "c"])
+
+
+def test_bench_compare_with_baseline(capsys, tmp_path):
+    baseline = tmp_path / "baseline.json"
+    cli(["bench", "-n", "20", "-w", "1", "-o", str(baseline)])
+    assert cli(["bench", "-n", "20", "-w", "1", "--compare", str(baseline)]) in (0, 1)
+    out, _ = capsys.readouterr()
+    assert json.loads(out)["threshold"] == 0.1
+
+
+def test_bench_compare_errors():
+    result = {"profile": {"rate": 0}, "events_per_second": 0, "latency": {}}
+    with pytest.raises(ValueError):
+        compare([result], [])
+    with pytest.raises(ValueError):
+        compare([result], [dict(result, profile={"rate": 1})])
+    result["latency"] = {"p50": 0, "p99": 0, "p999": 0}
+    assert compare([result], [result])["regressions"] == []
+
+
+def test_percentiles_without_values():
+    assert percentiles([])["p999"] == 0.0
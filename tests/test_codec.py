@@ -0,0 +1,179 @@
+import struct
+
+import pytest
+
+from iot_firmware.communications.codec import CodecError
+from iot_firmware.communications.codec import decode_data
+from iot_firmware.communications.codec import encode_data
+from iot_firmware.communications.codec import HEADER
+from iot_firmware.communications.codec import MessageCodec
+from iot_firmware.communications.schema import Message
+from iot_firmware.communications.schema import Version
+from iot_firmware.enums import MessageKey
+from iot_firmware.enums import MessageType
+
+MESSAGES = [
+    {MessageKey.TYPE: MessageType.READING, MessageKey.DATA: {"temp": 24.3}},
+    {MessageKey.TYPE: MessageType.EVENT, MessageKey.DATA: None, MessageKey.ID: 7},
+    {
+        MessageKey.TYPE: MessageType.COMMAND,
+        MessageKey.DATA: {"reboot": True, "delay": -300, "args": [1, "á", b"\x00"]},
+        MessageKey.MSG_ID: 2**40,
+    },
+    {
+        MessageKey.TYPE: MessageType.ACK,
+        MessageKey.DATA: [0, 127, 128, -1, 2**70, -(2**70), 1.5, False, {}],
+        "api_version": {"major": 0, "minor": 3, "patch": 1},
+    },
+]
+
+
+@pytest.mark.parametrize("data", MESSAGES)
+def test_round_trip_matches_dict_path(data):
+    codec = MessageCodec()
+    message = Message.load(data)
+    decoded = codec.decode(codec.encode(message))
+    assert decoded == message
+    assert type(decoded.type) is type(message.type) is str
+
+    automatic = {"id": message.id, "timestamp": message.timestamp, "msg_id": 0}
+    message = Message.load({**data, **automatic})
+    assert codec.decode(codec.encode(message)) == message
+
+
+def test_encode_into_many_messages():
+    codec = MessageCodec()
+    messages = [Message.load(data) for data in MESSAGES]
+    buffer = bytearray()
+    sizes = [codec.encode_into(message, buffer) for message in messages]
+    assert sum(sizes) == len(buffer)
+
+    view = memoryview(buffer)
+    offset = 0
+    for message in messages:
+        decoded, offset = codec.decode_from(view, offset)
+        assert decoded == message
+    assert offset == len(buffer)
+
+
+def test_encode_is_compact():
+    message = Message.load(MESSAGES[0])
+    assert len(MessageCodec().encode(message)) == HEADER.size + 17
+
+
+def test_encode_invalid_message():
+    codec = MessageCodec()
+    buffer = bytearray(b"abc")
+    message = Message.load(MESSAGES[0])
+    message.id = -1
+    with pytest.raises(ValueError):
+        codec.encode_into(message, buffer)
+    assert buffer == b"abc"
+
+
+def test_encode_invalid_data():
+    with pytest.raises(TypeError):
+        encode_data({1, 2}, bytearray())
+
+    buffer = bytearray()
+    message = Message.load({MessageKey.TYPE: MessageType.READING, MessageKey.DATA: {}})
+    message.data = {1, 2}
+    with pytest.raises(TypeError):
+        MessageCodec().encode_into(message, buffer)
+    assert buffer == b""
+
+
+def test_decode_unknown_tag():
+    with pytest.raises(CodecError):
+        decode_data(memoryview(b"\x7f"))
+
+
+def _header(**kwargs):
+    values = dict(
+        format_version=1,
+        type=0,
+        major=0,
+        minor=0,
+        patch=1,
+        id=0,
+        timestamp=0.0,
+        msg_id=0,
+        size=1,
+    )
+    values.update(kwargs)
+    return HEADER.pack(*values.values())
+
+
+@pytest.mark.parametrize(
+    "buffer",
+    [
+        b"",
+        _header(format_version=2) + b"\x00",
+        _header(major=1) + b"\x00",
+        _header(type=200) + b"\x00",
+        _header(size=2) + b"\x00",
+        _header(size=2) + b"\x03\x80",
+        _header() + b"\x07\x01",
+        _header(size=2) + b"\x00\x00",
+        _header() + b"\x00\x00",
+        # truncated float, invalid utf-8 and unhashable dict key
+        _header(size=3) + b"\x04\x00\x00",
+        _header(size=3) + b"\x05\x01\xff",
+        _header(size=5) + b"\x08\x01\x07\x00\x80",
+        _header(size=3000) + b"\x07\x01" * 1500,
+    ],
+)
+def test_decode_invalid_buffer(buffer):
+    with pytest.raises(CodecError):
+        MessageCodec().decode(buffer)
+
+
+def test_decode_other_minor_version():
+    codec = MessageCodec(Version(0, 0, 1))
+    message = codec.decode(_header(minor=5) + b"\x00")
+    assert message.api_version == Version(0, 5, 1)
+    assert codec.decode(_header() + b"\x00").api_version is codec.api_version
+
+
+def test_lazy_message_decodes_data_on_access():
+    codec = MessageCodec()
+    message = Message.load(MESSAGES[2])
+    buffer = bytearray()
+    codec.encode_into(message, buffer)
+    codec.encode_into(message, buffer)
+
+    lazy, offset = codec.decode_lazy_from(buffer)
+    assert (lazy.type, lazy.msg_id) == (message.type, message.msg_id)
+    assert not lazy.decoded
+    assert "bytes>" in repr(lazy)
+    assert lazy.raw_data.obj is buffer
+
+    assert lazy.data == message.data
+    assert lazy.decoded
+    assert lazy.data is lazy.data
+    assert repr(message.data) in repr(lazy)
+    assert lazy.to_message() == message
+    assert codec.decode_from(buffer, offset)[0] == message
+
+
+def test_lazy_message_invalid_data_is_detected_on_access():
+    lazy = MessageCodec().decode_lazy(_header(size=2) + b"\x00\x00")
+    assert lazy.type == MessageType.READING
+    with pytest.raises(CodecError):
+        lazy.data
+
+
+def test_lazy_message_trailing_bytes():
+    with pytest.raises(CodecError):
+        MessageCodec().decode_lazy(_header() + b"\x00\x00")
+
+
+@pytest.mark.parametrize("access", [False, True])
+def test_forward_lazy_message(access):
+    codec = MessageCodec()
+    message = Message.load(MESSAGES[0])
+    lazy = codec.decode_lazy(codec.encode(message))
+    if access:
+        lazy.data["temp"] = 0
+        message.data["temp"] = 0
+    assert codec.decode(codec.encode(lazy)) == message
@@ -0,0 +1,61 @@
+import json
+
+import pytest
+from marshmallow import ValidationError
+
+from iot_firmware import config as config_module
+from iot_firmware import schema
+from iot_firmware.config import load_config
+from iot_firmware.config import merge_config
+from iot_firmware.config import validate_config
+from iot_firmware.schema import read_config
+
+
+def test_load_config_is_cached_by_content(tmp_path, monkeypatch):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"device_id": 3, "event_handler": {"num_workers": 2}}))
+    config = load_config(path)
+    assert config == {"device_id": 3, "event_handler": {"num_workers": 2}}
+
+    validations = []
+    monkeypatch.setattr(
+        config_module, "validate_config", lambda config: validations.append(config)
+    )
+    # the same content is not parsed nor validated again, even in another file
+    config["device_id"] = 4
+    copy = tmp_path / "copy.json"
+    copy.write_bytes(path.read_bytes())
+    assert load_config(str(copy))["device_id"] == 3
+    assert validations == []
+
+    path.write_text(json.dumps({"device_id": 5}))
+    load_config(path)
+    assert validations == [{"device_id": 5}]
+
+
+def test_validate_config():
+    assert validate_config({"event_handler": {"worker_timeout_seconds": 1}}) == {
+        "event_handler": {"worker_timeout_seconds": 1.0}
+    }
+    invalid = [
+        {"device_id": -1},
+        {"devices": [1, "2"]},
+        {"event_handler": {"num_workers": 0}},
+        {"event_handler": {"block_timeout_seconds": 0}},
+        {"event_handler": {"unknown": 1}},
+        {"event_handler": 1},
+    ]
+    for config in invalid:
+        with pytest.raises(ValidationError):
+            validate_config(config)
+    with pytest.raises(ValidationError):
+        merge_config({"event_handler": {"num_workers": 2}}, {"event_handler": 1})
+
+
+def test_read_config(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"device_id": 3}))
+    assert read_config(str(path)) == {"device_id": 3}
+    assert schema.get_device_id() == 3
+    assert read_config(None) == {}
+    assert schema.get_device_id() == 0
@@ -1,6 +1,14 @@
+import asyncio
+import json
+
 import pytest
+from marshmallow import ValidationError
 
 from iot_firmware import Controller
+from iot_firmware.communications.schema import Message
+from iot_firmware.enums import CommandType
+from iot_firmware.enums import MessageType
+from mocks.mocks import MockEvent
 
 
 @pytest.fixture(params=[{}, {"mock_config": "mock"}])
@@ -19,3 +27,52 @@ def test_firmware_run():
 def test_firmware_with_config(config):
     fw = Controller(config)
     assert fw.config == config
+
+
+def test_firmware_with_config_file(tmp_path):
+    path = tmp_path / "config.json"
+    path.write_text(json.dumps({"event_handler": {"num_workers": 3}}))
+    fw = Controller(str(path))
+    assert fw.event_handler.num_workers == 3
+    with pytest.raises(ValidationError):
+        Controller({"event_handler": {"num_workers": "3"}})
+
+
+@pytest.mark.asyncio
+async def test_firmware_config_command():
+    fw = Controller({"devices": [1, 2], "event_handler": {"num_workers": 2}})
+    processed = []
+
+    async def receive(event):
+        await asyncio.sleep(0.01)
+        processed.append(event.data)
+
+    fw.event_handler.subscribe(MockEvent, receive)
+    runner = asyncio.create_task(fw.event_handler.run())
+    await asyncio.sleep(0)
+    fw.event_handler.publish_many(MockEvent(data=i) for i in range(20))
+
+    def command(data):
+        return Message.load({"type": MessageType.COMMAND, "data": data})
+
+    update = {"event_handler": {"num_workers": 4, "buffer_maxsize": 5}}
+    fw.command(command({"command": CommandType.CONFIG, "data": update}))
+    assert fw.config["event_handler"] == {"num_workers": 4, "buffer_maxsize": 5}
+    assert fw.event_handler.stats()["workers"] == 4
+
+    fw.command(command({"command": "config", "data": {"devices": [2, 3]}}))
+    assert [device.device_id for device in fw.gateway] == [2, 3]
+    await fw.event_handler.stop()
+    await runner
+    assert sorted(processed) == list(range(20))
+
+    fw.command(command({"command": CommandType.REBOOT}))
+    with pytest.raises(ValueError):
+        fw.command(command({"command": "unknown"}))
+    with pytest.raises(ValueError):
+        fw.command(command(None))
+    with pytest.raises(ValueError):
+        fw.command(Message.load({"type": MessageType.READING, "data": 1}))
+    with pytest.raises(ValidationError):
+        fw.update_config({"devices": "1"})
+    assert fw.config["devices"] == [2, 3]
@@ -0,0 +1,224 @@
+import asyncio
+import logging
+
+import pytest
+
+from iot_firmware import Controller
+from iot_firmware.communications import CommunicationsHandler
+from iot_firmware.communications import schema
+from iot_firmware.communications.codec import MessageCodec
+from iot_firmware.communications.schema import Message
+from iot_firmware.communications.uplink import read_frame
+from iot_firmware.communications.utils import BlockCounter
+from iot_firmware.device import Gateway
+from iot_firmware.enums import MessageType
+from iot_firmware.event import EventHandler
+from iot_firmware.event.enum import PublishResult
+from mocks.mocks import MockEvent
+
+
+def _reading(data):
+    return Message.load({"type": MessageType.READING, "data": data})
+
+
+async def _run(gateway, *events):
+    """Publishes the events of each device and processes them."""
+    for device_id, event in events:
+        gateway[device_id].publish(event)
+    await asyncio.gather(gateway.event_handler.run(), gateway.event_handler.stop())
+
+
+@pytest.mark.asyncio
+async def test_gateway_routes_events_by_device():
+    gateway = Gateway(EventHandler(num_workers=2))
+    received = []
+
+    def receiver(name):
+        async def receive(event):
+            message = _reading(event.data)
+            received.append((name, event.device_id, message.id, message.msg_id))
+
+        return receive
+
+    first, second = gateway.add_device(1), gateway.add_device(2)
+    first.subscribe(MockEvent, receiver("first"))
+    second.subscribe(MockEvent, receiver("second"))
+    assert len(gateway.event_handler._subscribers[MockEvent.type.uuid]) == 1
+
+    await _run(
+        gateway, (1, MockEvent(data=0)), (2, MockEvent(data=1)), (1, MockEvent())
+    )
+    assert sorted((name, *ids) for name, *ids, _ in received) == [
+        ("first", 1, 1),
+        ("first", 1, 1),
+        ("second", 2, 2),
+    ]
+    # the devices share the msg_id of the process
+    assert len({msg_id for *_, msg_id in received}) == 3
+    assert gateway.stats()[1] == {
+        "device_id": 1,
+        "published": 2,
+        "processed": 2,
+        "discarded": 0,
+        "subscriptions": 1,
+    }
+    assert [device.device_id for device in gateway] == [1, 2]
+
+    # events without a device are not delivered to any of them
+    gateway.event_handler.publish(MockEvent())
+    await _run(gateway)
+    assert len(received) == 3
+
+
+@pytest.mark.asyncio
+async def test_gateway_publish():
+    gateway = Gateway()
+    device = gateway.add_device(1)
+    assert device.publish(MockEvent()) is PublishResult.DISCARDED
+    assert await device.publish_async(MockEvent()) is PublishResult.DISCARDED
+    assert device.publish("event") is PublishResult.DISCARDED
+    assert device.stats()["discarded"] == 2
+
+    async def receive(event):
+        pass
+
+    device.subscribe(MockEvent, receive)
+    assert await device.publish_async(MockEvent()) is PublishResult.PUBLISHED
+    assert await device.publish_async("event") is PublishResult.DISCARDED
+    assert device.stats()["published"] == 1
+
+    with pytest.raises(ValueError):
+        gateway.add_device(1)
+    with pytest.raises(TypeError):
+        device.subscribe(MockEvent, lambda event: None)
+
+
+@pytest.mark.asyncio
+async def test_gateway_subscriber_errors(caplog):
+    caplog.set_level(logging.ERROR, logger="iot_firmware")
+    gateway = Gateway()
+    device = gateway.add_device(1)
+    called = []
+
+    async def fail(event):
+        raise ValueError("first")
+
+    async def fail_again(event):
+        raise KeyError("second")
+
+    async def succeed(event):
+        called.append(event.data)
+
+    for fn in (fail, fail_again, succeed, succeed):
+        device.subscribe(MockEvent, fn)
+    await _run(gateway, (1, MockEvent(data=1)))
+    assert called == [1]
+    assert "ValueError: first" in caplog.text
+    assert "KeyError: 'second'" in caplog.text
+    assert gateway.event_handler.stats()["exceptions"] == 1
+
+    device.unsubscribe(MockEvent, fail)
+    device.unsubscribe(MockEvent, fail_again)
+    await _run(gateway, (1, MockEvent(data=2)))
+    assert called == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_gateway_concurrent_events_of_a_device():
+    gateway = Gateway(EventHandler(num_workers=4))
+    device = gateway.add_device(1)
+    received = []
+
+    async def receive(event):
+        # the first event finishes while the second one is still running
+        await asyncio.sleep(0.01 if event.data else 0.03)
+        received.append(_reading(event.data).id)
+
+    device.subscribe(MockEvent, receive)
+    await _run(gateway, (1, MockEvent(data=0)), (1, MockEvent(data=1)))
+    assert received == [1, 1]
+    assert gateway.event_handler.stats()["exceptions"] == 0
+
+    other = gateway.add_device(2)
+
+    async def nested():
+        with device:
+            await asyncio.sleep(0.01)
+            with other:
+                await asyncio.sleep(0)
+            return _reading(0).id
+
+    assert await asyncio.gather(nested(), nested()) == [1, 1]
+
+
+def test_gateway_unsubscribe(caplog):
+    caplog.set_level(logging.ERROR, logger="iot_firmware")
+    gateway = Gateway()
+    first, second = gateway.add_device(1), gateway.add_device(2)
+
+    async def receive(event):
+        pass
+
+    first.unsubscribe(MockEvent, receive)
+    assert "was never subscribed by device 1" in caplog.text
+
+    first.subscribe(MockEvent, receive)
+    second.subscribe(MockEvent, receive)
+    first.unsubscribe(MockEvent, receive)
+    assert first.stats()["subscriptions"] == 0
+    assert MockEvent.type.uuid in gateway.event_handler._subscribers
+
+    first.subscribe(MockEvent, receive)
+    gateway.remove_device(2)
+    assert first.stats()["subscriptions"] == 1
+    gateway.remove_device(1)
+    assert MockEvent.type.uuid not in gateway.event_handler._subscribers
+    assert len(gateway) == 0
+
+
+@pytest.mark.asyncio
+async def test_gateway_shared_uplink(tmp_path, monkeypatch):
+    monkeypatch.setattr(schema, "msg_id_counter", BlockCounter())
+    codec = MessageCodec()
+    frames = []
+
+    async def transport(frame):
+        frames.append([(m.id, m.msg_id) for m in read_frame(frame, codec)])
+
+    communications_handler = CommunicationsHandler(
+        transport=transport,
+        store_path=str(tmp_path / "store"),
+        msg_id_path=str(tmp_path / "msg_id"),
+        ack_window=10,
+    )
+    gateway = Gateway(communications_handler=communications_handler)
+    for device_id in (1, 2):
+        with gateway.add_device(device_id) as device:
+            await device.send(_reading(0))
+            await device.send(_reading(1))
+    await communications_handler.uplink.flush()
+    assert frames == [[(1, 2), (1, 3), (2, 4), (2, 5)]]
+    assert communications_handler.stats()["acks"]["in_flight"] == 4
+
+    # messages of different devices do not replace each other
+    communications_handler.disconnect()
+    for device in gateway:
+        with device:
+            await device.send(_reading(2))
+    assert len(communications_handler.store) == 2
+    ack = Message.load({"type": MessageType.ACK, "data": 5})
+    assert communications_handler.acknowledge(ack) == 4
+    await communications_handler.close()
+
+    # the msg_id continue after a restart
+    monkeypatch.setattr(schema, "msg_id_counter", BlockCounter())
+    CommunicationsHandler(msg_id_path=str(tmp_path / "msg_id"))
+    with Gateway().add_device(1):
+        assert _reading(0).msg_id > 7
+
+
+def test_controller_gateway():
+    controller = Controller({"devices": [1, 2]})
+    controller.add_device(3)
+    assert len(controller.gateway) == 3
+    assert controller.gateway.event_handler is controller.event_handler
@@ -1,5 +1,10 @@
 import asyncio
+import copy
+import logging
+import pickle
+import time
 import uuid
+from dataclasses import dataclass
 from typing import Any
 
 import pytest
@@ -7,8 +12,26 @@ import pytest
 from iot_firmware.event import Event
 from iot_firmware.event import EventHandler
 from iot_firmware.event import EventType
+from iot_firmware.event import handler
+from iot_firmware.event.buffer import FairEventBuffer
+from iot_firmware.event.buffer import PriorityEventBuffer
+from iot_firmware.event.coalescing import Coalescing
+from iot_firmware.event.enum import EventHandlerState
 from iot_firmware.event.enum import EventLevel
+from iot_firmware.event.enum import ExecutorType
+from iot_firmware.event.enum import OverflowPolicy
+from iot_firmware.event.enum import PublishResult
+from iot_firmware.event.handler import _Deadline
+from iot_firmware.event.handler import PoisonPill
+from iot_firmware.event.journal import EventJournal
+from iot_firmware.event.journal import RingFile
+from iot_firmware.event.scaling import Autoscale
+from iot_firmware.event.subscriber import BatchSubscriber
+from iot_firmware.event.subscriber import ExecutorSubscriber
+from iot_firmware.event.subscriber import IsolatedSubscriber
+from iot_firmware.event.subscriber import LimitedSubscriber
 from mocks.mocks import mock_function
+from mocks.mocks import mock_sync_function
 from mocks.mocks import MockEvent
 from mocks.mocks import MockEventType
 from mocks.mocks import MockObject
@@ -365,3 +388,1323 @@ async def test_event_handler_raise_error_in_function():
         await asyncio.wait_for(event_handler.run(), timeout=0.5)
     except asyncio.TimeoutError:
         pass
+
+
+def test_event_handler_dispatch_table():
+    event_handler = EventHandler()
+    event_handler.subscribe(MockEvent, mock_function)
+    assert event_handler._dispatch_table[MockEvent.type.uuid] == (mock_function,)
+
+    mock_object = MockObject()
+    event_handler.subscribe(MockEvent, mock_object.mock_function)
+    assert len(event_handler._dispatch_table[MockEvent.type.uuid]) == 2
+
+    event_handler.unsubscribe(MockEvent, mock_function)
+    event_handler.unsubscribe(MockEvent, mock_object.mock_function)
+    assert MockEvent.type.uuid not in event_handler._dispatch_table
+
+
+@pytest.mark.asyncio
+async def test_event_handler_single_function_timeout(caplog):
+    event_handler = EventHandler(num_workers=1, worker_timeout_seconds=0.1)
+
+    async def slow_function(event: MockEvent):
+        await asyncio.sleep(1)
+        event.data += 1
+
+    event_handler.subscribe(MockEvent, slow_function)
+    first_event, second_event = MockEvent(data=0), MockEvent(data=0)
+    event_handler.publish(first_event)
+    event_handler.publish(second_event)
+
+    try:
+        await asyncio.wait_for(event_handler.run(), timeout=0.5)
+    except asyncio.TimeoutError:
+        pass
+
+    assert first_event.data == second_event.data == 0
+    assert caplog.text.count("exceeded max computation time") == 2
+
+
+@pytest.mark.asyncio
+async def test_event_handler_raise_error_in_many_functions(caplog):
+    event_handler = EventHandler(num_workers=1)
+
+    async def function_raise_error(event: MockEvent):
+        raise RuntimeError("error triggered")
+
+    event_handler.subscribe(MockEvent, function_raise_error)
+    event_handler.subscribe(MockEvent, mock_function)
+
+    mock_event = MockEvent(data=0)
+    event_handler.publish(mock_event)
+
+    try:
+        await asyncio.wait_for(event_handler.run(), timeout=0.5)
+    except asyncio.TimeoutError:
+        pass
+
+    assert mock_event.data == 1
+    assert "error captured in `function_raise_error`" in caplog.text
+
+
+def test_priority_buffer_order():
+    buffer = PriorityEventBuffer()
+    events = [
+        MockEvent(data=0, level=EventLevel.DEBUG),
+        MockEvent(data=1, level=EventLevel.CRITICAL),
+        MockEvent(data=2, level=EventLevel.INFO),
+        MockEvent(data=3, level=EventLevel.CRITICAL),
+    ]
+    for event in events:
+        buffer.put_nowait((event, 0.0))
+    buffer.put_nowait((PoisonPill, 0.0))
+
+    assert buffer.qsize() == 5
+    assert list(buffer._queue)[0][0].data == 1
+    assert buffer.level_qsize(EventLevel.CRITICAL) == 2
+    assert [buffer.get_nowait()[0].data for _ in events] == [1, 3, 2, 0]
+    assert buffer.get_nowait()[0] is PoisonPill
+    assert buffer.empty()
+
+
+def test_priority_buffer_discards_lowest_level():
+    event_handler = EventHandler(buffer_maxsize=2, priority_buffer=True)
+    event_handler.subscribe(MockEvent, mock_function)
+
+    info = MockEvent(level=EventLevel.INFO)
+    critical = MockEvent(level=EventLevel.CRITICAL)
+    for event in [info, MockEvent(level=EventLevel.DEBUG), critical]:
+        event_handler.publish(event)
+
+    event_handler.publish(MockEvent(level=EventLevel.DEBUG))
+    assert event_handler._event_buffer.level_qsize(EventLevel.DEBUG) == 0
+
+    error = MockEvent(level=EventLevel.ERROR)
+    event_handler.publish(error)
+    assert [event_handler._event_buffer.get_nowait()[0] for _ in range(2)] == [
+        critical,
+        error,
+    ]
+
+
+def test_priority_buffer_level_maxsize():
+    event_handler = EventHandler(
+        priority_buffer=True, level_maxsize={EventLevel.DEBUG: 2}
+    )
+    event_handler.subscribe(MockEvent, mock_function)
+    debug_events = [MockEvent(data=i, level=EventLevel.DEBUG) for i in range(3)]
+    for event in debug_events:
+        event_handler.publish(event)
+    event_handler.publish(MockEvent(level=EventLevel.CRITICAL))
+
+    buffer = event_handler._event_buffer
+    assert buffer.level_qsize(EventLevel.DEBUG) == 2
+    assert buffer.qsize() == 3
+    assert [buffer.get_nowait()[0].data for _ in range(3)] == [None, 1, 2]
+
+
+@pytest.mark.asyncio
+async def test_priority_buffer_put_when_room():
+    buffer = PriorityEventBuffer(maxsize=3, level_maxsize={EventLevel.DEBUG: 1})
+    debug = MockEvent(level=EventLevel.DEBUG)
+    buffer.put_nowait((debug, 0.0))
+    assert not await buffer.put_when_room((debug, 1.0), timeout=0.01)
+    assert await buffer.put_when_room((MockEvent(), 2.0), timeout=0.01)
+    assert buffer.qsize() == 2
+
+
+@pytest.mark.asyncio
+async def test_priority_buffer_critical_events_first():
+    event_handler = EventHandler(num_workers=1, priority_buffer=True)
+    processed = []
+
+    async def record(event: MockEvent):
+        processed.append(event.level)
+
+    event_handler.subscribe(MockEvent, record)
+    for _ in range(3):
+        event_handler.publish(MockEvent(level=EventLevel.DEBUG))
+    event_handler.publish(MockEvent(level=EventLevel.CRITICAL))
+
+    async def stop_event_handler():
+        await asyncio.sleep(0.1)
+        await event_handler.stop()
+
+    await asyncio.gather(event_handler.run(), stop_event_handler())
+    assert processed[0] == EventLevel.CRITICAL
+    assert len(processed) == 4
+
+
+class RareEventType(EventType):
+    pass
+
+
+class RareEvent(Event):
+    type = RareEventType
+
+
+def test_fair_buffer_weights():
+    buffer = FairEventBuffer()
+    buffer.set_share(MockEvent.type.uuid, weight=2)
+    buffer.set_share(RareEvent.type.uuid, weight=0.5)
+    with pytest.raises(ValueError):
+        buffer.set_share(RareEvent.type.uuid, weight=0)
+    for i in range(6):
+        buffer.put_nowait((MockEvent(data=i), 0.0))
+        buffer.put_nowait((RareEvent(data=i), 0.0))
+    buffer.put_nowait((PoisonPill, 0.0))
+    assert buffer.type_qsize(RareEvent.type.uuid) == 6
+    assert len(list(buffer._queue)) == 13
+
+    order = [buffer.get_nowait()[0] for _ in range(13)]
+    types = "".join("m" if e.__class__ is MockEvent else "r" for e in order[:-1])
+    assert types == "mmmmrmmrrrrr"
+    assert order[-1] is PoisonPill
+    assert [e.data for e in order if e.__class__ is RareEvent] == list(range(6))
+    assert buffer.type_qsize(RareEvent.type.uuid) == 0
+
+
+def test_fair_buffer_evict():
+    buffer = FairEventBuffer(maxsize=4, type_maxsize=2)
+    buffer.set_share(RareEvent.type.uuid, maxsize=3)
+    buffer.set_share(RareEvent.type.uuid, maxsize=None)
+    for i in range(2):
+        buffer.put_nowait((MockEvent(data=i), 0.0))
+        buffer.put_nowait((RareEvent(data=i), 0.0))
+    new_mock = (MockEvent(data=2), 0.0)
+    assert buffer.full_for(new_mock[0])
+    assert buffer.evict(new_mock)[0].data == 0
+    assert buffer.type_qsize(MockEvent.type.uuid) == 1
+
+    buffer = FairEventBuffer(maxsize=3)
+    for event in [MockEvent(), MockEvent(), RareEvent()]:
+        buffer.put_nowait((event, 0.0))
+    assert buffer.evict((RareEvent(), 0.0))[0].__class__ is MockEvent
+
+    buffer = FairEventBuffer(maxsize=1)
+    buffer.put_nowait((PoisonPill, 0.0))
+    assert buffer.full_for(PoisonPill)
+    entry = (MockEvent(), 0.0)
+    assert buffer.evict(entry) is entry
+
+
+@pytest.mark.asyncio
+async def test_event_handler_fair_buffer():
+    event_handler = EventHandler(num_workers=1, buffer_maxsize=200, fair_buffer=True)
+    processed = []
+
+    async def process(event):
+        processed.append(event)
+
+    event_handler.subscribe(MockEvent, process)
+    event_handler.subscribe(RareEvent, process)
+    event_handler.set_share(RareEvent, weight=1, maxsize=10)
+    event_handler.publish_many(MockEvent(data=i) for i in range(100))
+    event_handler.publish(RareEvent())
+    runner = asyncio.create_task(event_handler.run())
+    await asyncio.sleep(0.01)
+    await event_handler.stop()
+    await runner
+    assert len(processed) == 101
+    assert processed[1].__class__ is RareEvent
+
+    with pytest.raises(ValueError):
+        EventHandler(priority_buffer=True, fair_buffer=True)
+    with pytest.raises(RuntimeError):
+        EventHandler().set_share(RareEvent)
+
+
+def test_event_handler_publish_many():
+    class CustomEvent:
+        pass
+
+    class OtherEvent(Event):
+        type = EventType
+
+    event_handler = EventHandler(buffer_maxsize=3)
+    event_handler.subscribe(MockEvent, mock_function)
+    events = [MockEvent(data=i) for i in range(4)] + [CustomEvent(), OtherEvent()]
+
+    assert event_handler.publish_many(events) == 4
+    assert event_handler._event_buffer.qsize() == 3
+    assert event_handler._event_buffer.get_nowait()[0].data == 1
+
+    event_handler = EventHandler(buffer_maxsize=1, priority_buffer=True)
+    event_handler.subscribe(MockEvent, mock_function)
+    events = [MockEvent(level=EventLevel.ERROR), MockEvent(level=EventLevel.DEBUG)]
+    assert event_handler.publish_many(events) == 1
+
+
+@pytest.mark.asyncio
+async def test_event_handler_publish_many_stopping():
+    event_handler = EventHandler(num_workers=1)
+    event_handler.subscribe(MockEvent, mock_function)
+    runner = asyncio.create_task(event_handler.run())
+    await asyncio.sleep(0)
+    await event_handler.stop()
+    assert event_handler.publish_many([MockEvent()]) == 0
+    await runner
+
+
+def test_event_handler_overflow_policies():
+    event_handler = EventHandler(
+        buffer_maxsize=1, overflow_policy=OverflowPolicy.DROP_NEWEST
+    )
+    event_handler.subscribe(MockEvent, mock_function)
+    assert event_handler.publish(MockEvent(data=1)) is PublishResult.PUBLISHED
+    assert event_handler.publish(MockEvent(data=2)) is PublishResult.DISCARDED
+    assert event_handler._event_buffer.get_nowait()[0].data == 1
+
+    event_handler.publish(MockEvent(data=1))
+    event_handler.set_overflow_policy(MockEvent, OverflowPolicy.REJECT)
+    assert event_handler.publish(MockEvent(data=2)) is PublishResult.REJECTED
+    assert event_handler.publish_many([MockEvent(data=3)]) == 0
+
+    event_handler.set_overflow_policy(MockEvent, OverflowPolicy.BLOCK)
+    assert event_handler.publish(MockEvent(data=4)) is PublishResult.REJECTED
+
+    event_handler.set_overflow_policy(MockEvent, None)
+    assert event_handler.publish(MockEvent(data=5)) is PublishResult.DISCARDED
+    assert event_handler.stats()["discarded"] == {
+        "dropped_newest": 2,
+        "rejected": 3,
+    }
+
+    event_handler = EventHandler(buffer_maxsize=1, priority_buffer=True)
+    event_handler.subscribe(MockEvent, mock_function)
+    event_handler.publish(MockEvent(level=EventLevel.ERROR))
+    result = event_handler.publish(MockEvent(level=EventLevel.DEBUG))
+    assert result is PublishResult.DISCARDED
+
+
+def test_event_handler_overflow_policy_string():
+    event_handler = EventHandler(buffer_maxsize=1, overflow_policy="drop_oldest")
+    assert event_handler.overflow_policy is OverflowPolicy.DROP_OLDEST
+    event_handler.subscribe(MockEvent, mock_function)
+    assert event_handler.publish(MockEvent(data=1)) == "published"
+    assert event_handler.publish(MockEvent(data=2)) == "published"
+    assert event_handler._event_buffer.get_nowait()[0].data == 2
+    with pytest.raises(ValueError):
+        EventHandler(overflow_policy="unknown")
+
+
+@pytest.mark.asyncio
+async def test_event_handler_publish_async_block():
+    event_handler = EventHandler(
+        buffer_maxsize=1,
+        overflow_policy=OverflowPolicy.BLOCK,
+        block_timeout_seconds=0.05,
+    )
+    event_handler.subscribe(MockEvent, mock_function)
+    assert await event_handler.publish_async(MockEvent(data=1)) == "published"
+    assert await event_handler.publish_async(MockEvent(data=2)) == "rejected"
+    assert event_handler.stats()["discarded"] == {"block_timeout": 1}
+
+    async def get_later():
+        await asyncio.sleep(0.01)
+        return event_handler._event_buffer.get_nowait()
+
+    getter = asyncio.create_task(get_later())
+    assert await event_handler.publish_async(MockEvent(data=3)) == "published"
+    assert (await getter)[0].data == 1
+    assert event_handler._event_buffer.get_nowait()[0].data == 3
+
+    event_handler.publish(MockEvent(data=4))
+    event_handler.state = EventHandlerState.STOPPING
+    assert await event_handler.publish_async(MockEvent(data=5)) == "discarded"
+
+
+def test_event_handler_coalescing():
+    event_handler = EventHandler(buffer_maxsize=2)
+    event_handler.subscribe(MockEvent, mock_function)
+    event_handler.set_coalescing(MockEvent, Coalescing(key=lambda event: event.level))
+    assert event_handler.publish(MockEvent(data=1)) is PublishResult.PUBLISHED
+    assert event_handler.publish(MockEvent(data=2)) is PublishResult.COALESCED
+    error_event = MockEvent(data=3, level=EventLevel.ERROR)
+    assert event_handler.publish_many([error_event, MockEvent(data=4)]) == 1
+    assert (
+        event_handler.publish(MockEvent(data=5, level=EventLevel.DEBUG)) == "published"
+    )
+
+    buffer = event_handler._event_buffer
+    assert buffer.qsize() == 2
+    assert [buffer.get_nowait()[0].data for _ in range(2)] == [3, 5]
+    stats = event_handler.stats()
+    assert stats["coalesced"] == 2
+    assert stats["published"] == 3
+    assert stats["discarded"] == {"buffer_full": 1}
+
+    event_handler.set_coalescing(MockEvent, None)
+    event_handler.publish(MockEvent(data=6))
+    event_handler.publish(MockEvent(data=7))
+    assert buffer.qsize() == 2
+
+    event_handler = EventHandler()
+    event_handler.subscribe(MockEvent, mock_function)
+    event_handler.set_coalescing(MockEvent, Coalescing(throttle_seconds=1))
+    assert event_handler.publish(MockEvent(data=1)) == "published"
+    assert event_handler.publish(MockEvent(data=2)) == "coalesced"
+    with pytest.raises(ValueError):
+        Coalescing(debounce_seconds=0)
+
+
+@pytest.mark.asyncio
+async def test_event_handler_coalescing_entries_are_forgotten():
+    event_handler = EventHandler(buffer_maxsize=1)
+    event_handler.subscribe(MockEvent, mock_function)
+    event_handler.set_coalescing(MockEvent, Coalescing())
+    event_handler.publish(MockEvent(data=1))
+    assert await event_handler._get_next_event() is not None
+    assert event_handler._coalesced_entries == {}
+
+    event_handler = EventHandler(buffer_maxsize=1)
+    event_handler.subscribe(MockEvent, mock_function)
+    event_handler.set_coalescing(MockEvent, Coalescing(key=lambda event: event.data))
+    event_handler.publish(MockEvent(data=1))
+    event_handler.publish(MockEvent(data=2))
+    assert list(event_handler._coalesced_entries) == [(MockEvent.type.uuid, 2)]
+
+    event_handler.set_overflow_policy(MockEvent, OverflowPolicy.BLOCK)
+    assert await event_handler.publish_async(MockEvent(data=2)) == "coalesced"
+
+
+@pytest.mark.asyncio
+async def test_event_handler_throttle():
+    event_handler = EventHandler(num_workers=1)
+    received = []
+
+    async def receive(event):
+        received.append(event.data)
+
+    event_handler.subscribe(MockEvent, receive)
+    event_handler.set_coalescing(MockEvent, Coalescing(throttle_seconds=0.05))
+    runner = asyncio.create_task(event_handler.run())
+    await asyncio.sleep(0)
+    results = [event_handler.publish(MockEvent(data=i)) for i in range(4)]
+    assert results == ["published", "deferred", "coalesced", "coalesced"]
+    await asyncio.sleep(0.07)
+    assert received == [0, 3]
+    await asyncio.sleep(0.07)
+    assert len(event_handler._windows) == 0
+
+    event_handler.publish(MockEvent(data=4))
+    event_handler.publish(MockEvent(data=5))
+    await event_handler.stop()
+    await runner
+    assert received == [0, 3, 5]
+
+
+@pytest.mark.asyncio
+async def test_event_handler_window_expired_while_stopping():
+    event_handler = EventHandler(num_workers=1)
+    event_handler.subscribe(MockEvent, mock_function)
+    event_handler.set_coalescing(MockEvent, Coalescing(throttle_seconds=0.01))
+    event_handler.publish(MockEvent(data=1))
+    event_handler._event_buffer.get_nowait()
+    assert event_handler.publish(MockEvent(data=2)) == "deferred"
+    event_handler.state = EventHandlerState.STOPPING
+    await asyncio.sleep(0.02)
+    assert event_handler._event_buffer.qsize() == 0
+    assert event_handler.stats()["discarded"] == {"stopping": 1}
+
+
+@pytest.mark.asyncio
+async def test_event_handler_debounce():
+    event_handler = EventHandler(num_workers=1)
+    received = []
+
+    async def receive(event):
+        received.append(event.data)
+
+    event_handler.subscribe(MockEvent, receive)
+    coalescing = Coalescing(debounce_seconds=0.02, throttle_seconds=0.05)
+    event_handler.set_coalescing(MockEvent, coalescing)
+    runner = asyncio.create_task(event_handler.run())
+    await asyncio.sleep(0)
+    for i in range(6):
+        assert event_handler.publish(MockEvent(data=i)) != "published"
+        await asyncio.sleep(0.01)
+    await asyncio.sleep(0.04)
+    assert received[-1] == 5
+    assert len(received) < 6
+
+    event_handler.publish(MockEvent(data=6))
+    event_handler.set_coalescing(MockEvent, None)
+    await asyncio.sleep(0.01)
+    assert received[-1] == 6
+    await event_handler.stop()
+    await runner
+
+
+@pytest.mark.asyncio
+async def test_event_handler_autoscale_queue_depth():
+    autoscale = Autoscale(
+        max_workers=3,
+        queue_depth=2,
+        cooldown_seconds=0.1,
+        interval_seconds=0.02,
+        step=2,
+    )
+    event_handler = EventHandler(num_workers=1, autoscale=autoscale)
+
+    async def slow(event):
+        await asyncio.sleep(0.05)
+
+    event_handler.subscribe(MockEvent, slow)
+    runner = asyncio.create_task(event_handler.run())
+    await asyncio.sleep(0)
+    event_handler.publish_many(MockEvent() for _ in range(10))
+    await asyncio.sleep(0.1)
+    stats = event_handler.stats()
+    assert stats["workers"] == 3
+    assert stats["scaling"] == {"queue_depth": 2}
+
+    await asyncio.sleep(0.4)
+    stats = event_handler.stats()
+    assert stats["processed"] == 10
+    assert stats["workers"] == 1
+    assert stats["scaling"]["idle"] == 2
+    await event_handler.stop()
+    await runner
+
+
+@pytest.mark.asyncio
+async def test_event_handler_idle_timeout_keeps_events():
+    event_handler = EventHandler()
+    event_handler.subscribe(MockEvent, mock_function)
+    loop = asyncio.get_running_loop()
+    for i in range(20):
+        event = MockEvent(data=i)
+        getter = asyncio.create_task(event_handler._get_next_event(0.01))
+        await asyncio.sleep(0)
+        loop.call_later(0.01 + i * 0.0005, event_handler.publish, event)
+        assert await asyncio.wait_for(getter, 1) is event
+    assert event_handler._event_buffer.empty()
+
+
+@pytest.mark.asyncio
+@pytest.mark.skipif(not hasattr(asyncio.Task, "uncancel"), reason="Python 3.11+")
+async def test_deadline_keeps_other_cancellations():
+    async def body():
+        with _Deadline(0.001):
+            asyncio.get_running_loop().call_soon(task.cancel)
+            time.sleep(0.002)
+            await asyncio.sleep(1)
+
+    task = asyncio.create_task(body())
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+
+@pytest.mark.asyncio
+async def test_wait_for_without_uncancel(monkeypatch):
+    monkeypatch.setattr(handler, "_UNCANCEL", False)
+    assert await handler._wait_for(asyncio.sleep(1, "late"), 0.001) == (True, None)
+    assert await handler._wait_for(asyncio.sleep(0, "soon"), 1) == (False, "soon")
+
+    async def body():
+        asyncio.get_running_loop().call_soon(task.cancel)
+        time.sleep(0.002)
+        await handler._wait_for(asyncio.sleep(1), 0.001)
+
+    task = asyncio.create_task(body())
+    with pytest.raises(asyncio.CancelledError):
+        await task
+
+    event_handler = EventHandler()
+    event_handler.subscribe(MockEvent, mock_function)
+    loop = asyncio.get_running_loop()
+    for i in range(20):
+        event = MockEvent(data=i)
+        getter = asyncio.create_task(event_handler._get_next_event(0.01))
+        await asyncio.sleep(0)
+        loop.call_later(0.01 + i * 0.0005, event_handler.publish, event)
+        assert await asyncio.wait_for(getter, 1) is event
+    assert event_handler._event_buffer.empty()
+
+    event_handler = EventHandler(num_workers=1, worker_timeout_seconds=0.01)
+
+    async def slow(event):
+        await asyncio.sleep(1)
+
+    event_handler.subscribe(MockEvent, slow)
+    event_handler.publish(MockEvent())
+    runner = asyncio.create_task(event_handler.run())
+    await asyncio.sleep(0.03)
+    assert event_handler.stats()["timeouts"] == 1
+    await event_handler.stop()
+    await runner
+
+
+@pytest.mark.asyncio
+async def test_event_handler_autoscale_buffer_wait():
+    autoscale = Autoscale(
+        max_workers=2, queue_depth=100, buffer_wait_seconds=0.01, interval_seconds=0.05
+    )
+    event_handler = EventHandler(num_workers=1, autoscale=autoscale)
+
+    async def slow(event):
+        await asyncio.sleep(0.02)
+
+    event_handler.subscribe(MockEvent, slow)
+    runner = asyncio.create_task(event_handler.run())
+    await asyncio.sleep(0)
+    event_handler.publish_many(MockEvent() for _ in range(5))
+    await asyncio.sleep(0.04)
+    event_handler.stats(reset=True)
+    await asyncio.sleep(0.1)
+    stats = event_handler.stats()
+    assert stats["workers"] == 2
+    assert stats["scaling"] == {"buffer_wait": 1}
+    event_handler.cancel()
+    await runner
+    assert event_handler._scaler is None
+
+    with pytest.raises(ValueError):
+        Autoscale(min_workers=0)
+    with pytest.raises(ValueError):
+        Autoscale(step=0)
+
+
+@pytest.mark.asyncio
+async def test_event_handler_reconfigure():
+    event_handler = EventHandler(num_workers=2, buffer_maxsize=10)
+    processed = []
+
+    async def slow(event):
+        await asyncio.sleep(0.01)
+        processed.append(event.data)
+
+    event_handler.subscribe(MockEvent, slow)
+    runner = asyncio.create_task(event_handler.run())
+    await asyncio.sleep(0)
+    assert event_handler.publish_many(MockEvent(data=i) for i in range(10)) == 10
+    event_handler.reconfigure(
+        num_workers=4,
+        buffer_maxsize=5,
+        worker_timeout_seconds=1,
+        block_timeout_seconds=0.5,
+    )
+    assert event_handler.stats()["workers"] == 4
+    assert event_handler.worker_timeout_seconds == 1
+    assert event_handler.block_timeout_seconds == 0.5
+    # the buffered events are kept, but it is full until it drains
+    assert event_handler.publish(MockEvent(data=10)) == "discarded"
+    assert event_handler.stats()["buffer_size"] == 10
+    assert event_handler.stats()["discarded"] == {"dropped_newest": 1}
+
+    event_handler.reconfigure(num_workers=1)
+    await asyncio.sleep(0.1)
+    assert event_handler.stats()["workers"] == 1
+    event_handler.reconfigure(num_workers=3)
+    event_handler.reconfigure(num_workers=2)
+    await event_handler.stop()
+    await asyncio.wait_for(runner, 1)
+    assert sorted(processed) == list(range(10))
+    assert event_handler.stats()["processed"] == 10
+
+    with pytest.raises(ValueError):
+        event_handler.reconfigure(num_workers=0)
+
+
+@pytest.mark.parametrize(
+    "options", [{}, {"priority_buffer": True}, {"fair_buffer": True}]
+)
+def test_event_handler_shrunk_buffer_keeps_backlog(options):
+    event_handler = EventHandler(buffer_maxsize=20, **options)
+    event_handler.subscribe(MockEvent, mock_function)
+    event_handler.publish_many(MockEvent(data=i) for i in range(20))
+    event_handler.reconfigure(buffer_maxsize=5)
+    for i in range(20, 25):
+        assert event_handler.publish(MockEvent(data=i)) == "discarded"
+    assert event_handler.publish_many([MockEvent(data=25)]) == 0
+    buffer = event_handler._event_buffer
+    data = [buffer.get_nowait()[0].data for _ in range(16)]
+    assert sorted(data) == list(range(16))
+
+    assert event_handler.publish(MockEvent(data=26)) == "published"
+    # once it has drained, the overflow policy evicts the oldest events again
+    assert event_handler.publish(MockEvent(data=27)) == "published"
+    data = [buffer.get_nowait()[0].data for _ in range(buffer.qsize())]
+    assert sorted(data) == [17, 18, 19, 26, 27]
+    assert event_handler.stats()["discarded"] == {
+        "dropped_newest": 6,
+        "buffer_full": 1,
+    }
+
+
+@pytest.mark.asyncio
+async def test_event_handler_reconfigure_autoscale():
+    event_handler = EventHandler(num_workers=1, autoscale=Autoscale(max_workers=2))
+    event_handler.subscribe(MockEvent, mock_function)
+    runner = asyncio.create_task(event_handler.run())
+    await asyncio.sleep(0)
+    event_handler.reconfigure(num_workers=5)
+    assert event_handler.stats()["workers"] == 2
+    await event_handler.stop()
+    await asyncio.wait_for(runner, 1)
+
+
+@pytest.mark.asyncio
+async def test_buffer_resize_wakes_putters():
+    buffer = PriorityEventBuffer(maxsize=1)
+    buffer.put_nowait((MockEvent(), 0.0))
+    putter = asyncio.create_task(buffer.put_when_room((MockEvent(), 1.0), 1))
+    await asyncio.sleep(0)
+    buffer.resize(0)
+    assert await putter
+    buffer.resize(1)
+    buffer.put_unbounded((PoisonPill, 2.0))
+    assert buffer.qsize() == 3
+
+
+@pytest.mark.asyncio
+async def test_event_handler_subscribe_batch():
+    event_handler = EventHandler(num_workers=2)
+    batches = []
+
+    async def save_batch(events):
+        batches.append([event.data for event in events])
+
+    event_handler.subscribe_batch(MockEvent, save_batch, max_size=3, max_delay=0.1)
+    event_handler.subscribe_batch(MockEvent, save_batch, max_size=3, max_delay=0.1)
+    event_handler.publish_many([MockEvent(data=i) for i in range(4)])
+
+    async def publish_and_stop():
+        await asyncio.sleep(0.3)
+        event_handler.publish(MockEvent(data=4))
+        await event_handler.stop()
+
+    await asyncio.gather(event_handler.run(), publish_and_stop())
+
+    assert sorted(sum(batches, [])) == list(range(5))
+    assert [len(batch) for batch in batches] == [3, 1, 1]
+
+    event_handler.unsubscribe(MockEvent, save_batch)
+    assert MockEvent.type.uuid not in event_handler._subscribers
+
+
+@pytest.mark.asyncio
+async def test_event_handler_unsubscribe_batch_delivers_pending():
+    event_handler = EventHandler(num_workers=1)
+    batches = []
+
+    async def save_batch(events):
+        batches.append([event.data for event in events])
+
+    event_handler.subscribe_batch(MockEvent, save_batch, max_size=10, max_delay=10)
+    runner = asyncio.create_task(event_handler.run())
+    event_handler.publish_many([MockEvent(data=i) for i in range(3)])
+    await asyncio.sleep(0.01)
+    event_handler.unsubscribe(MockEvent, save_batch)
+    await event_handler.stop()
+    await runner
+    assert batches == [[0, 1, 2]]
+    assert not event_handler._closing
+
+
+def test_event_handler_unsubscribe_batch_without_loop():
+    event_handler = EventHandler()
+    event_handler.subscribe_batch(MockEvent, mock_function)
+    event_handler.unsubscribe(MockEvent, mock_function)
+    assert not event_handler._closing
+
+
+@pytest.mark.asyncio
+async def test_batch_subscriber_errors(caplog):
+    async def raise_error(events):
+        raise RuntimeError("error triggered")
+
+    async def slow(events):
+        await asyncio.sleep(1)
+
+    for fn in [raise_error, slow]:
+        subscriber = BatchSubscriber(fn, max_size=10, max_delay=0.01, timeout=0.1)
+        await subscriber(MockEvent())
+        await asyncio.sleep(0.02)
+        await subscriber.close()
+
+    assert "error captured in `raise_error`" in caplog.text
+    assert "for a batch of `slow`" in caplog.text
+    with pytest.raises(ValueError):
+        BatchSubscriber(slow, max_size=0, max_delay=1, timeout=1)
+
+
+@pytest.mark.asyncio
+async def test_event_handler_debug_logs(caplog):
+    caplog.set_level(logging.DEBUG, logger="iot_firmware")
+    event_handler = EventHandler(num_workers=1)
+    event_handler.publish(MockEvent(data=0))
+    event_handler.subscribe(MockEvent, mock_function)
+    event_handler.subscribe(MockEvent, MockObject().mock_function)
+    event_handler.publish(MockEvent(data=0))
+
+    async def stop_event_handler():
+        await asyncio.sleep(0.2)
+        await event_handler.stop()
+
+    await asyncio.gather(event_handler.run(), stop_event_handler())
+    assert "is the buffer, pending to be executed" in caplog.text
+    assert "processing latency" in caplog.text
+    assert "there were no subscribers" in caplog.text
+    assert "event `PoisonPill` has been in buffer" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_event_handler_stats():
+    event_handler = EventHandler(num_workers=1, buffer_maxsize=2)
+
+    async def raise_error(event: MockEvent):
+        raise RuntimeError("error triggered")
+
+    event_handler.subscribe(MockEvent, mock_function)
+    event_handler.subscribe(MockEvent, raise_error)
+    for _ in range(3):
+        event_handler.publish(MockEvent(data=0))
+    event_handler.publish("not an event")
+
+    class OtherEvent(Event):
+        type = EventType
+
+    event_handler.publish(OtherEvent())
+
+    async def stop_event_handler():
+        await asyncio.sleep(0.3)
+        await event_handler.stop()
+        event_handler.publish(MockEvent(data=0))
+        event_handler.publish_many([MockEvent(data=0)] * 2)
+
+    await asyncio.gather(event_handler.run(), stop_event_handler())
+
+    stats = event_handler.stats(reset=True)
+    assert stats["published"] == 3
+    assert stats["processed"] == 2
+    assert stats["exceptions"] == 2
+    assert stats["discarded"] == {
+        "buffer_full": 1,
+        "not_event": 1,
+        "no_subscribers": 1,
+        "stopping": 3,
+    }
+    assert stats["buffer_wait"]["count"] == 2
+    assert stats["subscribers"]["mock_function"]["count"] == 2
+    assert stats["subscribers"]["mock_function"]["p50"] >= 0.1
+    assert stats["state"] == "IDLE"
+    assert event_handler.stats()["published"] == 0
+
+
+@pytest.mark.asyncio
+async def test_event_handler_thread_subscriber():
+    event_handler = EventHandler(num_workers=4, worker_timeout_seconds=1)
+    running = []
+    concurrency = []
+
+    def blocking_function(event: MockEvent):
+        running.append(event)
+        concurrency.append(len(running))
+        time.sleep(0.1)
+        running.remove(event)
+        event.data += 1
+
+    event_handler.subscribe(
+        MockEvent, blocking_function, executor=ExecutorType.THREAD, max_concurrency=2
+    )
+    events = [MockEvent(data=0) for _ in range(4)]
+    event_handler.publish_many(events)
+
+    ticks = 0
+
+    async def tick_and_stop():
+        nonlocal ticks
+        for _ in range(10):
+            await asyncio.sleep(0.02)
+            ticks += 1
+        await asyncio.sleep(0.2)
+        await event_handler.stop()
+
+    await asyncio.gather(event_handler.run(), tick_and_stop())
+
+    assert [event.data for event in events] == [1, 1, 1, 1]
+    assert max(concurrency) == 2
+    assert ticks == 10
+    assert event_handler._executors == {}
+
+
+@pytest.mark.asyncio
+async def test_event_handler_process_subscriber(caplog):
+    event_handler = EventHandler(num_workers=2, process_pool_workers=2)
+    event_handler.subscribe(MockEvent, mock_sync_function, executor="process")
+    event_handler.publish(MockEvent(data=10))
+    event_handler.publish(MockEvent(data="not a number"))
+
+    async def stop_event_handler():
+        await asyncio.sleep(1)
+        await event_handler.stop()
+
+    await asyncio.gather(event_handler.run(), stop_event_handler())
+
+    stats = event_handler.stats()
+    assert stats["processed"] == 2
+    assert stats["exceptions"] == 1
+    assert "error captured in `mock_sync_function`" in caplog.text
+
+    event_handler.unsubscribe(MockEvent, mock_sync_function)
+    assert MockEvent.type.uuid not in event_handler._subscribers
+
+
+@pytest.mark.asyncio
+async def test_executor_subscriber_releases_slot_on_error():
+    subscriber = ExecutorSubscriber(mock_sync_function, lambda: None)
+    with pytest.raises(AttributeError):
+        await subscriber(MockEvent(data=1))
+    assert not subscriber._semaphore.locked()
+    await subscriber.close()
+    with pytest.raises(ValueError):
+        ExecutorSubscriber(mock_sync_function, lambda: None, max_concurrency=0)
+
+
+@pytest.mark.asyncio
+async def test_event_handler_subscriber_timeout():
+    event_handler = EventHandler(num_workers=1, worker_timeout_seconds=1)
+    calls = []
+
+    async def fast(event):
+        calls.append(event.data)
+
+    async def slow(event):
+        await asyncio.sleep(1)
+
+    event_handler.subscribe(MockEvent, fast, max_concurrency=2)
+    event_handler.subscribe(MockEvent, slow, timeout=0.05)
+    runner = asyncio.create_task(event_handler.run())
+    await asyncio.sleep(0)
+    event_handler.publish(MockEvent(data=1))
+    event_handler.publish(MockEvent(data=2))
+    await asyncio.sleep(0.2)
+    stats = event_handler.stats()
+    assert calls == [1, 2]
+    assert stats["processed"] == 2
+    assert stats["timeouts"] == 0
+    assert stats["subscriber_timeouts"] == {slow.__qualname__: 2}
+    assert list(stats["worker_usage"])[0] == slow.__qualname__
+    await event_handler.stop()
+    await runner
+
+    with pytest.raises(ValueError):
+        LimitedSubscriber(fast, lambda: None, max_concurrency=0)
+    await IsolatedSubscriber(fast, lambda: None).close()
+
+
+@pytest.mark.asyncio
+async def test_event_handler_isolated_subscriber(caplog):
+    event_handler = EventHandler(num_workers=1, buffer_maxsize=2)
+    calls = []
+
+    async def fast(event):
+        calls.append(event.data)
+
+    async def slow(event):
+        await asyncio.sleep(0.05)
+        if event.data == 5:
+            raise ValueError("slow error")
+
+    event_handler.subscribe(MockEvent, fast)
+    event_handler.subscribe(MockEvent, slow, isolated=True, max_concurrency=1)
+    runner = asyncio.create_task(event_handler.run())
+    await asyncio.sleep(0)
+    for i in range(6):
+        event_handler.publish(MockEvent(data=i))
+        await asyncio.sleep(0.001)
+    assert calls == list(range(6))
+    assert event_handler.stats()["processed"] == 6
+
+    await event_handler.stop()
+    await runner
+    stats = event_handler.stats()
+    assert stats["discarded"] == {"subscriber_busy": 3}
+    assert stats["isolated"][slow.__qualname__]["count"] == 3
+    assert stats["exceptions"] == 1
+    assert "slow error" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_event_handler_isolated_subscriber_is_closed(caplog):
+    event_handler = EventHandler(num_workers=1, worker_timeout_seconds=0.05)
+    calls = []
+
+    async def slow(event):
+        calls.append(event.data)
+        await asyncio.sleep(0.01)
+
+    async def stuck(event):
+        await asyncio.sleep(10)
+
+    event_handler.subscribe(MockEvent, slow, isolated=True)
+    event_handler.subscribe(MockEvent, stuck, isolated=True)
+    wrapper = event_handler._wrapped_subscribers[(MockEvent.type.uuid, slow)]
+    runner = asyncio.create_task(event_handler.run())
+    await asyncio.sleep(0)
+    for i in range(3):
+        event_handler.publish(MockEvent(data=i))
+    await asyncio.sleep(0.001)
+    lanes = list(wrapper._lanes)
+    event_handler.unsubscribe(MockEvent, slow)
+    await event_handler.stop()
+    await asyncio.wait_for(runner, 1)
+    # the unsubscribed function finishes its events and the stuck one is cut
+    assert calls == [0, 1, 2]
+    assert all(lane.done() for lane in lanes)
+    assert event_handler.stats()["discarded"] == {"stopping": 3}
+    assert "`stuck` did not finish them in 0.05s" in caplog.text
+
+
+@pytest.mark.asyncio
+async def test_event_handler_subscribe_again_replaces_options():
+    event_handler = EventHandler()
+    uuid = MockEvent.type.uuid
+    event_handler.subscribe(MockEvent, mock_function)
+    event_handler.subscribe(MockEvent, mock_function, timeout=1)
+    (subscriber,) = event_handler._subscribers[uuid]
+    assert isinstance(subscriber, LimitedSubscriber) and subscriber.timeout == 1
+
+    event_handler.subscribe(MockEvent, mock_function, isolated=True)
+    (isolated,) = event_handler._subscribers[uuid]
+    assert isinstance(isolated, IsolatedSubscriber)
+    await isolated(MockEvent())
+    event_handler.subscribe(MockEvent, mock_function)
+    assert event_handler._subscribers[uuid] == {mock_function}
+    assert event_handler._wrapped_subscribers == {}
+    await asyncio.gather(*event_handler._closing)
+    assert isolated._lanes == []
+
+
+@pytest.mark.asyncio
+async def test_event_handler_isolated_executor_subscriber():
+    event_handler = EventHandler(num_workers=1)
+
+    def sync_function(event):
+        time.sleep(0.05)
+
+    event_handler.subscribe(
+        MockEvent, mock_sync_function, executor=ExecutorType.THREAD, isolated=True
+    )
+    event_handler.subscribe(
+        MockEvent, sync_function, executor=ExecutorType.THREAD, timeout=0.01
+    )
+    runner = asyncio.create_task(event_handler.run())
+    await asyncio.sleep(0)
+    event_handler.publish(MockEvent(data=3))
+    await asyncio.sleep(0.05)
+    assert event_handler.stats()["processed"] == 1
+    await event_handler.stop()
+    await runner
+    stats = event_handler.stats()
+    assert stats["isolated"]["mock_sync_function"]["count"] == 1
+    assert stats["subscriber_timeouts"] == {sync_function.__qualname__: 1}
+
+
+def test_event_handler_subscribe_executor_bad_fn():
+    event_handler = EventHandler()
+    with pytest.raises(TypeError):
+        event_handler.subscribe(MockEvent, mock_function, executor=ExecutorType.THREAD)
+    with pytest.raises(TypeError):
+        event_handler.subscribe(MockEvent, mock_sync_function)
+    with pytest.raises(ValueError):
+        event_handler.subscribe(MockEvent, mock_sync_function, executor="gpu")
+
+
+def test_ring_file_wrap_and_overwrite(tmp_path, caplog):
+    caplog.set_level(logging.WARNING, logger="iot_firmware")
+    path = str(tmp_path / "ring")
+    ring = RingFile(path, capacity=120)
+    ring.release(1)
+    seqs = [ring.append(bytes([i]) * 20) for i in range(3)]
+    assert seqs == [1, 2, 3] and ring.used == 108
+    ring.release(5)
+    ring.release(2)
+    ring.release(1)
+    assert len(ring) == 1
+    assert ring.append(b"w" * 30) == 4
+    assert ring.append(b"x" * 30) == 5
+    assert ring.overwritten == 1
+    assert "journal record 3 was overwritten" in caplog.text
+    with pytest.raises(ValueError):
+        ring.append(b"y" * 110)
+    ring.close()
+    assert ring.flushes == 1
+
+    ring = RingFile(path, capacity=120)
+    assert ring.recover() == [(4, b"w" * 30), (5, b"x" * 30)]
+    assert ring.recover() == []
+    ring.release(4)
+    ring.release(5)
+    assert ring.used == 0
+    assert ring.append(b"z" * 80) == 6
+    ring.close()
+    ring = RingFile(path, capacity=120)
+    assert ring.recover() == [(6, b"z" * 80)]
+    ring.release(6)
+    assert ring.append(b"v" * 10) == 7
+    ring.close()
+    assert RingFile(path, capacity=120).recover() == [(7, b"v" * 10)]
+
+
+def test_ring_file_corruption(tmp_path):
+    path = str(tmp_path / "ring")
+    ring = RingFile(path, capacity=200)
+    ring.append(b"a" * 10)
+    ring.append(b"b" * 10)
+    ring.append(b"c" * 40)
+    ring.close()
+    with open(path, "r+b") as f:
+        f.seek(64 + 26 + 16)
+        f.write(b"B")
+    assert RingFile(path, capacity=200).recover() == [(1, b"a" * 10)]
+    assert RingFile(path, capacity=300).recover() == []
+
+    ring = RingFile(path, capacity=300)
+    ring.append(b"d" * 10)
+    ring._map[64:68] = (1000).to_bytes(4, "little")
+    assert RingFile(path, capacity=300).recover() == []
+
+    ring = RingFile(path, capacity=300)
+    ring.append(b"e" * 10)
+    ring._map[0:4] = b"XXXX"
+    ring.close()
+    ring = RingFile(path, capacity=300)
+    assert ring.recover() == []
+    assert ring._map[64:] == bytes(300)
+
+
+def test_event_journal_errors(tmp_path, caplog):
+    caplog.set_level(logging.WARNING, logger="iot_firmware")
+
+    class UnknownEventType(EventType):
+        pass
+
+    class UnknownEvent(Event):
+        type = UnknownEventType
+
+    path = str(tmp_path / "journal")
+    journal = EventJournal(path)
+    journal.register(MockEvent)
+    journal.record(MockEvent(data=object()))
+    assert journal.stats()["errors"] == 1
+    journal.record(UnknownEvent(data=1))
+    journal.done(MockEvent())
+    journal.record(MockEvent(data=1))
+    journal._ring.append(b"\xff")
+    journal.close()
+
+    journal = EventJournal(path)
+    journal.register(UnknownEvent, "unknown")
+    assert journal.replay() == []
+    assert "of unknown event `mocks.mocks.MockEvent`" in caplog.text
+    assert "cannot be decoded" in caplog.text
+    assert journal.stats() == {
+        "records": 0,
+        "used": 0,
+        "capacity": 1024 * 1024,
+        "overwritten": 0,
+        "flushes": 0,
+        "replayed": 0,
+        "errors": 1,
+    }
+
+
+def test_event_journal_replay_bad_record(tmp_path, caplog):
+    caplog.set_level(logging.ERROR, logger="iot_firmware")
+    path = str(tmp_path / "journal")
+    journal = EventJournal(path)
+    journal.register(MockEvent)
+    event = MockEvent(data=1)
+    event.level = "BAD"
+    journal.record(event)
+    journal.record(MockEvent(data=2))
+    journal.close()
+
+    journal = EventJournal(path)
+    journal.register(MockEvent)
+    assert [event.data for event in journal.replay()] == [2]
+    assert "journal record 1 cannot be replayed" in caplog.text
+    assert journal.stats()["errors"] == 1
+    assert journal.stats()["records"] == 1
+
+
+@pytest.mark.asyncio
+async def test_event_handler_journal_replay(tmp_path):
+    path = str(tmp_path / "journal")
+    with pytest.raises(RuntimeError):
+        EventHandler().persist(MockEvent)
+
+    event_handler = EventHandler(journal_path=path)
+    event_handler.subscribe(MockEvent, mock_function)
+    event_handler.persist(MockEvent)
+    event_handler.publish(MockEvent(data=1, level=EventLevel.ERROR))
+    event_handler.publish_many([MockEvent(data=2)])
+    timestamp = event_handler._event_buffer._queue[0][0].timestamp
+    event_handler._journal.close()
+
+    event_handler = EventHandler(
+        num_workers=1, buffer_maxsize=2, journal_path=path, journal_fsync_seconds=0.01
+    )
+    received = []
+
+    async def receive(event):
+        received.append(event)
+
+    event_handler.subscribe(MockEvent, receive)
+    event_handler.persist(MockEvent)
+    event_handler.publish(MockEvent(data=3))
+    runner = asyncio.create_task(event_handler.run())
+    await asyncio.sleep(0.02)
+    assert [event.data for event in received] == [1, 2, 3]
+    assert received[0].level is EventLevel.ERROR
+    assert received[0].timestamp == timestamp
+    stats = event_handler.stats()["journal"]
+    assert stats["replayed"] == 2
+    assert stats["records"] == 0
+    assert stats["flushes"] >= 1
+    await event_handler.stop()
+    await runner
+    event_handler._journal.close()
+    assert EventJournal(path).replay() == []
+
+
+@pytest.mark.asyncio
+async def test_event_handler_journal_releases(tmp_path):
+    event_handler = EventHandler(
+        num_workers=1,
+        buffer_maxsize=2,
+        journal_path=str(tmp_path / "journal"),
+        block_timeout_seconds=1,
+    )
+    event_handler.subscribe(MockEvent, mock_function)
+    event_handler.persist(MockEvent)
+    event_handler.publish(MockEvent(data=1))
+    event_handler.publish(MockEvent(data=2))
+    event_handler.publish(MockEvent(data=3))
+    assert event_handler.stats()["journal"]["records"] == 2
+
+    event_handler.set_coalescing(MockEvent, Coalescing())
+    event_handler._event_buffer.get_nowait()
+    event_handler.publish(MockEvent(data=4))
+    event_handler.publish(MockEvent(data=5))
+    assert event_handler.stats()["journal"]["records"] == 3
+    event_handler.set_coalescing(MockEvent, None)
+
+    event_handler.set_overflow_policy(MockEvent, OverflowPolicy.BLOCK)
+    runner = asyncio.create_task(event_handler.run())
+    result = await event_handler.publish_async(MockEvent(data=6))
+    assert result == "published"
+    await event_handler.stop()
+    await runner
+    assert event_handler.stats()["journal"]["records"] == 1
+
+
+@pytest.mark.asyncio
+async def test_event_handler_journal_closed(tmp_path):
+    event_handler = EventHandler(num_workers=1, journal_path=str(tmp_path / "journal"))
+    received = []
+
+    async def receive(event):
+        received.append(event.data)
+
+    event_handler.subscribe(MockEvent, receive)
+    event_handler.persist(MockEvent)
+    runner = asyncio.create_task(event_handler.run())
+    await asyncio.sleep(0)
+    event_handler.publish(MockEvent(data=1))
+    await event_handler.stop()
+    await runner
+    journal = event_handler._journal
+    assert journal.closed
+    assert journal._ring._map.closed
+    journal.close()
+
+    event_handler.publish(MockEvent(data=2))
+    assert not journal.closed
+    assert journal.stats()["records"] == 1
+    flushes = journal.stats()["flushes"]
+    journal.flush()
+    assert journal.stats()["flushes"] == flushes + 1
+    journal.close()
+    runner = asyncio.create_task(event_handler.run())
+    await asyncio.sleep(0.01)
+    await event_handler.stop()
+    await runner
+    assert received == [1, 2]
+    assert journal.closed
+    assert journal.stats()["records"] == 0
+    assert EventJournal(str(tmp_path / "journal")).replay() == []
+
+
+def test_event_slots():
+    class SlotEvent(Event):
+        __slots__ = ()
+        type = MockEventType
+
+    event = SlotEvent(data=1)
+    assert not hasattr(event, "__dict__")
+    with pytest.raises(AttributeError):
+        event.other = 1
+
+    # subclasses without slots keep the instance dict
+    mock_event = MockEvent(data=1)
+    assert hasattr(mock_event, "__dict__")
+    assert mock_event.data == 1
+
+
+def test_event_subclasses_with_attributes():
+    @dataclass
+    class DataclassEvent(Event):
+        type = MockEventType
+        extra: int = 0
+
+    event = DataclassEvent(extra=1)
+    assert (event.extra, event.data, event.level) == (1, None, EventLevel.INFO)
+    assert event.id and event.device_id is None
+    event = DataclassEvent(data=1, level="DEBUG", extra=2)
+    assert (event.data, event.level, event.extra) == (1, "DEBUG", 2)
+    assert DataclassEvent(1).id == event.id + 1
+    assert event == copy.copy(event)
+    assert event != DataclassEvent(data=1, level="DEBUG", extra=2)
+    assert repr(event).endswith("DataclassEvent(data=1, level='DEBUG', extra=2)")
+
+    class InitEvent(Event):
+        type = MockEventType
+
+        def __init__(self, data=None, source="sensor"):
+            super().__init__(data)
+            self.source = source
+
+    assert InitEvent(1).source == "sensor"
+
+
+def test_event_equality():
+    event = MockEvent(data=[1])
+    assert event == pickle.loads(pickle.dumps(event))
+    assert event != MockEvent(data=[1])
+    assert event != "event"
+
+
+def test_event_lazy_uuid_and_ids():
+    first, second = MockEvent(), MockEvent()
+    assert second.id == first.id + 1
+    assert first._uuid is None
+    assert first.uuid == first.uuid
+    assert first._uuid is not None
+    assert second.monotonic >= first.monotonic
+
+
+def test_event_pickle():
+    event = MockEvent(data=[1], level=EventLevel.ERROR)
+    assert event.uuid
+    copy = pickle.loads(pickle.dumps(event))
+    assert (copy.data, copy.level, copy.id, copy.uuid) == (
+        event.data,
+        event.level,
+        event.id,
+        event.uuid,
+    )
@@ -0,0 +1,187 @@
+import asyncio
+import logging
+import multiprocessing
+import os
+import time
+
+import pytest
+
+from iot_firmware import Controller
+from iot_firmware.event.enum import PublishResult
+from iot_firmware.event.sharding import _run_worker
+from iot_firmware.event.sharding import RECORD
+from iot_firmware.event.sharding import Shards
+from iot_firmware.event.sharding import SharedRing
+from mocks.mocks import MockEvent
+
+
+def test_shared_ring():
+    ring = SharedRing(capacity=32)
+    assert ring.put(b"a" * 10) and ring.put(b"b" * 10)
+    assert not ring.put(b"c" * 10)
+    assert len(ring) == 28
+    assert ring.get(1) == [b"a" * 10]
+    # the record does not fit before the end, it goes to the start
+    assert ring.put(b"c" * 10)
+    assert ring.get(10) == [b"b" * 10, b"c" * 10]
+    assert len(ring) == 0
+    ring.close()
+
+    # less than a record header is left before the end
+    ring = SharedRing(capacity=32)
+    assert ring.put(b"d" * (30 - RECORD.size))
+    assert ring.get(10) == [b"d" * (30 - RECORD.size)]
+    assert ring.put(b"e" * 10) and ring.put_stop()
+    assert ring.get(10) == [b"e" * 10, None]
+    with pytest.raises(ValueError):
+        ring.put(b"e" * 32)
+    ring.close()
+
+
+def test_shards_publish(caplog):
+    caplog.set_level(logging.ERROR, logger="iot_firmware")
+    shards = Shards(
+        lambda event_handler, shard: None,
+        num_shards=4,
+        partition=lambda event: event.data["sensor"],
+        ring_bytes=64,
+    )
+    assert shards.publish(MockEvent(data={"sensor": 1})) is PublishResult.DISCARDED
+    assert "event type is not registered" in caplog.text
+    assert shards.publish("event") is PublishResult.DISCARDED
+    shards.register(MockEvent, "mock")
+    assert shards.publish(MockEvent(data={"sensor": object()})) is (
+        PublishResult.DISCARDED
+    )
+    assert "it cannot be encoded" in caplog.text
+    events = [MockEvent(data={"sensor": i % 2}) for i in range(4)]
+    assert shards.publish_many(events) == 2
+    stats = shards.stats()
+    assert (stats["published"], stats["rejected"]) == (2, 2)
+    assert [shard["published"] for shard in stats["shards"]] == [1, 1, 0, 0]
+
+
+def test_shards_serve(caplog):
+    caplog.set_level(logging.ERROR, logger="iot_firmware")
+    received = []
+
+    async def receive(event):
+        received.append((event.data, event.level, event.device_id))
+
+    def setup(event_handler, shard):
+        event_handler.subscribe(MockEvent, receive)
+
+    shards = Shards(setup, num_shards=1, handler_options={"buffer_maxsize": 2})
+    shards.register(MockEvent)
+    for i in range(5):
+        event = MockEvent(data=i, level="ERROR")
+        event.device_id = 7
+        shards.publish(event)
+    ring = shards._rings[0]
+    ring.put(b"\xff")
+    ring.put_stop()
+    _run_worker(shards, 0)
+    assert received == [(i, "ERROR", 7) for i in range(5)]
+    assert "shard event cannot be decoded" in caplog.text
+    assert (ring.received, ring.processed, len(ring)) == (7, 5, 0)
+
+
+def test_shards_serve_backoff(monkeypatch):
+    shards = Shards(
+        lambda event_handler, shard: None,
+        num_shards=1,
+        poll_seconds=0.001,
+        max_poll_seconds=0.008,
+    )
+    shards.register(MockEvent)
+    ring = shards._rings[0]
+    polls = []
+    sleep = asyncio.sleep
+
+    async def poll(delay):
+        if delay:
+            polls.append(delay)
+            if len(polls) == 5:
+                shards.publish(MockEvent(data=1))
+            elif len(polls) == 7:
+                ring.put_stop()
+        await sleep(0)
+
+    monkeypatch.setattr(asyncio, "sleep", poll)
+    _run_worker(shards, 0)
+    assert polls == [0.001, 0.002, 0.004, 0.008, 0.008, 0.001, 0.002]
+    assert ring.received == 2
+
+
+def test_shards_serve_unlimited_buffer(monkeypatch):
+    received = []
+
+    async def receive(event):
+        received.append(event.data)
+
+    def setup(event_handler, shard):
+        event_handler.subscribe(MockEvent, receive)
+
+    shards = Shards(setup, num_shards=1, handler_options={"buffer_maxsize": 0})
+    shards.register(MockEvent)
+    for i in range(3):
+        shards.publish(MockEvent(data=i))
+    shards._rings[0].put_stop()
+    _run_worker(shards, 0)
+    assert received == [0, 1, 2]
+
+    monkeypatch.setattr(multiprocessing, "get_all_start_methods", lambda: ["spawn"])
+    with pytest.raises(RuntimeError):
+        Shards(setup)
+
+
+def _crash_setup(event_handler, shard):
+    async def crash(event):
+        if event.data == "crash":
+            os._exit(3)
+
+    event_handler.subscribe(MockEvent, crash)
+
+
+async def _wait_for(condition, timeout=10):
+    deadline = time.monotonic() + timeout
+    while not condition():
+        assert time.monotonic() < deadline
+        await asyncio.sleep(0.01)
+
+
+@pytest.mark.asyncio
+async def test_shards_restart(caplog):
+    caplog.set_level(logging.ERROR, logger="iot_firmware")
+    controller = Controller()
+    shards = controller.shard(_crash_setup, num_shards=2, max_restarts=1)
+    shards.register(MockEvent)
+    task = asyncio.create_task(controller.start_async())
+    await _wait_for(lambda: all(ring.ready for ring in shards._rings))
+
+    shard = hash(MockEvent.type.uuid) % 2
+    assert shards.publish(MockEvent(data="crash")) is PublishResult.PUBLISHED
+    await _wait_for(lambda: shards.stats()["shards"][shard]["restarts"] == 1)
+    assert f"shard {shard} exited with code 3" in caplog.text
+    shards.publish_many([MockEvent(data=i) for i in range(10)])
+    await _wait_for(lambda: shards.stats()["processed"] == 10)
+
+    shards.publish(MockEvent(data="crash"))
+    await _wait_for(lambda: "reached its max restarts" in caplog.text)
+
+    controller.stop()
+    with pytest.raises(asyncio.CancelledError):
+        await task
+    await asyncio.gather(controller.shards_task, return_exceptions=True)
+    assert all(process is None for process in shards._processes)
+    assert shards.stats()["shards"][1 - shard]["pid"] is None
+
+
+@pytest.mark.asyncio
+async def test_shards_timeouts(caplog):
+    caplog.set_level(logging.ERROR, logger="iot_firmware")
+    shards = Shards(lambda event_handler, shard: time.sleep(5), num_shards=1)
+    with pytest.raises(TimeoutError):
+        await shards.start(timeout=0.1)
+    await shards.stop(timeout=0.1)
+    assert "shard 0 did not stop in time" in caplog.text
@@ -0,0 +1,298 @@
+import asyncio
+import logging
+import os
+import shutil
+import time
+import zlib
+
+import pytest
+
+from iot_firmware.communications import CommunicationsHandler
+from iot_firmware.communications.codec import MessageCodec
+from iot_firmware.communications.schema import Message
+from iot_firmware.communications.store import MessageStore
+from iot_firmware.communications.store import RECORD
+from iot_firmware.communications.uplink import read_frame
+from iot_firmware.enums import DrainOrder
+from iot_firmware.enums import MessageType
+
+CODEC = MessageCodec()
+
+
+def _message(data, type=MessageType.READING, **kwargs):
+    return Message.load({"type": type, "data": data, **kwargs})
+
+
+class _FakeTransport:
+    """Transport that keeps what it sends and fails after ``limit`` messages."""
+
+    def __init__(self, limit=None):
+        self.sent = []
+        self.limit = limit
+
+    async def __call__(self, message):
+        if self.limit is not None and len(self.sent) >= self.limit:
+            raise ConnectionError("link down")
+        self.sent.append(message.data)
+
+
+async def _drain(store):
+    transport = _FakeTransport()
+    await store.drain(transport)
+    return transport.sent
+
+
+def _segments(path):
+    return sorted(name for name in os.listdir(path) if name.endswith(".seg"))
+
+
+@pytest.mark.asyncio
+async def test_store_drain_order(tmp_path):
+    store = MessageStore(str(tmp_path / "oldest"))
+    messages = [
+        _message(1),
+        _message("on", MessageType.EVENT),
+        _message(2),
+        _message("ack", MessageType.ACK),
+    ]
+    for message in messages:
+        store.put(message)
+    transport = _FakeTransport()
+    assert await store.drain(transport) == 4
+    assert transport.sent == [1, "on", 2, "ack"]
+    assert len(store) == 0
+
+    store = MessageStore(
+        str(tmp_path / "newest"), reading_order=DrainOrder.NEWEST_FIRST
+    )
+    for message in messages:
+        store.put(message)
+    transport = _FakeTransport()
+    assert await store.drain(transport, max_messages=3) == 3
+    assert transport.sent == ["on", "ack", 2]
+    assert await store.drain(transport) == 1
+    assert transport.sent[-1] == 1
+    assert store.stats()["forwarded"] == 4
+
+
+@pytest.mark.asyncio
+async def test_store_survives_restart(tmp_path, caplog):
+    caplog.set_level(logging.ERROR, logger="iot_firmware")
+    path = str(tmp_path)
+    store = MessageStore(path, segment_bytes=200, write_batch_bytes=0)
+    messages = [_message(i) for i in range(10)]
+    for message in messages:
+        store.put(message)
+    assert len(_segments(path)) > 1
+
+    transport = _FakeTransport(limit=4)
+    assert await store.drain(transport) == 4
+    assert "could not be sent - ConnectionError: link down" in caplog.text
+    assert messages[3].msg_id not in store
+    assert messages[4].msg_id in store
+    store.close()
+
+    store = MessageStore(path)
+    assert len(store) == 6
+    assert store.get(messages[5].msg_id).data == 5
+    assert store.get(messages[0].msg_id) is None
+    transport = _FakeTransport()
+    await store.drain(transport)
+    assert transport.sent == list(range(4, 10))
+    store.close()
+    assert _segments(path) == []
+    assert os.listdir(path) == []
+
+
+def test_store_bounds(tmp_path, caplog):
+    caplog.set_level(logging.WARNING, logger="iot_firmware")
+    size = RECORD.size + len(CODEC.encode(_message(0)))
+    store = MessageStore(str(tmp_path / "bytes"), max_bytes=3 * size)
+    messages = [_message(i) for i in range(5)]
+    for message in messages:
+        store.put(message)
+    assert [message.msg_id in store for message in messages] == [0, 0, 1, 1, 1]
+    assert store.stats()["dropped"] == 2
+    assert store.bytes == 3 * size
+    assert f"stored message {messages[0].msg_id} was dropped" in caplog.text
+
+    store = MessageStore(str(tmp_path / "age"), max_age_seconds=60)
+    store.put(_message(0, timestamp=time.time() - 120))
+    store.put(_message(1, timestamp=time.time() - 30))
+    assert len(store) == 1
+    store.close()
+    store = MessageStore(str(tmp_path / "age"), max_age_seconds=10)
+    assert len(store) == 0
+    assert store.stats()["expired"] == 1
+
+
+@pytest.mark.asyncio
+async def test_store_index(tmp_path):
+    store = MessageStore(str(tmp_path))
+    message = _message(1)
+    store.put(message)
+    store.put(message)
+    assert len(store) == 1
+    # a different message with the same msg_id does not replace it
+    with pytest.raises(ValueError):
+        store.put(_message(2, msg_id=message.msg_id))
+    assert store.get(message.msg_id).data == 1
+    assert store.stats()["collisions"] == 1
+    assert store.remove(message.msg_id)
+    assert not store.remove(message.msg_id)
+    assert store.get(message.msg_id) is None
+
+    with pytest.raises(TypeError):
+        store.put(_message(object()))
+    store.put(_message(3))
+    store.close()
+    assert await _drain(MessageStore(str(tmp_path))) == [3]
+
+    acked = _message(5)
+
+    async def send(message):
+        store.remove(acked.msg_id)
+
+    store = MessageStore(str(tmp_path))
+    store.put(_message(4))
+    store.put(acked)
+    assert await store.drain(send) == 1
+
+
+@pytest.mark.asyncio
+async def test_store_damaged_files(tmp_path, caplog):
+    caplog.set_level(logging.WARNING, logger="iot_firmware")
+    path = str(tmp_path)
+    store = MessageStore(path)
+    kept = _message(1)
+    store.put(kept)
+    store.put(_message(2))
+    store.flush()
+    store.remove(kept.msg_id)
+    store.close()
+    (segment,) = _segments(path)
+    with open(os.path.join(path, segment.replace(".seg", ".del")), "ab") as f:
+        f.write(b"\x01\x02")
+    shutil.copy(os.path.join(path, segment), os.path.join(path, "000000000009.seg"))
+    encoded = CODEC.encode(_message(3))
+    with open(os.path.join(path, segment), "ab") as f:
+        f.write(RECORD.pack(len(encoded), 0) + encoded)
+
+    store = MessageStore(path)
+    assert f"ignored {RECORD.size + len(encoded)} bytes" in caplog.text
+    assert len(store) == 2
+
+    for payload in (b"\x00" * 8, encoded + b"\x00"):
+        with open(os.path.join(path, "000000000020.seg"), "wb") as f:
+            f.write(RECORD.pack(len(payload), zlib.crc32(payload)) + payload)
+        assert len(MessageStore(path)) == 2
+    assert sorted(await _drain(MessageStore(path))) == [1, 2]
+
+
+@pytest.mark.asyncio
+async def test_communications_handler_store_and_forward(tmp_path):
+    frames = []
+
+    async def transport(frame):
+        frames.append([message.data for message in read_frame(frame, CODEC)])
+
+    with pytest.raises(RuntimeError):
+        CommunicationsHandler().disconnect()
+    assert await CommunicationsHandler().reconnect() == 0
+
+    handler = CommunicationsHandler(
+        transport=transport,
+        store_path=str(tmp_path),
+        reading_order=DrainOrder.NEWEST_FIRST,
+    )
+    handler.disconnect()
+    for i in range(3):
+        await handler.send(_message(i))
+    await handler.close()
+    assert frames == []
+    assert handler.stats()["store"]["messages"] == 3
+
+    handler = CommunicationsHandler(transport=transport, store_path=str(tmp_path))
+    assert await handler.reconnect() == 3
+    await handler.send(_message(3))
+    await handler.close()
+    assert frames == [[0, 1, 2, 3]]
+    assert handler.stats()["uplink"]["frames"] == 1
+
+
+@pytest.mark.asyncio
+async def test_store_keeps_forwarded_messages(tmp_path):
+    store = MessageStore(str(tmp_path))
+    messages = [_message(i, msg_id=i) for i in range(3)]
+    for message in messages:
+        store.put(message)
+    transport = _FakeTransport()
+    assert await store.drain(transport, keep=True) == 3
+    assert len(store) == 3
+    # kept messages are not forwarded again until they are released
+    assert await store.drain(transport, keep=True) == 0
+    assert store.confirm([0, 5]) == 1
+    store.release([1])
+    assert await store.drain(transport) == 1
+    assert transport.sent == [0, 1, 2, 1]
+    assert sorted(store._index) == [2]
+    store.put(messages[2])
+    assert store.confirm([2]) == 0
+    store.remove(2)
+    assert store.confirm([2]) == 0
+
+
+@pytest.mark.asyncio
+async def test_communications_handler_forward_failures(tmp_path):
+    frames = []
+    failures = [ConnectionError("link down")]
+
+    async def transport(frame):
+        if failures:
+            raise failures.pop()
+        frames.append([message.data for message in read_frame(frame, CODEC)])
+
+    handler = CommunicationsHandler(transport=transport, store_path=str(tmp_path))
+    handler.disconnect()
+    for i in range(3):
+        await handler.send(_message(i))
+    assert await handler.reconnect() == 3
+    # the frame is written later, so the messages are kept until then
+    assert handler.stats()["store"]["messages"] == 3
+    with pytest.raises(ConnectionError):
+        await handler.uplink.flush()
+    assert handler.stats()["store"]["messages"] == 3
+
+    await handler.send(_message(3))
+    await handler.uplink.flush()
+    assert frames == [[3]]
+    assert await handler.reconnect() == 3
+    await handler.close()
+    assert frames == [[3], [0, 1, 2]]
+    assert handler.stats()["store"]["messages"] == 0
+
+
+@pytest.mark.asyncio
+async def test_communications_handler_forward_with_acks(tmp_path):
+    frames = []
+
+    async def transport(frame):
+        frames.append([message.msg_id for message in read_frame(frame, CODEC)])
+
+    handler = CommunicationsHandler(
+        transport=transport,
+        store_path=str(tmp_path),
+        max_delay_seconds=0.005,
+        ack_window=10,
+    )
+    handler.disconnect()
+    for msg_id in range(3):
+        await handler.send(_message(0, msg_id=msg_id))
+    assert await handler.reconnect() == 3
+    await asyncio.sleep(0.02)
+    assert frames == [[0, 1, 2]]
+    assert handler.stats()["acks"]["in_flight"] == 3
+    assert handler.stats()["store"]["messages"] == 3
+    handler.acknowledge(_message(1, MessageType.ACK))
+    assert sorted(handler.store._index) == [2]
+    await handler.close()
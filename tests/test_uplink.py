@@ -0,0 +1,173 @@
+import asyncio
+import logging
+import os
+import zlib
+
+import pytest
+
+from iot_firmware.communications import CommunicationsHandler
+from iot_firmware.communications import uplink
+from iot_firmware.communications.codec import CodecError
+from iot_firmware.communications.codec import MessageCodec
+from iot_firmware.communications.schema import Message
+from iot_firmware.communications.uplink import FLAG_ZLIB
+from iot_firmware.communications.uplink import FRAME_FORMAT_VERSION
+from iot_firmware.communications.uplink import FRAME_HEADER
+from iot_firmware.communications.uplink import read_frame
+from iot_firmware.communications.uplink import Uplink
+from iot_firmware.enums import MessageType
+
+CODEC = MessageCodec()
+
+
+def _message(data):
+    return Message.load({"type": MessageType.READING, "data": data})
+
+
+class _Transport:
+    def __init__(self):
+        self.frames = []
+
+    async def __call__(self, frame):
+        self.frames.append(frame)
+
+    def messages(self):
+        return [
+            [message.data for message in read_frame(frame, CODEC)]
+            for frame in self.frames
+        ]
+
+
+@pytest.mark.asyncio
+async def test_uplink_deadline_flush():
+    transport = _Transport()
+    link = Uplink(transport, CODEC, max_frame_bytes=1000, max_delay_seconds=0.01)
+    await link.send(_message(1))
+    await link.send(_message(2))
+    assert transport.frames == []
+    await asyncio.sleep(0.03)
+    assert transport.messages() == [[1, 2]]
+
+    await link.send(_message(3))
+    await link.close()
+    assert transport.messages() == [[1, 2], [3]]
+    stats = link.stats()
+    assert stats["frames"] == 2
+    assert stats["messages"] == 3
+    assert stats["messages_per_frame"] == 1.5
+    assert stats["flushes"] == {"deadline": 1, "close": 1}
+    assert stats["bytes"] == stats["raw_bytes"] == sum(map(len, transport.frames))
+    assert stats["compression_ratio"] == 1.0
+    fill_ratio = stats["fill_ratio"]
+    assert fill_ratio["min"] == len(transport.frames[1]) / 1000
+    assert fill_ratio["max"] == len(transport.frames[0]) / 1000
+    assert fill_ratio["min"] < fill_ratio["mean"] < fill_ratio["max"]
+
+    async def slow_transport(frame):
+        await asyncio.sleep(0.02)
+        await transport(frame)
+
+    link = Uplink(slow_transport, CODEC, max_delay_seconds=0.01)
+    await link.send(_message(4))
+    await asyncio.sleep(0.015)
+    await link.close()
+    assert transport.messages()[-1] == [4]
+
+
+@pytest.mark.asyncio
+async def test_uplink_size_flush(monkeypatch):
+    transport = _Transport()
+    link = Uplink(transport, CODEC, max_frame_bytes=100)
+    await link.send(_message(1))
+    await link.send(_message("x" * 200))
+    await link.send(_message(2))
+    await link.send(_message(3))
+    await link.flush()
+    assert transport.messages() == [[1], ["x" * 200], [2, 3]]
+    assert all(len(frame) <= 100 for frame in transport.frames[::2])
+
+    monkeypatch.setattr(uplink, "MAX_FRAME_MESSAGES", 2)
+    link = Uplink(transport, CODEC, max_frame_bytes=1000)
+    for i in range(5):
+        await link.send(_message(i))
+    await link.close()
+    assert transport.messages()[3:] == [[0, 1], [2, 3], [4]]
+    assert link.stats()["flushes"] == {"size": 2, "close": 1}
+
+    with pytest.raises(ValueError):
+        Uplink(transport, CODEC, max_frame_bytes=FRAME_HEADER.size)
+
+
+@pytest.mark.asyncio
+async def test_uplink_compression():
+    transport = _Transport()
+    link = Uplink(transport, CODEC, max_frame_bytes=1000, compression_level=6)
+    for _ in range(5):
+        await link.send(_message({"temp": 24.3, "unit": "celsius"}))
+    await link.close()
+    stats = link.stats()
+    assert stats["bytes"] < stats["raw_bytes"]
+    assert stats["compression_ratio"] < 1
+
+    link = Uplink(transport, CODEC, max_frame_bytes=1000, compression_level=0)
+    await link.send(_message(os.urandom(16)))
+    await link.close()
+    compressed, stored = transport.frames
+    assert compressed[1] & FLAG_ZLIB
+    assert not stored[1] & FLAG_ZLIB
+    assert len(transport.messages()[0]) == 5
+
+
+@pytest.mark.asyncio
+async def test_uplink_transport_errors(caplog):
+    caplog.set_level(logging.ERROR, logger="iot_firmware")
+
+    async def transport(frame):
+        raise ConnectionError("link down")
+
+    link = Uplink(transport, CODEC, max_frame_bytes=100, max_delay_seconds=0.01)
+    await link.send(_message(1))
+    await asyncio.sleep(0.03)
+    assert link.stats()["errors"] == 1
+    assert "frame could not be sent (deadline) - ConnectionError" in caplog.text
+    with pytest.raises(ConnectionError):
+        await link.send(_message("x" * 100))
+    await link.close()
+    assert link.stats()["errors"] == 1
+
+
+def _frame(payload, flags=0, count=1, version=FRAME_FORMAT_VERSION, size=None):
+    size = len(payload) if size is None else size
+    return FRAME_HEADER.pack(version, flags, count, size) + payload
+
+
+@pytest.mark.parametrize(
+    "frame",
+    [
+        b"\x01\x00",
+        _frame(CODEC.encode(_message(1)), version=2),
+        _frame(CODEC.encode(_message(1)), size=1),
+        _frame(b"not zlib", flags=FLAG_ZLIB),
+        _frame(CODEC.encode(_message(1)) * 2),
+        _frame(zlib.compress(CODEC.encode(_message(1))[:-1]), flags=FLAG_ZLIB),
+    ],
+)
+def test_read_invalid_frame(frame):
+    with pytest.raises(CodecError):
+        read_frame(frame, CODEC)
+
+
+@pytest.mark.asyncio
+async def test_communications_handler_send():
+    handler = CommunicationsHandler()
+    assert handler.stats() == {}
+    with pytest.raises(RuntimeError):
+        await handler.send(_message(1))
+    await handler.close()
+
+    transport = _Transport()
+    handler = CommunicationsHandler(transport=transport, compression_level=1)
+    await handler.send(_message(1))
+    await handler.close()
+    assert transport.messages() == [[1]]
+    assert handler.stats()["uplink"]["frames"] == 1
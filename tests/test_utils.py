@@ -1,6 +1,19 @@
+import multiprocessing
+import subprocess
+import sys
+import threading
 from enum import Enum
 
+import pytest
+
+from iot_firmware.communications import CommunicationsHandler
+from iot_firmware.communications import schema
+from iot_firmware.communications import utils
+from iot_firmware.communications.schema import Message
+from iot_firmware.communications.utils import BlockCounter
+from iot_firmware.communications.utils import DEFAULT_BLOCK_SIZE
 from iot_firmware.enums import ContainsEnumMeta
+from iot_firmware.enums import MessageType
 
 
 def test_meta_enum():
@@ -9,3 +22,78 @@ def test_meta_enum():
 
     assert "a" in NewEnum
     assert "c" not in NewEnum
+
+
+def test_block_counter(tmp_path):
+    path = str(tmp_path / "msg_id")
+    counter = BlockCounter(path, block_size=10)
+    assert [counter() for _ in range(3)] == [1, 2, 3]
+    # a restart, even after a crash, continues after the reserved block
+    assert BlockCounter(path, block_size=10)() == 11
+    assert [counter() for _ in range(8)] == [4, 5, 6, 7, 8, 9, 10, 21]
+    assert BlockCounter(path, start=50)() == 51
+    assert BlockCounter(start=50)() == 51
+
+    with open(path, "wb") as f:
+        f.write(b"\x00")
+    with pytest.raises(ValueError):
+        BlockCounter(path)()
+    with pytest.raises(ValueError):
+        BlockCounter(path, block_size=0)
+
+
+def test_block_counter_threads_and_processes(tmp_path):
+    counter = BlockCounter(str(tmp_path / "msg_id"), block_size=100)
+    values = [counter()]
+
+    def count():
+        values.extend(counter() for _ in range(2000))
+
+    threads = [threading.Thread(target=count) for _ in range(8)]
+    for thread in threads:
+        thread.start()
+    for thread in threads:
+        thread.join()
+    assert len(set(values)) == len(values) == 16001
+
+    context = multiprocessing.get_context("fork")
+    queue = context.Queue()
+    processes = [
+        context.Process(target=lambda: queue.put([counter() for _ in range(500)]))
+        for _ in range(2)
+    ]
+    for process in processes:
+        process.start()
+    values += [counter() for _ in range(500)]
+    for process in processes:
+        values += queue.get(timeout=10)
+        process.join()
+    assert len(set(values)) == len(values) == 17501
+    # what a forked process does before counting
+    utils._forget_blocks()
+    assert counter() > max(values)
+
+
+def test_import_without_posix_modules():
+    code = (
+        # the standard modules that always use register_at_fork are imported first
+        "import asyncio, os, random, sys, uuid; "
+        "sys.modules['fcntl'] = None; del os.register_at_fork; "
+        "from iot_firmware.communications.schema import Message; "
+        "print(Message.load({'type': 'reading', 'data': 1}).msg_id)"
+    )
+    result = subprocess.run(
+        [sys.executable, "-c", code], capture_output=True, text=True, check=True
+    )
+    assert result.stdout == "1\n"
+
+
+def test_persist_msg_ids(tmp_path, monkeypatch):
+    monkeypatch.setattr(schema, "msg_id_counter", BlockCounter())
+    path = str(tmp_path / "msg_id")
+    message = {"type": MessageType.READING, "data": 1}
+    assert Message.load(message).msg_id == 1
+    CommunicationsHandler(msg_id_path=path)
+    assert Message.load(message).msg_id == 3
+    schema.persist_msg_ids(path)
+    assert Message.load(message).msg_id == DEFAULT_BLOCK_SIZE + 3